@@ -0,0 +1,220 @@
+"""
+Throughput benchmarks for hand evaluation, dealing, pot splitting and
+full hands.
+
+Every workload is seeded, so two runs on the same machine do the same work.
+Results are written as JSON and compared against a stored baseline:
+
+    python benchmark.py                        # run and compare
+    python benchmark.py --save-baseline        # record a new baseline
+    python benchmark.py --output results.json  # keep the results
+
+The exit status is 1 if any workload is slower than the baseline by more
+than the tolerance, including after it has been run again.
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from card import Card, SUITS, DENOMS
+from deck import Deck
+from game import Game
+from hand import Hand
+from player import BotPlayer
+from tournament import Tournament
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+DEFAULT_TOLERANCE = 0.2
+
+ALL_CARDS = [Card(s, d) for s in SUITS for d in DENOMS]
+
+
+def silence(*_):
+    pass
+
+
+def bench_hand(num_cards, num_hands):
+    rng = random.Random(num_cards)
+    card_sets = [rng.sample(ALL_CARDS, num_cards) for _ in range(num_hands)]
+
+    def run():
+        for cards in card_sets:
+            Hand(cards)
+
+    return run, num_hands
+
+
+def bench_deal(num_players, num_deals):
+    deck = Deck()
+
+    def run():
+        random.seed(29)
+        for _ in range(num_deals):
+            deck.reset_and_shuffle()
+            # Hole cards, then burn and deal the flop, turn and river
+            for _ in range(num_players * 2 + 8):
+                deck.pop()
+
+    return run, num_deals
+
+
+def bench_determine_pots(num_players, num_rounds):
+    rng = random.Random(num_players)
+    stacks = [[rng.randint(1, 200) for _ in range(num_players)] for _ in range(num_rounds)]
+    game = Game()
+    game.print = silence
+    for i in range(num_players):
+        player = BotPlayer(str(i), 0)
+        player.print = silence
+        player.state = "all in"
+        game.add_player(player)
+
+    def run():
+        for round_stacks in stacks:
+            for player, stack in zip(game.players, round_stacks):
+                game.player_total_bet_this_hand[player] = stack
+            game.determine_pots()
+
+    return run, num_rounds
+
+
+def bench_play_hand(num_players, num_hands):
+    def run():
+        random.seed(num_players)
+        game = Game()
+        game.print = silence
+        for i in range(num_players):
+            player = BotPlayer(str(i), 0)
+            player.print = silence
+            game.add_player(player)
+
+        for _ in range(num_hands):
+            # Every hand starts from full stacks so nobody goes broke
+            for player in game.players:
+                player.cash = 200
+            game.play_hand()
+
+    return run, num_hands
+
+
+def bench_tournament(num_players, num_rounds):
+    def run():
+        random.seed(num_players)
+        players = [BotPlayer(str(i), 200) for i in range(num_players)]
+        for player in players:
+            player.print = silence
+        tournament = Tournament(players, table_size=9)
+        for table in tournament.tables:
+            table.print = silence
+        for _ in range(num_rounds):
+            tournament.play_round()
+        return tournament
+
+    return run, num_rounds
+
+
+def workloads(scale=1.0):
+    def n(count):
+        return max(1, int(count * scale))
+
+    yield from (
+        (f"hand_{k}_cards", bench_hand(k, n(2000))) for k in (5, 6, 7)
+    )
+    yield "deal_9_players", bench_deal(9, n(5000))
+    yield "determine_pots_9_all_in", bench_determine_pots(9, n(5000))
+    yield from (
+        (f"play_hand_{p}_players", bench_play_hand(p, n(300))) for p in range(2, 10)
+    )
+    yield "tournament_90_players", bench_tournament(90, n(30))
+
+
+def time_workload(run, ops, repeat):
+    # Best of `repeat` runs is the least noisy estimate
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return {"ops": ops, "seconds": best, "ops_per_sec": ops / best}
+
+
+def run_benchmarks(scale=1.0, repeat=3, names=None):
+    results = {}
+    for name, (run, ops) in workloads(scale):
+        if names is not None and name not in names:
+            continue
+        results[name] = time_workload(run, ops, repeat)
+        print(f"{name:<28} {results[name]['ops_per_sec']:>12.1f} ops/s")
+
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "scale": scale,
+        "results": results,
+    }
+
+
+def compare_results(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Names of workloads whose throughput dropped by more than `tolerance`."""
+    regressions = []
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        expected = baseline["results"][name]["ops_per_sec"]
+        if result["ops_per_sec"] < expected * (1 - tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply the work in every workload")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    current = run_benchmarks(scale=args.scale, repeat=args.repeat)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"No baseline at {args.baseline}, nothing to compare")
+        return 0
+
+    regressions = compare_results(current, baseline, args.tolerance)
+    if regressions:
+        # A slow run is often a busy machine: time the regressed workloads
+        # again and keep the better result before reporting them
+        print("Rerunning " + ", ".join(regressions))
+        rerun = run_benchmarks(scale=args.scale, repeat=max(args.repeat, 3), names=regressions)
+        for name, result in rerun["results"].items():
+            if result["ops_per_sec"] > current["results"][name]["ops_per_sec"]:
+                current["results"][name] = result
+        regressions = compare_results(current, baseline, args.tolerance)
+
+    for name in regressions:
+        before = baseline["results"][name]["ops_per_sec"]
+        after = current["results"][name]["ops_per_sec"]
+        print(f"REGRESSION {name}: {before:.1f} -> {after:.1f} ops/s")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Betting structures and the rules for acting on a bet.
+
+Players only say what they want to do, as an `Intent`; `Game.betting`
+applies it to a `RoundState` with `apply`. Nothing here keeps state of its
+own, so a simulator can drive the same rules with plain numbers through
+`legal_actions` and `resolve`.
+
+A raise amount is the total bet for the round after raising ("raise to").
+A raise must add at least `minimum_raise` on top of the price, unless it
+puts the player all in. Such a short all-in raises the price but does not
+reopen the betting: players who have acted since the last full raise may
+only call or fold, and it does not count towards a fixed-limit cap.
+"""
+
+from collections import namedtuple
+
+FOLD, CALL, RAISE = "fold", "check/call", "raise"
+
+# Number of community cards on each street
+BOARD_SIZES = (0, 3, 4, 5)
+
+# `to_call` is what calling costs; the raise bounds are None when the
+# player cannot raise
+LegalActions = namedtuple("LegalActions", ["actions", "to_call", "min_raise_to", "max_raise_to"])
+
+# `amount` is the raise-to total, only needed for a raise
+Intent = namedtuple("Intent", ["action", "amount"], defaults=(None,))
+
+
+class NoLimit:
+    name = "no-limit"
+
+    def raise_bounds(self, price_to_call, minimum_raise, player_bet, pot, bb, street, raises):
+        return price_to_call + minimum_raise, float("inf")
+
+
+class PotLimit:
+    name = "pot-limit"
+
+    def raise_bounds(self, price_to_call, minimum_raise, player_bet, pot, bb, street, raises):
+        # Call, then raise by the size of the pot after the call
+        pot_after_call = pot + price_to_call - player_bet
+        return price_to_call + minimum_raise, price_to_call + max(pot_after_call, minimum_raise)
+
+
+class FixedLimit:
+    name = "fixed-limit"
+
+    def __init__(self, cap=4):
+        self.cap = cap
+
+    def raise_bounds(self, price_to_call, minimum_raise, player_bet, pot, bb, street, raises):
+        if raises >= self.cap:
+            return None
+        # Small bets on the first two streets, big bets after
+        bet = bb if street < 2 else 2 * bb
+        return price_to_call + bet, price_to_call + bet
+
+
+STRUCTURES = {structure.name: structure for structure in (NoLimit(), PotLimit(), FixedLimit())}
+
+
+def legal_actions(structure, price_to_call, minimum_raise, player_bet, stack, pot, bb, street=0, raises=0):
+    all_in_to = player_bet + stack
+    to_call = min(price_to_call - player_bet, stack)
+    bounds = structure.raise_bounds(price_to_call, minimum_raise, player_bet, pot, bb, street, raises)
+    if bounds is None or all_in_to <= price_to_call:
+        return LegalActions((FOLD, CALL), to_call, None, None)
+    low, high = bounds
+    return LegalActions((FOLD, CALL, RAISE), to_call, min(low, all_in_to), min(high, all_in_to))
+
+
+def clamp_raise(amount, legal):
+    return min(max(amount, legal.min_raise_to), legal.max_raise_to)
+
+
+def validate(action, amount, legal):
+    """Why `action` is not allowed, or None if it is."""
+    if action not in legal.actions:
+        return f"{action} is not legal. Legal actions are {list(legal.actions)}"
+    if action == RAISE and not legal.min_raise_to <= amount <= legal.max_raise_to:
+        return f"Raise to {amount} is outside {legal.min_raise_to} to {legal.max_raise_to}"
+    return None
+
+
+def resolve(action, amount, stack, bet, price_to_call, legal):
+    """(stack, bet, raise_amount, state) after `action`.
+
+    `state` is the player's new state: "playing", "all in" or "folded".
+    """
+    error = validate(action, amount, legal)
+    if error:
+        raise Exception(error)
+
+    if action == FOLD:
+        return stack, 0, 0, "folded"
+
+    if action == CALL:
+        if price_to_call == 0:
+            return stack, bet, 0, "playing"
+        # Calling with exactly the stack, or less, is all in
+        if stack + bet > price_to_call:
+            return stack - (price_to_call - bet), price_to_call, 0, "playing"
+        return 0, bet + stack, 0, "all in"
+
+    stack -= amount - bet
+    return stack, amount, amount - price_to_call, "all in" if stack == 0 else "playing"
+
+
+class RoundState:
+    """Chips in play during one betting round, by seat."""
+
+    __slots__ = ("stacks", "bets", "price_to_call", "minimum_raise", "raises", "pot", "acted")
+
+    def __init__(self, stacks, bets, price_to_call, minimum_raise, pot):
+        self.stacks = stacks
+        self.bets = bets
+        self.price_to_call = price_to_call
+        self.minimum_raise = minimum_raise
+        self.raises = 0
+        self.pot = pot
+        # Seats that have acted since the last full raise
+        self.acted = set()
+
+
+def legal_actions_at(structure, state, seat, bb, street):
+    legal = legal_actions(
+        structure, state.price_to_call, state.minimum_raise, state.bets[seat],
+        state.stacks[seat], state.pot, bb, street, state.raises,
+    )
+    # Only a short all-in has raised since this seat last acted
+    if seat in state.acted and RAISE in legal.actions:
+        return LegalActions((FOLD, CALL), legal.to_call, None, None)
+    return legal
+
+
+def apply(state, seat, intent, legal):
+    """Apply `intent` for `seat` and return (total_bet, raise_amount, player_state)."""
+    stack, bet, raise_amount, player_state = resolve(
+        intent.action, intent.amount, state.stacks[seat], state.bets[seat], state.price_to_call, legal
+    )
+    if player_state == "folded":
+        return 0, 0, player_state
+
+    state.pot += bet - state.bets[seat]
+    state.stacks[seat] = stack
+    state.bets[seat] = bet
+    if raise_amount >= state.minimum_raise:
+        state.price_to_call = bet
+        state.minimum_raise = raise_amount
+        state.raises += 1
+        state.acted = {seat}
+    else:
+        if raise_amount > 0:
+            state.price_to_call = bet
+        state.acted.add(seat)
+    return bet, raise_amount, player_state
@@ -0,0 +1,177 @@
+"""
+Board texture and draws for every hole-card combo on a board.
+
+Boards that differ only by a renaming of suits play the same, so analysis is
+done once per canonical board (the suit renaming with the smallest sorted
+card tuple) and cached. Lookups rename the hole cards the same way.
+
+Cards may be given as `Card`s or card ints (see `Card.index`).
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+from itertools import combinations, permutations
+from card import Card
+from evaluator import (
+    CATEGORY_NAMES,
+    NUM_CARDS,
+    NUM_RANKS,
+    NUM_SUITS,
+    STRAIGHT_TOP,
+    category,
+    evaluate,
+)
+
+OPEN_ENDED = "open-ended"
+DOUBLE_GUTSHOT = "double gutshot"
+GUTSHOT = "gutshot"
+
+BoardTexture = namedtuple(
+    "BoardTexture",
+    ["paired", "trips", "max_suit", "flush_possible", "straight_possible", "high_rank"],
+)
+# `outs` are the unseen cards that complete a straight or flush the combo
+# does not have yet
+Draws = namedtuple("Draws", ["ranking", "flush_draw", "straight_draw", "outs"])
+
+SUIT_PERMUTATIONS = list(permutations(range(NUM_SUITS)))
+
+
+def _as_ints(cards):
+    return [card.index if isinstance(card, Card) else card for card in cards]
+
+
+def _rename(cards, perm):
+    return tuple(sorted(perm[card // NUM_RANKS] * NUM_RANKS + card % NUM_RANKS for card in cards))
+
+
+def canonical_board(cards):
+    """The canonical board of `cards` and the suit renaming that gives it."""
+    cards = _as_ints(cards)
+    return min((_rename(cards, perm), perm) for perm in SUIT_PERMUTATIONS)
+
+
+def _rank_bits(cards):
+    bits = 0
+    for card in cards:
+        bits |= 1 << card % NUM_RANKS
+    return bits
+
+
+def _texture(board):
+    rank_counts = [0] * NUM_RANKS
+    suit_counts = [0] * NUM_SUITS
+    for card in board:
+        suit, rank = divmod(card, NUM_RANKS)
+        rank_counts[rank] += 1
+        suit_counts[suit] += 1
+    bits = _rank_bits(board)
+    # Three ranks in a five-rank window leave a straight open
+    low_ace_bits = bits << 1 | bits >> (NUM_RANKS - 1) & 1
+    straight_possible = any(
+        bin(low_ace_bits >> low & 0b11111).count("1") >= 3 for low in range(NUM_RANKS - 3)
+    )
+    return BoardTexture(
+        paired=max(rank_counts) >= 2,
+        trips=max(rank_counts) >= 3,
+        max_suit=max(suit_counts),
+        flush_possible=max(suit_counts) >= 3,
+        straight_possible=straight_possible,
+        high_rank=max(card % NUM_RANKS for card in board),
+    )
+
+
+def _straight_draw(bits, completing):
+    # Positions of ranks with the ace both below the 2 and above the king
+    low_ace_bits = bits << 1 | bits >> (NUM_RANKS - 1) & 1
+    ends = {rank + 1 for rank in completing}
+    if NUM_RANKS - 1 in completing:
+        ends.add(0)
+    # Open-ended: four consecutive ranks completed at either end. Otherwise
+    # the completing ranks fill gaps, one gap per completing rank
+    for low in range(1, NUM_RANKS - 3):
+        if low_ace_bits >> low & 0b1111 == 0b1111 and low - 1 in ends and low + 4 in ends:
+            return OPEN_ENDED
+    return DOUBLE_GUTSHOT if len(completing) >= 2 else GUTSHOT
+
+
+def _draws(hole, board):
+    cards = hole + board
+    strength = evaluate(cards)
+    made = category(strength)
+    if len(board) == 5:
+        return Draws(CATEGORY_NAMES[made], False, None, 0)
+
+    seen = set(cards)
+    outs = set()
+
+    flush_draw = False
+    for suit in range(NUM_SUITS):
+        in_suit = [card for card in cards if card // NUM_RANKS == suit]
+        if len(in_suit) == 4 and any(card in in_suit for card in hole):
+            flush_draw = True
+            outs.update(
+                suit * NUM_RANKS + rank
+                for rank in range(NUM_RANKS)
+                if suit * NUM_RANKS + rank not in seen
+            )
+
+    straight_draw = None
+    if STRAIGHT_TOP[_rank_bits(cards)] < 0:
+        bits, board_bits = _rank_bits(cards), _rank_bits(board)
+        # Ranks that make a straight with the hole cards but not from the board alone
+        completing = [
+            rank
+            for rank in range(NUM_RANKS)
+            if STRAIGHT_TOP[bits | 1 << rank] >= 0 and STRAIGHT_TOP[board_bits | 1 << rank] < 0
+        ]
+        if completing:
+            straight_draw = _straight_draw(bits, completing)
+            outs.update(
+                suit * NUM_RANKS + rank
+                for rank in completing
+                for suit in range(NUM_SUITS)
+                if suit * NUM_RANKS + rank not in seen
+            )
+
+    return Draws(CATEGORY_NAMES[made], flush_draw, straight_draw, len(outs))
+
+
+class BoardAnalysis:
+    """Texture of a canonical board and the draws of every combo on it."""
+
+    def __init__(self, board):
+        self.board = tuple(board)
+        self.texture = _texture(self.board)
+        deck = [card for card in range(NUM_CARDS) if card not in self.board]
+        self.draws = {
+            hole: _draws(list(hole), list(self.board)) for hole in combinations(deck, 2)
+        }
+
+
+@lru_cache(maxsize=2048)
+def _analysis(board):
+    return BoardAnalysis(board)
+
+
+def analyze(community_cards):
+    """The cached `BoardAnalysis` of the canonical form of a board, with the
+    suit renaming that maps real cards onto it.
+    """
+    if len(community_cards) not in (3, 4, 5):
+        raise Exception(f"Board analysis needs 3 to 5 community cards, got {len(community_cards)}.")
+    board, perm = canonical_board(community_cards)
+    return _analysis(board), perm
+
+
+def board_texture(community_cards):
+    return analyze(community_cards)[0].texture
+
+
+def draws(hole_cards, community_cards):
+    """`Draws` of two hole cards on `community_cards`."""
+    analysis, perm = analyze(community_cards)
+    hole = _rename(_as_ints(hole_cards), perm)
+    if hole not in analysis.draws:
+        raise Exception(f"Hole cards {hole_cards} clash with the board {community_cards}.")
+    return analysis.draws[hole]
@@ -0,0 +1,108 @@
+"""
+Game updates for a room, broadcast in tiers.
+
+Seated players get every line as it happens. Spectators get the same lines
+`delay` seconds late, with every hole card masked, and can only watch.
+
+Each line is masked once per tier, however many sockets watch it, and a
+tier is sent with one emit to its Socket.IO room, which encodes the packet
+once for all of the room's sockets. Delayed lines are held back and sent
+together by `BroadcastHub.flush`, so a busy table costs one message per
+tick for all its spectators.
+"""
+
+import threading
+import time
+from collections import deque, namedtuple
+
+# `delay` in seconds; `masked` hides hole cards
+Tier = namedtuple("Tier", ["name", "delay", "masked"])
+
+PLAYERS = Tier("players", 0, False)
+SPECTATORS = Tier("spectators", 30, True)
+
+MASK = "??"
+
+
+def tier_room(room, tier):
+    """The Socket.IO room a tier of `room` is sent to."""
+    if tier.name == PLAYERS.name:
+        return room
+    return f"{room}/{tier.name}"
+
+
+class RoomBroadcaster:
+    def __init__(self, room, send, hidden_cards=tuple, tiers=(PLAYERS, SPECTATORS), clock=time.monotonic):
+        # `send(event, data, to)` emits to a Socket.IO room and
+        # `hidden_cards()` returns the cards masked tiers must not see
+        self.room = room
+        self.send = send
+        self.hidden_cards = hidden_cards
+        self.tiers = tiers
+        self.clock = clock
+        # tier name -> (due time, line) not sent yet
+        self.pending = {tier.name: deque() for tier in tiers if tier.delay}
+        self.lock = threading.Lock()
+
+    def mask(self, line):
+        for card in self.hidden_cards():
+            line = line.replace(repr(card), MASK)
+        return line
+
+    def publish(self, line):
+        now = self.clock()
+        masked = None
+        for tier in self.tiers:
+            text = line
+            if tier.masked:
+                if masked is None:
+                    masked = self.mask(line)
+                text = masked
+
+            if tier.delay:
+                with self.lock:
+                    self.pending[tier.name].append((now + tier.delay, text))
+            else:
+                self.send("server_game_update", {"data": text}, tier_room(self.room, tier))
+
+    def flush(self, now=None):
+        """Send the delayed lines that are due, one message per tier."""
+        now = self.clock() if now is None else now
+        for tier in self.tiers:
+            if not tier.delay:
+                continue
+            pending = self.pending[tier.name]
+            with self.lock:
+                lines = []
+                while pending and pending[0][0] <= now:
+                    lines.append(pending.popleft()[1])
+            if lines:
+                self.send("server_game_updates", {"lines": lines}, tier_room(self.room, tier))
+
+
+class BroadcastHub:
+    """Flushes the delayed tiers of every room from one thread."""
+
+    def __init__(self, tick=0.25):
+        self.tick = tick
+        self.broadcasters = {}
+        self.lock = threading.Lock()
+
+    def add(self, broadcaster):
+        with self.lock:
+            self.broadcasters[broadcaster.room] = broadcaster
+
+    def remove(self, room):
+        with self.lock:
+            self.broadcasters.pop(room, None)
+
+    def flush(self, now=None):
+        with self.lock:
+            broadcasters = list(self.broadcasters.values())
+        for broadcaster in broadcasters:
+            broadcaster.flush(now)
+
+    def run(self, sleep=time.sleep):
+        while True:
+            sleep(self.tick)
+            self.flush()
@@ -40,6 +40,11 @@ def denom_strength(denom):
     return DENOMS.index(denom)
 
 
+def card_from_index(idx):
+    suit_idx, denom_idx = divmod(idx, len(DENOMS))
+    return Card(SUITS[suit_idx], DENOMS[denom_idx])
+
+
 
 class Card:
     def __init__(self, suit, denom):
@@ -67,6 +72,11 @@ class Card:
     @property
     def card_view(self):
         return self
+
+    @cached_property
+    def index(self):
+        # Position of the card in a fresh, unshuffled deck
+        return SUITS.index(self.suit) * len(DENOMS) + DENOMS.index(self.denom)
     
     def __repr__(self):
         return f"{self.denom if len(self.denom) <= 2 else self.denom[0]}{SUIT_SYMBOL[self.suit]}"
@@ -0,0 +1,458 @@
+"""
+Monte Carlo CFR for an abstraction of heads-up `Game`.
+
+The abstraction keeps the rules of `Game` for two players: blinds of 0.5 and
+1 (amounts are in big blinds), the small blind acts first on every street,
+and a raise to `price_to_call + k * minimum_raise` sets the minimum raise to
+`k * minimum_raise`. Raises are limited to the multiples `k` in `bet_sizes`
+plus all in, and to `max_raises` per street. Hands are bucketed per street by
+hand strength: the Chen score preflop, then the share of opponent hands beaten
+on the current board.
+
+An information set is (street, bucket, pot size bucket, this street's
+actions). It is hashed into a fixed number of rows, so memory stays the same
+however long training runs. Regrets and strategy sums are float64 tables of
+`capacity` rows by `num_actions`.
+
+Training uses external sampling with regrets floored at zero. Each epoch
+runs iterations in worker processes. The workers read the shared regret
+table and send back sparse deltas, which are added between epochs.
+Checkpoints are written atomically, and `train` resumes from one:
+
+    python cfr.py --iterations 1000000 --workers 8 --checkpoint cfr.npz
+
+`CFRStrategy` plays the average strategy through `StrategyPlayer`.
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+import zlib
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from functools import lru_cache
+from itertools import combinations
+import numpy as np
+from evaluator import NUM_CARDS, NUM_RANKS
+from strategy import CALL, FOLD, RAISE, Strategy
+from vector_game import evaluate
+
+Config = namedtuple("Config", ["stack", "bet_sizes", "max_raises", "buckets", "capacity"])
+DEFAULT_CONFIG = Config(
+    stack=100, bet_sizes=(2, 4), max_raises=3, buckets=(8, 8, 8, 8), capacity=1 << 18
+)
+
+# Number of community cards on each street
+BOARD_SIZE = (0, 3, 4, 5)
+# Actions are fold, call, one raise per bet size and then all in
+FOLD_ACTION, CALL_ACTION = 0, 1
+
+
+def num_actions(config):
+    return len(config.bet_sizes) + 3
+
+
+def chen_score(hole):
+    """Chen formula score of two hole cards, higher is better."""
+    high, low = sorted((card % NUM_RANKS for card in hole), reverse=True)
+    # Ace 10, king 8, queen 7, jack 6, then half the face value
+    score = {12: 10, 11: 8, 10: 7, 9: 6}.get(high, (high + 2) / 2)
+    if high == low:
+        return math.ceil(max(5, score * 2))
+    if hole[0] // NUM_RANKS == hole[1] // NUM_RANKS:
+        score += 2
+    gap = high - low - 1
+    score -= (0, 1, 2, 4, 5)[min(gap, 4)]
+    if gap <= 1 and high < 10:
+        score += 1
+    return math.ceil(score)
+
+
+CHEN_SCORES = sorted(chen_score(hole) for hole in combinations(range(NUM_CARDS), 2))
+
+
+@lru_cache(maxsize=1 << 16)
+def hand_strength(hole, board):
+    """Share of opponent hands that `hole` beats, ties counting half."""
+    if not board:
+        score = chen_score(hole)
+        below = bisect_left(CHEN_SCORES, score)
+        equal = bisect_right(CHEN_SCORES, score) - below
+        return (below + equal / 2) / len(CHEN_SCORES)
+
+    dead = set(hole) | set(board)
+    deck = [card for card in range(NUM_CARDS) if card not in dead]
+    opponents = np.array(list(combinations(deck, 2)))
+    boards = np.broadcast_to(np.array(board), (len(opponents), len(board)))
+    theirs = evaluate(np.concatenate([opponents, boards], axis=1))
+    mine = evaluate(np.array([list(hole) + list(board)]))[0]
+    return ((mine > theirs).sum() + (mine == theirs).sum() / 2) / len(opponents)
+
+
+def bucket(hole, board, num_buckets):
+    strength = hand_strength(tuple(sorted(hole)), tuple(sorted(board)))
+    return min(num_buckets - 1, int(strength * num_buckets))
+
+
+def info_row(street, hand_bucket, pot, history, capacity):
+    # Pot buckets double in size: under 2bb, under 4bb, ...
+    pot_bucket = min(7, max(0, int(math.log2(pot))))
+    key = f"{street}|{hand_bucket}|{pot_bucket}|{history}"
+    return zlib.crc32(key.encode()) % capacity
+
+
+State = namedtuple(
+    "State",
+    [
+        "street",
+        "player",         # 0 is the small blind, who acts first on every street
+        "contributions",  # to the pot this hand
+        "street_bets",
+        "price",
+        "minimum_raise",
+        "raises",
+        "history",        # this street: "c" for a check or call, "r" for a raise
+        "folded",         # the player who folded, if any
+        "showdown",
+    ],
+)
+
+PREFLOP = State(0, 0, (0.5, 1.0), (0.5, 1.0), 1.0, 1.0, 0, "", None, False)
+
+
+def legal_actions(config, state):
+    player = state.player
+    to_call = state.price - state.street_bets[player]
+    behind = config.stack - state.contributions[player]
+    actions = [FOLD_ACTION, CALL_ACTION] if to_call > 0 else [CALL_ACTION]
+    opponent_behind = config.stack - state.contributions[1 - player]
+    if state.raises < config.max_raises and behind > to_call and opponent_behind > 0:
+        for i, size in enumerate(config.bet_sizes):
+            # Raises that need the whole stack are the all in action
+            if state.price + size * state.minimum_raise - state.street_bets[player] < behind:
+                actions.append(2 + i)
+        actions.append(len(config.bet_sizes) + 2)
+    return actions
+
+
+def apply_action(config, state, action):
+    player = state.player
+    if action == FOLD_ACTION:
+        return state._replace(folded=player)
+
+    contributions = list(state.contributions)
+    street_bets = list(state.street_bets)
+    behind = config.stack - contributions[player]
+    if action == CALL_ACTION:
+        paid = min(state.price - street_bets[player], behind)
+        contributions[player] += paid
+        street_bets[player] += paid
+        # A call closes the street unless it is the first action on it
+        if state.history:
+            if state.street == 3 or config.stack in contributions:
+                return state._replace(contributions=tuple(contributions), showdown=True)
+            return PREFLOP._replace(
+                street=state.street + 1,
+                contributions=tuple(contributions),
+                street_bets=(0.0, 0.0),
+                price=0.0,
+            )
+        total, raise_amount, symbol = street_bets[player], 0, "c"
+    else:
+        if action == len(config.bet_sizes) + 2:
+            total = street_bets[player] + behind
+        else:
+            total = state.price + config.bet_sizes[action - 2] * state.minimum_raise
+        contributions[player] += total - street_bets[player]
+        street_bets[player] = total
+        raise_amount, symbol = total - state.price, "r"
+
+    return state._replace(
+        player=1 - player,
+        contributions=tuple(contributions),
+        street_bets=tuple(street_bets),
+        price=max(state.price, total),
+        minimum_raise=max(state.minimum_raise, raise_amount),
+        raises=state.raises + (symbol == "r"),
+        history=state.history + symbol,
+    )
+
+
+def payoff(state, strengths):
+    """Chips won by player 0 at a finished state."""
+    if state.folded is not None:
+        return state.contributions[1] if state.folded == 1 else -state.contributions[0]
+    # Only the matched part of the bets is at stake
+    matched = min(state.contributions)
+    if strengths[0] == strengths[1]:
+        return 0.0
+    return matched if strengths[0] > strengths[1] else -matched
+
+
+def regret_matching(regrets, actions):
+    positive = [max(regrets[a], 0.0) for a in actions]
+    total = sum(positive)
+    if total <= 0:
+        return [1 / len(actions)] * len(actions)
+    return [p / total for p in positive]
+
+
+class Traversal:
+    """External sampling passes whose updates are collected as sparse deltas."""
+
+    def __init__(self, config, regrets, rng):
+        self.config = config
+        self.regrets = regrets
+        self.rng = rng
+        self.regret_deltas = {}
+        self.strategy_deltas = {}
+
+    def run(self, iterations, first_traverser=0):
+        for i in range(iterations):
+            self.deal()
+            self.traverse(PREFLOP, (first_traverser + i) % 2)
+
+    def deal(self):
+        cards = self.rng.sample(range(NUM_CARDS), 9)
+        holes = (tuple(cards[0:2]), tuple(cards[2:4]))
+        board = cards[4:]
+        self.buckets = [
+            [
+                bucket(hole, board[: BOARD_SIZE[street]], self.config.buckets[street])
+                for street in range(len(BOARD_SIZE))
+            ]
+            for hole in holes
+        ]
+        self.strengths = evaluate(np.array([list(hole) + board for hole in holes]))
+
+    def add(self, deltas, row, actions, values):
+        entry = deltas.get(row)
+        if entry is None:
+            entry = deltas[row] = [0.0] * num_actions(self.config)
+        for action, value in zip(actions, values):
+            entry[action] += value
+
+    def traverse(self, state, traverser):
+        if state.folded is not None or state.showdown:
+            value = payoff(state, self.strengths)
+            return value if traverser == 0 else -value
+
+        player = state.player
+        actions = legal_actions(self.config, state)
+        row = info_row(
+            state.street,
+            self.buckets[player][state.street],
+            sum(state.contributions),
+            state.history,
+            self.config.capacity,
+        )
+        strategy = regret_matching(self.regrets[row], actions)
+
+        if player != traverser:
+            self.add(self.strategy_deltas, row, actions, strategy)
+            action = self.rng.choices(actions, strategy)[0]
+            return self.traverse(apply_action(self.config, state, action), traverser)
+
+        values = [
+            self.traverse(apply_action(self.config, state, action), traverser)
+            for action in actions
+        ]
+        node_value = sum(p * v for p, v in zip(strategy, values))
+        self.add(self.regret_deltas, row, actions, [v - node_value for v in values])
+        return node_value
+
+
+_worker_regrets = None
+
+
+def _init_worker(shared, config):
+    global _worker_regrets
+    _worker_regrets = np.frombuffer(shared).reshape(config.capacity, num_actions(config))
+
+
+def _run_chunk(config, seed, iterations, first_traverser):
+    traversal = Traversal(config, _worker_regrets, random.Random(seed))
+    traversal.run(iterations, first_traverser)
+    return traversal.regret_deltas, traversal.strategy_deltas
+
+
+class Trainer:
+    def __init__(self, config=DEFAULT_CONFIG, checkpoint=None):
+        self.config = config
+        self.checkpoint = checkpoint
+        shape = (config.capacity, num_actions(config))
+        # Shared with the worker processes, which only read it
+        self._shared = multiprocessing.RawArray("d", shape[0] * shape[1])
+        self.regrets = np.frombuffer(self._shared).reshape(shape)
+        self.strategy_sums = np.zeros(shape)
+        self.iterations = 0
+        if checkpoint and os.path.exists(checkpoint):
+            self.load(checkpoint)
+
+    def apply(self, regret_deltas, strategy_deltas):
+        for row, values in regret_deltas.items():
+            # Regrets are floored at zero, as in CFR+
+            np.maximum(self.regrets[row] + values, 0, out=self.regrets[row])
+        for row, values in strategy_deltas.items():
+            self.strategy_sums[row] += values
+
+    def train(self, iterations, workers=1, epoch=1000, checkpoint_every=600.0, seed=0, log=print):
+        global _worker_regrets
+        pool = None
+        if workers > 1:
+            pool = multiprocessing.Pool(
+                workers, initializer=_init_worker, initargs=(self._shared, self.config)
+            )
+        else:
+            _worker_regrets = self.regrets
+
+        last_checkpoint = time.monotonic()
+        target = self.iterations + iterations
+        try:
+            while self.iterations < target:
+                size = min(epoch, target - self.iterations)
+                chunks = [size // workers + (i < size % workers) for i in range(workers)]
+                tasks = [
+                    (self.config, hash((seed, self.iterations, i)), n, (self.iterations + i) % 2)
+                    for i, n in enumerate(chunks)
+                    if n
+                ]
+                results = pool.starmap(_run_chunk, tasks) if pool else [_run_chunk(*tasks[0])]
+                for regret_deltas, strategy_deltas in results:
+                    self.apply(regret_deltas, strategy_deltas)
+                self.iterations += size
+
+                if self.checkpoint and time.monotonic() - last_checkpoint >= checkpoint_every:
+                    self.save(self.checkpoint)
+                    last_checkpoint = time.monotonic()
+                    log(f"{self.iterations} iterations, checkpoint written to {self.checkpoint}")
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        if self.checkpoint:
+            self.save(self.checkpoint)
+
+    def save(self, path):
+        # Write aside and rename, so a crash never leaves half a checkpoint
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                regrets=self.regrets,
+                strategy_sums=self.strategy_sums,
+                iterations=self.iterations,
+                config=json.dumps(self.config._asdict()),
+            )
+        os.replace(tmp, path)
+
+    def load(self, path):
+        with np.load(path) as data:
+            config = Config(**json.loads(str(data["config"])))
+            if Config(*map(_listify, config)) != Config(*map(_listify, self.config)):
+                raise Exception(f"Checkpoint {path} was trained with {config}, not {self.config}.")
+            self.regrets[:] = data["regrets"]
+            self.strategy_sums[:] = data["strategy_sums"]
+            self.iterations = int(data["iterations"])
+
+
+def _listify(value):
+    # JSON turns tuples into lists
+    return list(value) if isinstance(value, (list, tuple)) else value
+
+
+def abstract_history(betting_history, price):
+    """This street's real actions as the abstraction's "c" and "r"."""
+    history = ""
+    for _, action, total_bet in betting_history:
+        if action in ("SB", "BB", "FOLD"):
+            continue
+        if action == "RAISE" or (action == "ALL IN" and total_bet > price):
+            history += "r"
+            price = total_bet
+        else:
+            history += "c"
+    return history
+
+
+class CFRStrategy(Strategy):
+    """Plays the average strategy of a `Trainer`.
+
+    Every raise of the abstraction maps to "R". Tables with more than two
+    players are played as if the opponents were one.
+    """
+
+    def __init__(self, trainer, seed=None):
+        self.config = trainer.config
+        self.strategy_sums = trainer.strategy_sums
+        self.rng = random.Random(seed)
+
+    @classmethod
+    def from_checkpoint(cls, path, config=DEFAULT_CONFIG, seed=None):
+        return cls(Trainer(config, checkpoint=path), seed=seed)
+
+    def probabilities(self, observation):
+        if len(observation.hole) != 2:
+            raise Exception("CFR strategies are trained for hold'em only.")
+        bb = observation.big_blind
+        street = BOARD_SIZE.index(len(observation.board))
+        hand_bucket = bucket(observation.hole, observation.board, self.config.buckets[street])
+        opening_price = bb if street == 0 else 0
+        history = abstract_history(observation.betting_history, opening_price)
+        row = info_row(street, hand_bucket, observation.pot / bb, history, self.config.capacity)
+
+        sums = self.strategy_sums[row]
+        total = sums.sum()
+        if total <= 0:
+            sums, total = np.ones(len(sums)), len(sums)
+        return {
+            FOLD: sums[FOLD_ACTION] / total,
+            CALL: sums[CALL_ACTION] / total,
+            RAISE: sums[2:].sum() / total,
+        }
+
+    def decide(self, observation):
+        probabilities = self.probabilities(observation)
+        to_call = observation.price_to_call - observation.bets[observation.seat]
+        if to_call <= 0:
+            # Never fold when checking is free
+            probabilities[CALL] += probabilities.pop(FOLD)
+        if RAISE not in observation.legal_actions:
+            probabilities[CALL] += probabilities.pop(RAISE)
+        actions = list(probabilities)
+        return self.rng.choices(actions, [probabilities[a] for a in actions])[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train a CFR strategy for heads-up hold'em")
+    parser.add_argument("--iterations", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--epoch", type=int, default=2000, help="iterations between table updates")
+    parser.add_argument("--checkpoint", default="cfr.npz")
+    parser.add_argument("--checkpoint-every", type=float, default=600.0, help="seconds")
+    parser.add_argument("--capacity", type=int, default=DEFAULT_CONFIG.capacity, help="info set rows")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    trainer = Trainer(DEFAULT_CONFIG._replace(capacity=args.capacity), checkpoint=args.checkpoint)
+    start, done = time.monotonic(), trainer.iterations
+    trainer.train(
+        args.iterations,
+        workers=args.workers,
+        epoch=args.epoch,
+        checkpoint_every=args.checkpoint_every,
+        seed=args.seed,
+    )
+    rate = (trainer.iterations - done) / (time.monotonic() - start)
+    print(f"{trainer.iterations} iterations in total, {rate:.1f} iterations/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
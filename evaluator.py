@@ -0,0 +1,356 @@
+"""
+Hand strength as a single int.
+
+Cards are ints in [0, 52), the position of the card in a fresh `Deck` (see
+`Card.index`). A strength orders hands exactly as `Hand` comparisons do: the
+category sits above bit 20 and the five deciding ranks follow as 4-bit
+nibbles, most significant first. Ranks are indices into `card.DENOMS`.
+
+The lookup tables take a while to build, so the first process to build
+them saves them to `TABLE_CACHE` and later ones map that file instead.
+"""
+
+import mmap
+import os
+from array import array
+from functools import lru_cache
+from itertools import combinations, combinations_with_replacement
+from time import perf_counter
+from card import DENOMS, SUITS
+
+_tables_start = perf_counter()
+
+# In the user's cache directory, never next to the source. Set
+# POKER_TABLE_CACHE to another file, or to an empty string to always build
+# the tables
+TABLE_CACHE = os.environ.get(
+    "POKER_TABLE_CACHE",
+    os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+        "poker",
+        "evaluator_tables.bin",
+    ),
+)
+# Bump whenever a table changes, so stale cache files are rebuilt
+TABLES_VERSION = 1
+TABLE_NAMES = ("top_five", "straight_top", "unsuited_keys", "unsuited_strengths", "flush", "low")
+
+NUM_RANKS = len(DENOMS)
+NUM_SUITS = len(SUITS)
+NUM_CARDS = NUM_RANKS * NUM_SUITS
+
+(
+    HIGH_CARD,
+    ONE_PAIR,
+    TWO_PAIR,
+    THREE_OF_A_KIND,
+    STRAIGHT,
+    FLUSH,
+    FULL_HOUSE,
+    FOUR_OF_A_KIND,
+    STRAIGHT_FLUSH,
+) = range(9)
+CATEGORY_SHIFT = 20
+
+# `Hand.ranking` names, by category
+CATEGORY_NAMES = [
+    "HIGH CARD",
+    "ONE PAIR",
+    "TWO PAIR",
+    "THREE OF A KIND",
+    "STRAIGHT",
+    "FLUSH",
+    "FULL HOUSE",
+    "FOUR OF A KIND",
+    "STRAIGHT FLUSH",
+]
+
+
+def _build_rank_mask_tables():
+    # Both tables are indexed by a 13-bit mask of the ranks present
+    top_five = [0] * (1 << NUM_RANKS)
+    straight_top = [-1] * (1 << NUM_RANKS)
+    for bits in range(1 << NUM_RANKS):
+        ranks = [r for r in reversed(range(NUM_RANKS)) if bits >> r & 1][:5]
+        packed = 0
+        for rank in ranks + [0] * (5 - len(ranks)):
+            packed = packed << 4 | rank
+        top_five[bits] = packed
+
+        # Shift up one place and copy the ace to the bottom for the wheel
+        low_ace_bits = bits << 1 | bits >> (NUM_RANKS - 1) & 1
+        for top in range(NUM_RANKS, 3, -1):
+            window = 0b11111 << (top - 4)
+            if low_ace_bits & window == window:
+                straight_top[bits] = top - 1
+                break
+    return top_five, straight_top
+
+
+def _load_tables(path):
+    # {name: list}, or None if the file is missing, truncated or out of
+    # date. The file is int64s: version, table count, the table lengths,
+    # then the tables
+    if not path or not os.path.exists(path):
+        return None
+    header = 2 + len(TABLE_NAMES)
+    size = os.path.getsize(path)
+    if size < header * 8 or size % 8:
+        return None
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        with memoryview(mapped) as view, view.cast("q") as ints:
+            if len(ints) < header or ints[0] != TABLES_VERSION or ints[1] != len(TABLE_NAMES):
+                return None
+            lengths = ints[2:header].tolist()
+            if len(ints) != header + sum(lengths):
+                return None
+            tables, start = {}, header
+            # Copied into lists, which index faster than the mapped memory
+            for name, length in zip(TABLE_NAMES, lengths):
+                tables[name] = ints[start : start + length].tolist()
+                start += length
+            return tables
+
+
+def save_tables(path):
+    tables = [
+        TOP_FIVE,
+        STRAIGHT_TOP,
+        list(FIVE_CARD_UNSUITED),
+        list(FIVE_CARD_UNSUITED.values()),
+        FIVE_CARD_FLUSH,
+        LOW_EIGHT,
+    ]
+    ints = array("q", [TABLES_VERSION, len(tables)] + [len(table) for table in tables])
+    for table in tables:
+        ints.extend(table)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # Written aside and moved into place, so readers never see half a file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        ints.tofile(f)
+    os.replace(tmp, path)
+
+
+try:
+    _cached = _load_tables(TABLE_CACHE)
+except (OSError, ValueError, TypeError):
+    # Unreadable or corrupt: built again below, which rewrites the file
+    _cached = None
+
+# Highest five ranks of a mask, packed as nibbles
+if _cached:
+    TOP_FIVE, STRAIGHT_TOP = _cached["top_five"], _cached["straight_top"]
+else:
+    TOP_FIVE, STRAIGHT_TOP = _build_rank_mask_tables()
+
+
+def category(strength):
+    return strength >> CATEGORY_SHIFT
+
+
+def evaluate(cards):
+    """Strength of the best five-card hand among `cards` (at least 5)."""
+    rank_counts = [0] * NUM_RANKS
+    suit_counts = [0] * NUM_SUITS
+    suit_bits = [0] * NUM_SUITS
+    for card in cards:
+        suit, rank = divmod(card, NUM_RANKS)
+        rank_counts[rank] += 1
+        suit_counts[suit] += 1
+        suit_bits[suit] |= 1 << rank
+    rank_bits = suit_bits[0] | suit_bits[1] | suit_bits[2] | suit_bits[3]
+
+    flush_bits = 0
+    for suit in range(NUM_SUITS):
+        if suit_counts[suit] >= 5 and TOP_FIVE[suit_bits[suit]] > TOP_FIVE[flush_bits]:
+            flush_bits = suit_bits[suit]
+
+    if flush_bits:
+        top = max(
+            STRAIGHT_TOP[suit_bits[s]] for s in range(NUM_SUITS) if suit_counts[s] >= 5
+        )
+        if top >= 0:
+            return STRAIGHT_FLUSH << CATEGORY_SHIFT | top << 16
+
+    # The two largest groups of equal rank, larger and then higher first
+    key0 = key1 = -1
+    for rank in range(NUM_RANKS):
+        key = rank_counts[rank] << 4 | rank
+        if key > key0:
+            key0, key1 = key, key0
+        elif key > key1:
+            key1 = key
+    c0, r0 = divmod(key0, 16)
+    c1, r1 = divmod(key1, 16)
+    rest0 = rank_bits & ~(1 << r0)
+
+    if c0 == 4:
+        return FOUR_OF_A_KIND << CATEGORY_SHIFT | r0 << 16 | TOP_FIVE[rest0] >> 16 << 12
+    if c0 == 3 and c1 >= 2:
+        return FULL_HOUSE << CATEGORY_SHIFT | r0 << 16 | r1 << 12
+    if flush_bits:
+        return FLUSH << CATEGORY_SHIFT | TOP_FIVE[flush_bits]
+    if STRAIGHT_TOP[rank_bits] >= 0:
+        return STRAIGHT << CATEGORY_SHIFT | STRAIGHT_TOP[rank_bits] << 16
+    if c0 == 3:
+        return THREE_OF_A_KIND << CATEGORY_SHIFT | r0 << 16 | TOP_FIVE[rest0] >> 12 << 8
+    if c0 == 2 and c1 == 2:
+        rest01 = rest0 & ~(1 << r1)
+        return TWO_PAIR << CATEGORY_SHIFT | r0 << 16 | r1 << 12 | TOP_FIVE[rest01] >> 16 << 8
+    if c0 == 2:
+        return ONE_PAIR << CATEGORY_SHIFT | r0 << 16 | TOP_FIVE[rest0] >> 8 << 4
+    return HIGH_CARD << CATEGORY_SHIFT | TOP_FIVE[rank_bits]
+
+
+# A multiset of ranks sums to a unique key while no rank appears 5 times
+RANK_KEYS = [5**rank for rank in range(NUM_RANKS)]
+
+
+def _build_five_card_tables():
+    unsuited = {}
+    for ranks in combinations_with_replacement(range(NUM_RANKS), 5):
+        if any(ranks.count(rank) > 4 for rank in ranks):
+            continue
+        # Cycle the suits so the five cards can never make a flush
+        cards = [rank + i % NUM_SUITS * NUM_RANKS for i, rank in enumerate(ranks)]
+        unsuited[sum(RANK_KEYS[rank] for rank in ranks)] = evaluate(cards)
+
+    flush = [0] * (1 << NUM_RANKS)
+    for ranks in combinations(range(NUM_RANKS), 5):
+        flush[sum(1 << rank for rank in ranks)] = evaluate(ranks)
+    return unsuited, flush
+
+
+# Five-card strengths, by sum of rank keys and by suited rank mask
+if _cached:
+    FIVE_CARD_UNSUITED = dict(zip(_cached["unsuited_keys"], _cached["unsuited_strengths"]))
+    FIVE_CARD_FLUSH = _cached["flush"]
+else:
+    FIVE_CARD_UNSUITED, FIVE_CARD_FLUSH = _build_five_card_tables()
+
+
+# Low ranks count the ace as one: A-8 map to bits 0-7 of a low mask
+NUM_LOW_RANKS = 8
+NO_LOW = 0
+
+
+def _build_low_table():
+    # Best (lowest) five distinct ranks of an 8-bit low mask. Packed like a
+    # high strength, then flipped so a better low is a larger int
+    low = [NO_LOW] * (1 << NUM_LOW_RANKS)
+    for bits in range(1 << NUM_LOW_RANKS):
+        ranks = [r for r in range(NUM_LOW_RANKS) if bits >> r & 1][:5]
+        if len(ranks) == 5:
+            packed = 0
+            for rank in reversed(ranks):
+                packed = packed << 4 | rank
+            low[bits] = (1 << CATEGORY_SHIFT) - packed
+    return low
+
+
+# Eight-or-better low strength by low mask, NO_LOW if it does not qualify
+LOW_EIGHT = _cached["low"] if _cached else _build_low_table()
+
+# Where the tables came from and how long that took, for startup metrics
+TABLES_SOURCE = "cache" if _cached else "built"
+if not _cached and TABLE_CACHE:
+    try:
+        save_tables(TABLE_CACHE)
+    except OSError:
+        # Without a writable cache directory the tables are built every time
+        pass
+TABLES_SECONDS = perf_counter() - _tables_start
+del _cached
+
+
+def low_mask(rank_bits):
+    """Low mask of a 13-bit rank mask: the ace moves to the bottom, 9+ drop."""
+    return (rank_bits & 0b1111111) << 1 | rank_bits >> (NUM_RANKS - 1) & 1
+
+
+def evaluate_low(cards):
+    """Eight-or-better low strength of the best five of `cards`, or NO_LOW."""
+    rank_bits = 0
+    for card in cards:
+        rank_bits |= 1 << card % NUM_RANKS
+    return LOW_EIGHT[low_mask(rank_bits)]
+
+
+@lru_cache(maxsize=4096)
+def _board_triples(board):
+    keys = set()
+    suited = {}
+    lows = set()
+    for triple in combinations(board, 3):
+        suits = {card // NUM_RANKS for card in triple}
+        ranks = [card % NUM_RANKS for card in triple]
+        keys.add(sum(RANK_KEYS[rank] for rank in ranks))
+        if len(suits) == 1:
+            suited.setdefault(suits.pop(), []).append(sum(1 << rank for rank in ranks))
+        triple_low = low_mask(sum(1 << rank for rank in set(ranks)))
+        if bin(triple_low).count("1") == 3:
+            lows.add(triple_low)
+    return tuple(keys), suited, tuple(lows)
+
+
+def _omaha_high(hole, triple_keys, suited_triples):
+    pair_keys = set()
+    best = 0
+    for a, b in combinations(hole, 2):
+        suit_a, rank_a = divmod(a, NUM_RANKS)
+        suit_b, rank_b = divmod(b, NUM_RANKS)
+        pair_keys.add(RANK_KEYS[rank_a] + RANK_KEYS[rank_b])
+        if suit_a == suit_b:
+            pair_mask = 1 << rank_a | 1 << rank_b
+            for triple_mask in suited_triples.get(suit_a, ()):
+                best = max(best, FIVE_CARD_FLUSH[pair_mask | triple_mask])
+
+    return max(
+        best,
+        max(FIVE_CARD_UNSUITED[p + t] for p in pair_keys for t in triple_keys),
+    )
+
+
+def evaluate_omaha(hole, board):
+    """Strength of the best hand using exactly two of `hole` and three of `board`.
+
+    Each two-card and three-card part is reduced to a rank key, so a five-card
+    hand is one table lookup. Flushes are only looked up for suited pairs
+    against board triples of the same suit.
+    """
+    triple_keys, suited_triples, _ = _board_triples(tuple(sorted(board)))
+    return _omaha_high(hole, triple_keys, suited_triples)
+
+
+def evaluate_omaha_hilo(hole, board):
+    """High strength and eight-or-better low strength (or NO_LOW) for Omaha.
+
+    Both come from the same board triples; a low is two distinct low hole
+    ranks plus three other distinct low board ranks, one lookup in LOW_EIGHT.
+    """
+    triple_keys, suited_triples, triple_lows = _board_triples(tuple(sorted(board)))
+    high = _omaha_high(hole, triple_keys, suited_triples)
+
+    low = NO_LOW
+    if triple_lows:
+        hole_low = low_mask(sum(1 << rank for rank in {card % NUM_RANKS for card in hole}))
+        pair_lows = [
+            1 << a | 1 << b
+            for a, b in combinations(range(NUM_LOW_RANKS), 2)
+            if hole_low >> a & 1 and hole_low >> b & 1
+        ]
+        for pair in pair_lows:
+            for triple in triple_lows:
+                if not pair & triple:
+                    low = max(low, LOW_EIGHT[pair | triple])
+    return high, low
+
+
+if __name__ == "__main__":
+    # Build the table cache ahead of time, e.g. when baking an image
+    import sys
+
+    path = sys.argv[1] if len(sys.argv) > 1 else TABLE_CACHE
+    save_tables(path)
+    print(f"Saved evaluator tables to {path}")
@@ -0,0 +1,205 @@
+"""
+Columnar export of hand histories.
+
+Hands are written in chunks of `chunk_size` to `hands-<n>.npz` files of
+NumPy columns, so memory stays bounded however many hands are exported.
+Like Arrow, nested data is flattened: seats, boards and actions each have
+their own columns, with per-hand offsets into them (the rows of hand i are
+`offsets[i]:offsets[i + 1]`).
+
+Player ids and variants are dictionary encoded; the dictionaries are kept
+in `dictionary.json`. Cards are packed into one int64, six bits per card
+holding the card int plus one, so 0 means no card (see `unpack_cards`).
+
+    exporter = HandExporter("hands")
+    game.add_hand_listener(exporter.add)
+    ...
+    exporter.close()
+    columns = load("hands")
+"""
+
+import glob
+import json
+import os
+import threading
+import numpy as np
+from game import VARIANTS
+
+STREETS = ("preflop", "flop", "turn", "river")
+ACTIONS = ("SB", "BB", "FOLD", "CHECK", "CALL", "RAISE", "ALL IN")
+
+CARD_BITS = 6
+
+HAND_COLUMNS = {
+    "hand_id": np.int64,
+    "variant": np.int8,
+    "big_blind": np.float64,
+    "pot": np.float64,
+    "seat_offsets": np.int64,
+    "board_offsets": np.int64,
+    "action_offsets": np.int64,
+}
+SEAT_COLUMNS = {
+    "player": np.int32,
+    "position": np.int8,     # seats after the button, 0 being the button
+    "hole": np.int64,
+    "starting_stack": np.float64,
+    "final_stack": np.float64,
+    "winnings": np.float64,
+    "showdown": np.bool_,
+}
+BOARD_COLUMNS = {"board": np.int64}
+ACTION_COLUMNS = {
+    "action_player": np.int32,
+    "street": np.int8,
+    "action": np.int8,
+    "amount": np.float64,
+}
+OFFSET_COLUMNS = {"seat_offsets": "player", "board_offsets": "board", "action_offsets": "action_player"}
+
+
+def pack_cards(cards):
+    packed = 0
+    for i, card in enumerate(cards):
+        packed |= (card + 1) << (CARD_BITS * i)
+    return packed
+
+
+def unpack_cards(packed, count):
+    """(len(packed), count) card ints, -1 where there is no card."""
+    shifts = np.arange(count, dtype=np.int64) * CARD_BITS
+    return ((np.asarray(packed, dtype=np.int64)[:, None] >> shifts) & (2**CARD_BITS - 1)) - 1
+
+
+class HandExporter:
+    def __init__(self, directory, chunk_size=100000):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        os.makedirs(directory, exist_ok=True)
+        self.chunks = len(glob.glob(os.path.join(directory, "hands-*.npz")))
+        self.players = self._load_dictionary().get("players", [])
+        self.player_codes = {player_id: code for code, player_id in enumerate(self.players)}
+        self.variants = list(VARIANTS)
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _load_dictionary(self):
+        path = os.path.join(self.directory, "dictionary.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _reset(self):
+        self.columns = {
+            name: [] for name in {**HAND_COLUMNS, **SEAT_COLUMNS, **BOARD_COLUMNS, **ACTION_COLUMNS}
+        }
+        self.hands = 0
+
+    def _code(self, player_id):
+        code = self.player_codes.get(player_id)
+        if code is None:
+            code = self.player_codes[player_id] = len(self.players)
+            self.players.append(player_id)
+        return code
+
+    def add(self, record):
+        """Add a `HandRecord`; usable as a `Game` hand listener."""
+        with self.lock:
+            c = self.columns
+            c["hand_id"].append(record.hand_id)
+            c["variant"].append(self.variants.index(record.variant))
+            c["big_blind"].append(record.big_blind)
+            c["pot"].append(sum(record.winnings))
+            c["seat_offsets"].append(len(c["player"]))
+            c["board_offsets"].append(len(c["board"]))
+            c["action_offsets"].append(len(c["action_player"]))
+
+            num_seats = len(record.players)
+            for seat, player_id in enumerate(record.players):
+                c["player"].append(self._code(player_id))
+                c["position"].append((seat - record.dealer) % num_seats)
+                c["hole"].append(pack_cards(record.hole_cards[seat]))
+                c["starting_stack"].append(record.starting_stacks[seat])
+                c["final_stack"].append(record.final_stacks[seat])
+                c["winnings"].append(record.winnings[seat])
+                c["showdown"].append(player_id in record.showdown)
+            for board in record.boards:
+                c["board"].append(pack_cards(board))
+            for street, actions in record.actions.items():
+                for player_id, action, amount in actions:
+                    c["action_player"].append(self._code(player_id))
+                    c["street"].append(STREETS.index(street))
+                    c["action"].append(ACTIONS.index(action))
+                    c["amount"].append(amount)
+
+            self.hands += 1
+            if self.hands >= self.chunk_size:
+                self._write_chunk()
+
+    def _write_chunk(self):
+        if not self.hands:
+            return
+        c = self.columns
+        # Close the offsets with the end of the last hand
+        ends = {name: len(c[rows]) for name, rows in OFFSET_COLUMNS.items()}
+        arrays = {}
+        for dtypes in (HAND_COLUMNS, SEAT_COLUMNS, BOARD_COLUMNS, ACTION_COLUMNS):
+            for name, dtype in dtypes.items():
+                values = c[name] + [ends[name]] if name in ends else c[name]
+                arrays[name] = np.array(values, dtype=dtype)
+
+        name = f"hands-{self.chunks:05d}.npz"
+        # Outside the chunk glob, so an unfinished write is never read
+        partial = os.path.join(self.directory, f".tmp-{name}")
+        np.savez(partial, **arrays)
+
+        # In place before the chunk is, so every code in a chunk on disk is
+        # in the dictionary even if the process dies in between
+        dictionary = os.path.join(self.directory, "dictionary.json")
+        with open(dictionary + ".tmp", "w") as f:
+            json.dump({"players": self.players, "variants": self.variants}, f)
+        os.replace(dictionary + ".tmp", dictionary)
+
+        os.replace(partial, os.path.join(self.directory, name))
+        self.chunks += 1
+        self._reset()
+
+    def flush(self):
+        with self.lock:
+            self._write_chunk()
+
+    def close(self):
+        self.flush()
+
+
+def iter_chunks(directory):
+    """The columns of each chunk in order, as dicts of NumPy arrays."""
+    for path in sorted(glob.glob(os.path.join(directory, "hands-*.npz"))):
+        with np.load(path) as chunk:
+            yield {name: chunk[name] for name in chunk.files}
+
+
+def load(directory):
+    """All chunks as one dict of NumPy arrays, offsets rebased, with the
+    dictionaries under "players" and "variants".
+    """
+    with open(os.path.join(directory, "dictionary.json")) as f:
+        dictionary = json.load(f)
+
+    parts = {}
+    bases = {name: 0 for name in OFFSET_COLUMNS}
+    for chunk in iter_chunks(directory):
+        for name, values in chunk.items():
+            if name in OFFSET_COLUMNS:
+                # Every chunk but the last drops its closing offset
+                if parts.get(name):
+                    parts[name][-1] = parts[name][-1][:-1]
+                values = values + bases[name]
+                bases[name] = values[-1]
+            parts.setdefault(name, []).append(values)
+
+    columns = {name: np.concatenate(values) for name, values in parts.items()}
+    columns["players"] = np.array(dictionary["players"], dtype=object)
+    columns["variants"] = np.array(dictionary["variants"], dtype=object)
+    return columns
@@ -1,13 +1,112 @@
-from collections import defaultdict, deque
+from collections import defaultdict, deque, namedtuple
+from itertools import combinations
+from math import comb
+import random
+from time import perf_counter
+import betting
+from betting import BOARD_SIZES, STRUCTURES
+from card import DENOMS, SUITS
 from deck import Deck
-from hand import Hand
+from evaluator import NO_LOW, evaluate, evaluate_omaha, evaluate_omaha_hilo
+from hand import Hand, OmahaHand, OmahaHiLoHand
+from metrics import GameMetrics
+from seats import SeatRing
 from utils import print_and_emit
 
+# How many hole cards each player gets, how a hand is made from them,
+# whether each pot is split with the best eight-or-better low, and the
+# strength of card ints (a (high, low) pair for hi-lo)
+Variant = namedtuple("Variant", ["name", "hole_cards", "make_hand", "hi_lo", "strength"])
+
+VARIANTS = {
+    "holdem": Variant("holdem", 2, lambda hole, board: Hand(hole + board), False, lambda hole, board: evaluate(hole + board)),
+    "omaha": Variant("omaha", 4, OmahaHand, False, evaluate_omaha),
+    "omaha5": Variant("omaha5", 5, OmahaHand, False, evaluate_omaha),
+    "omaha6": Variant("omaha6", 6, OmahaHand, False, evaluate_omaha),
+    "omaha8": Variant("omaha8", 4, OmahaHiLoHand, True, evaluate_omaha_hilo),
+}
+
+
+# A finished hand. Per-player fields line up with `players` (ids in seat
+# order); cards are card ints; `actions` maps each street played to its
+# (player id, action, total bet) tuples; `boards` holds one board per run
+# and `showdown` the ids of the players who showed down.
+HandRecord = namedtuple(
+    "HandRecord",
+    [
+        "hand_id",
+        "variant",
+        "big_blind",
+        "dealer",
+        "players",
+        "hole_cards",
+        "boards",
+        "actions",
+        "starting_stacks",
+        "final_stacks",
+        "winnings",
+        "showdown",
+    ],
+)
+
+
+def _pot_shares(strengths, hi_lo):
+    # Share of the pot each hand wins on one board, ties split
+    if hi_lo:
+        highs = _pot_shares([high for high, _ in strengths], False)
+        lows = [low for _, low in strengths]
+        if max(lows) == NO_LOW:
+            return highs
+        return [(high + low) / 2 for high, low in zip(highs, _pot_shares(lows, False))]
+    best = max(strengths)
+    winners = strengths.count(best)
+    return [1 / winners if strength == best else 0.0 for strength in strengths]
+
+
+def runout_equity(variant, holes, board, deck, samples=500, rng=random):
+    """Pot share each of `holes` can expect over the runouts of `board`.
+
+    Cards are card ints. Every runout from `deck` is used when there are at
+    most `samples` of them, otherwise `samples` are drawn with `rng`.
+    """
+    missing = 5 - len(board)
+    if comb(len(deck), missing) <= samples:
+        runouts = combinations(deck, missing)
+    else:
+        runouts = (rng.sample(deck, missing) for _ in range(samples))
+
+    totals = [0.0] * len(holes)
+    count = 0
+    for runout in runouts:
+        full_board = board + list(runout)
+        shares = _pot_shares([variant.strength(hole, full_board) for hole in holes], variant.hi_lo)
+        totals = [total + share for total, share in zip(totals, shares)]
+        count += 1
+    return [total / count for total in totals]
+
 
 class Game:
-    def __init__(self, emit_func=None):
+    def __init__(self, emit_func=None, variant="holdem", structure="no-limit", runs=1):
+        if variant not in VARIANTS:
+            raise Exception(f"Unknown variant {variant}, expected one of {list(VARIANTS)}.")
+        if structure not in STRUCTURES:
+            raise Exception(f"Unknown betting structure {structure}, expected one of {list(STRUCTURES)}.")
+        if runs < 1:
+            raise Exception(f"The board has to be run at least once, got {runs}.")
+        self.variant = VARIANTS[variant]
+        self.structure = STRUCTURES[structure]
+        # How many boards are dealt when everyone left is all in
+        self.runs = runs
+        # Runouts sampled for the all-in equity shown to the room; 0 turns
+        # it off, as for games nobody watches
+        self.equity_samples = 500 if emit_func else 0
+        # Kept apart from the deck's shuffles
+        self.equity_rng = random.Random()
+        # player id -> pot share, for the last all-in runout
+        self.all_in_equity = {}
         self.players = []
         self.inactive_players = []
+        self.waiting_players = deque()
         self.dealer_idx = 0
         self.deck = Deck()
         self.curr_pot = 0
@@ -18,13 +117,22 @@ class Game:
         self.player_prev_bet = defaultdict(int)
         self.player_total_bet_this_hand = defaultdict(int)
         self.player_hand = {}
+        self.starting_stacks = {}
+        self.hand_winnings = defaultdict(float)
+        self.boards = []
+        self.hands_played = 0
+        # Called with the `HandRecord` of every hand played
+        self.hand_listeners = []
         self.rounds = [self.preflop, self.flop, self.turn, self.river]
         self.print = print_and_emit(emit_func) if emit_func else print
+        self.metrics = None
         
 
     def deal_players(self):
         assert len(self.players) >= 2
-        for card_num in range(2):
+        # Hole cards, then three burns and five community cards
+        assert len(self.players) * self.variant.hole_cards + 8 <= len(SUITS) * len(DENOMS)
+        for card_num in range(self.variant.hole_cards):
             for i in range(len(self.players)):
                 player_idx = self.dealer_idx + i + 1
                 card = self.deck.pop()
@@ -37,15 +145,16 @@ class Game:
         assert self.bb > 0
         bb, sb = self.bb, self.bb / 2
 
+        # A short stack may post less than the full blind
         sb_player = self.player_at_idx(sb_idx)
-        sb_player.pay_blind(sb)
+        sb = sb_player.pay_blind(sb)
         self.player_prev_bet[sb_player] = sb
         self.betting_history.append((sb_player.get_id(), "SB", sb))
         self.player_total_bet_this_hand[sb_player] += sb
         self.print(f"{sb_player} has paid small blind {sb}")
 
         bb_player = self.player_at_idx(bb_idx)
-        bb_player.pay_blind(bb)
+        bb = bb_player.pay_blind(bb)
         self.player_prev_bet[bb_player] = bb
         self.betting_history.append((bb_player.get_id(), "BB", bb))
         self.player_total_bet_this_hand[bb_player] += bb
@@ -56,13 +165,6 @@ class Game:
     def player_at_idx(self, idx):
         return self.players[idx % len(self.players)]
 
-    def players_circular_view(self, idx):
-        idx %= len(self.players)
-        return self.players[idx:] + self.players[:idx]
-
-    def all_players_after(self, player):
-        return self.players_circular_view(self.players.index(player))[1:]
-
     def players_in_current_hand(self):
         return [p for p in self.players if p.state in ["playing", "all in"]]
 
@@ -79,6 +181,9 @@ class Game:
         self.community_cards.clear()
         self.player_total_bet_this_hand.clear()
         self.player_hand.clear()
+        self.history_all_rounds.clear()
+        self.hand_winnings.clear()
+        self.boards = []
 
         # Pass the button on
         self.dealer_idx += 1
@@ -88,7 +193,13 @@ class Game:
         if shuffle:
             self.deck.reset_and_shuffle()
 
-        # TODO: this is the place to seat waiting players
+        # Seat players who joined while the previous hand was running
+        while self.waiting_players:
+            player = self.waiting_players.popleft()
+            player.initialize_hand()
+            self.players.append(player)
+
+        self.starting_stacks = {player: player.cash for player in self.players}
 
     def initialize_round(self):
 
@@ -130,7 +241,6 @@ class Game:
             price_to_call = self.bb
         else:
             price_to_call = 0
-        minimum_raise = self.bb
 
         if is_preflop:
             # BTN + 3 == UTG
@@ -139,38 +249,68 @@ class Game:
             # BTN + 1 == SB
             first_to_act = self.dealer_idx + 1
 
-        player_queue = deque(self.players_circular_view(first_to_act))
+        seats = SeatRing(self.players)
+        seat = seats.first_active_from(first_to_act)
+        # Players still to act in the current lap; a raise starts a new lap
+        to_act = seats.num_active
         players_to_act = self.num_players_in_current_hand()
 
-        while player_queue and players_to_act > 1:
-            curr_player = player_queue.popleft()
-            if curr_player.state != "playing":
-                continue
-            total_bet, raise_amount = curr_player.bet(price_to_call, minimum_raise)
-
-            if curr_player.state != "folded":
+        street = BOARD_SIZES.index(len(self.community_cards))
+        # The chips of the round; players only hand back an intent, which
+        # the betting rules apply here
+        chips = betting.RoundState(
+            [player.cash for player in self.players],
+            [self.player_prev_bet[player] for player in self.players],
+            price_to_call,
+            self.bb,
+            self.curr_pot,
+        )
+
+        metrics = self.metrics
+        iterations = 0
+
+        while to_act > 0 and players_to_act > 1:
+            curr_player = self.players[seat]
+            # Nobody is left to call a bet from the last player who can act
+            if seats.num_active == 1 and chips.bets[seat] >= chips.price_to_call:
+                break
+            iterations += 1
+            legal = betting.legal_actions_at(self.structure, chips, seat, self.bb, street)
+            if metrics is None:
+                intent = curr_player.decide(chips.price_to_call, chips.minimum_raise, legal)
+            else:
+                start = perf_counter()
+                intent = curr_player.decide(chips.price_to_call, chips.minimum_raise, legal)
+                metrics.record("player_decision", perf_counter() - start)
+
+            prev_bet = chips.bets[seat]
+            total_bet, raise_amount, state = betting.apply(chips, seat, intent, legal)
+            curr_player.settle(chips.stacks[seat], total_bet, state)
+            to_act -= 1
+            if state != "playing":
+                seats.remove(seat)
+
+            if state != "folded":
                 # It's a raise
                 if raise_amount > 0:
-                    price_to_call = total_bet
-                    minimum_raise = max(minimum_raise, raise_amount)
-                    player_queue = deque(self.all_players_after(curr_player))
+                    to_act = seats.num_active - seats.is_active(seat)
                     player_action = "RAISE"
                     self.print(f"{curr_player} raises to {total_bet}")
                 # It's a check / call
                 else:
-                    if total_bet == self.player_prev_bet[curr_player]:
+                    if total_bet == prev_bet:
                         player_action = "CHECK"
                         self.print(f"{curr_player} checks")
                     else:
                         player_action = "CALL"
                         self.print(f"{curr_player} calls")
 
-                if curr_player.state == "all in":
+                if state == "all in":
                     player_action = "ALL IN"
                     self.print(f"{curr_player} goes all in with {total_bet}")
 
-                self.curr_pot += total_bet - self.player_prev_bet[curr_player]
-                self.player_total_bet_this_hand[curr_player] += total_bet - self.player_prev_bet[curr_player]
+                self.curr_pot = chips.pot
+                self.player_total_bet_this_hand[curr_player] += total_bet - prev_bet
                 self.player_prev_bet[curr_player] = total_bet
 
                 self.betting_history.append(
@@ -182,13 +322,18 @@ class Game:
                 self.betting_history.append((curr_player.get_id(), "FOLD", total_bet))
                 self.print(f"{curr_player} FOLDS")
 
+            seat = seats.next_active(seat)
+
+        if metrics is not None:
+            metrics.count("betting_iterations", iterations)
+
     def preflop(self):
         self.print("==== PREFLOP ====")
         self.initialize_round()
         self.collect_blinds()
         self.deal_players()
         self.betting(is_preflop=True)
-        self.history_all_rounds["preflop"] = self.betting_history
+        self.history_all_rounds["preflop"] = list(self.betting_history)
         return self.check_early_winner()
 
     def flop(self):
@@ -198,7 +343,7 @@ class Game:
         self.deal_flop()
 
         self.betting()
-        self.history_all_rounds["flop"] = self.betting_history
+        self.history_all_rounds["flop"] = list(self.betting_history)
         return self.check_early_winner()
 
     def turn(self):
@@ -207,7 +352,7 @@ class Game:
         # Turn: Deal, Bet
         self.deal_turn()
         self.betting()
-        self.history_all_rounds["turn"] = self.betting_history
+        self.history_all_rounds["turn"] = list(self.betting_history)
         return self.check_early_winner()
 
     def river(self):
@@ -216,7 +361,7 @@ class Game:
         # River: Deal, Bet
         self.deal_river()
         self.betting()
-        self.history_all_rounds["river"] = self.betting_history
+        self.history_all_rounds["river"] = list(self.betting_history)
         return self.check_early_winner()
 
     def check_early_winner(self):
@@ -225,13 +370,14 @@ class Game:
             winner = players_in[0]
             self.print(f"Player {winner} wins the pot of {self.curr_pot}")
             winner.win_pot(self.curr_pot)
+            self.hand_winnings[winner] += self.curr_pot
             self.curr_pot = 0
             return True
         return False
 
     def determine_hands(self):
         for player in self.players_in_current_hand():
-            self.player_hand[player] = Hand(player.cards + self.community_cards)
+            self.player_hand[player] = self.variant.make_hand(player.cards, self.community_cards)
 
 
     def determine_pots(self):
@@ -259,31 +405,174 @@ class Game:
         winners = [p for p in players if self.player_hand[p] == best_hand]
         if len(winners) < 1:
             raise Exception("Should be at least 1 winner of every pot.")
+
+        if self.variant.hi_lo:
+            best_low = max(self.player_hand[player].low for player in players)
+            # The high hands take the whole pot when nobody has a low
+            if best_low != NO_LOW:
+                low_winners = [p for p in players if self.player_hand[p].low == best_low]
+                self.award_pot(pot / 2, winners)
+                self.award_pot(pot / 2, low_winners, "low ")
+                return
+
+        self.award_pot(pot, winners)
+
+    def award_pot(self, pot, winners, kind=""):
         for winner in winners:
-            self.print(f"{winner} wins a pot of {pot / len(winners)}")
+            self.print(f"{winner} wins a {kind}pot of {pot / len(winners)}")
             winner.win_pot(pot / len(winners))
+            self.hand_winnings[winner] += pot / len(winners)
 
         
         
-    def showdown(self):
-        self.determine_hands()
+    def betting_is_over(self):
+        # At most one player can still bet, so nobody can act any more
+        return sum(p.state == "playing" for p in self.players) < 2
+
+    def run_out(self):
+        """Deal the rest of the board in one go, once per run, and return the boards.
+
+        Unless `equity_samples` is 0, players' all-in equity on the current
+        board is printed first.
+        """
+        known = list(self.community_cards)
+        missing = 5 - len(known)
+        if missing == 0:
+            return [known]
+
+        if self.equity_samples:
+            players_in = self.players_in_current_hand()
+            equity = runout_equity(
+                self.variant,
+                [[card.index for card in player.cards] for player in players_in],
+                [card.index for card in known],
+                [card.index for card in self.deck.deck],
+                self.equity_samples,
+                self.equity_rng,
+            )
+            self.all_in_equity = {player.get_id(): share for player, share in zip(players_in, equity)}
+            self.print("All in: " + ", ".join(f"{player} {share:.1%}" for player, share in zip(players_in, equity)))
+
+        # One burn per street still to come
+        cards_per_run = missing + sum(size > len(known) for size in BOARD_SIZES)
+        runs = max(1, min(self.runs, len(self.deck.deck) // cards_per_run))
+        boards = []
+        for run in range(runs):
+            board = list(known)
+            for size in BOARD_SIZES[1:]:
+                if size > len(board):
+                    # Burn a card
+                    self.deck.pop()
+                    board.extend(self.deck.pop() for _ in range(size - len(board)))
+            if runs > 1:
+                self.print(f"Run {run + 1}: {board}")
+            boards.append(board)
+        self.community_cards[:] = boards[0]
+        if runs == 1:
+            self.print(f"Community Cards: {self.community_cards}")
+        return boards
+
+    def showdown(self, boards=None):
+        # Each board decides an equal part of every pot
+        boards = boards or [list(self.community_cards)]
+        self.boards = boards
         pots = self.determine_pots()
-        for pot, players in pots:
-            self.determine_pot_winners(pot, players)
-        
+        for board in boards:
+            self.community_cards[:] = board
+            self.determine_hands()
+            for pot, players in pots:
+                self.determine_pot_winners(pot / len(boards), players)
+
         self.curr_pot = 0
 
 
     def play_hand(self, shuffle=True):
         self.initialize_hand(shuffle=shuffle)
 
-        # Someone can win before showdown
-        if any(round() for round in self.rounds):
-            return
+        won_early = False
+        for round in self.rounds:
+            # Someone can win before showdown
+            if round():
+                won_early = True
+                break
+            if self.betting_is_over():
+                break
+
+        showdown = []
+        if not won_early:
+            showdown = self.players_in_current_hand()
+            self.showdown(self.run_out())
+
+        self.hands_played += 1
+        if self.hand_listeners:
+            record = self.hand_record(showdown)
+            for listener in self.hand_listeners:
+                listener(record)
+
+    def hand_record(self, showdown=()):
+        players = [player for player in self.players if player in self.starting_stacks]
+        boards = self.boards or [self.community_cards]
+        return HandRecord(
+            hand_id=self.hands_played,
+            variant=self.variant.name,
+            big_blind=self.bb,
+            dealer=self.dealer_idx % len(self.players),
+            players=tuple(player.get_id() for player in players),
+            hole_cards=tuple(tuple(card.index for card in player.cards) for player in players),
+            boards=tuple(tuple(card.index for card in board) for board in boards),
+            actions={street: tuple(actions) for street, actions in self.history_all_rounds.items()},
+            starting_stacks=tuple(self.starting_stacks[player] for player in players),
+            final_stacks=tuple(player.cash for player in players),
+            winnings=tuple(self.hand_winnings[player] for player in players),
+            showdown=tuple(player.get_id() for player in showdown),
+        )
+
+    def add_hand_listener(self, listener):
+        self.hand_listeners.append(listener)
+
+    def enable_metrics(self, metrics=None):
+        if self.metrics is not None:
+            self.disable_metrics()
+        self.metrics = metrics or GameMetrics()
+
+        # Shadow the methods on this instance only, so games without
+        # metrics keep calling the plain methods
+        for name in GameMetrics.TIMED_METHODS:
+            setattr(self, name, self.metrics.timed(name, getattr(self, name)))
+        self._untimed_print = self.print
+        self.print = self.metrics.timed("emit", self.print)
+        self.rounds = [self.preflop, self.flop, self.turn, self.river]
+        return self.metrics
 
-        self.showdown()
-        
+    def disable_metrics(self):
+        if self.metrics is None:
+            return
+        for name in GameMetrics.TIMED_METHODS:
+            del self.__dict__[name]
+        self.print = self._untimed_print
+        self.rounds = [self.preflop, self.flop, self.turn, self.river]
+        self.metrics = None
 
     def add_player(self, player):
+        player.game = self
         self.players.append(player)
 
+    def seat_player(self, player):
+        # The player is dealt in from the next hand on
+        player.game = self
+        self.waiting_players.append(player)
+
+    def remove_player(self, player):
+        if player in self.waiting_players:
+            self.waiting_players.remove(player)
+            return
+
+        idx = self.players.index(player)
+        self.players.pop(idx)
+        # Keep the button on the same player
+        if self.players and idx <= self.dealer_idx % (len(self.players) + 1):
+            self.dealer_idx -= 1
+
+    def num_seated_players(self):
+        return len(self.players) + len(self.waiting_players)
+
@@ -4,6 +4,7 @@ import itertools
 from collections import Counter
 from typing import Tuple, Iterable
 from card import DENOMS, denom_strength, Card
+from evaluator import evaluate, evaluate_omaha, evaluate_omaha_hilo
 
 RANKINGS = ['ROYAL FLUSH', 'STRAIGHT FLUSH', 'FOUR OF A KIND', 'FULL HOUSE', 'FLUSH', 'STRAIGHT', 'THREE OF A KIND', 'TWO PAIR', 'ONE PAIR', 'HIGH CARD']
 
@@ -17,9 +18,22 @@ def denom_view(f):
 
 
 class Hand:
+    """The best five cards among `cards`.
+
+    Only the strength is computed up front; that is all comparisons need.
+    The ranking name and the five cards making the hand are worked out the
+    first time they are looked at, e.g. for display.
+    """
+
+    _ranking = None
+    _hand = None
+
     def __init__(self, cards):
-        
-        self.rankings_map = {
+        self.cards = tuple(cards)
+        self.strength = evaluate([card.index for card in self.cards])
+
+    def find_ranking(self, cards):
+        rankings_map = {
             "ROYAL FLUSH":Hand.is_royal_flush,
             "STRAIGHT FLUSH":Hand.is_straight_flush,
             "FOUR OF A KIND":Hand.is_four_of_a_kind,
@@ -32,39 +46,38 @@ class Hand:
             "HIGH CARD":Hand.is_high_card
         }
 
-        self.find_ranking(cards)
-
-    def find_ranking(self, cards):
         cards = tuple(map(lambda c: c.denom_view, cards))
         for ranking in RANKINGS:
-            hand = self.rankings_map[ranking](cards)
+            hand = rankings_map[ranking](cards)
             if hand:
                 if len(hand) != 5:
                     raise Exception(f"A hand contains exactly 5 cards.")
-                self.ranking = ranking
+                self._ranking = ranking
                 self._hand = tuple(map(lambda c: c.denom_view, hand))
                 return
         
         raise Exception("Unable to match any type of hand.")
+
+    @property
+    def ranking(self):
+        if self._ranking is None:
+            self.find_ranking(self.cards)
+        return self._ranking
     
     @property
     def hand(self):
+        if self._hand is None:
+            self.find_ranking(self.cards)
         return self._hand
         
     def __lt__(self, other):
-        if RANKINGS.index(self.ranking) == RANKINGS.index(other.ranking):
-            return self.hand < other.hand
-        
-        return RANKINGS.index(self.ranking) > RANKINGS.index(other.ranking)
+        return self.strength < other.strength
 
     def __gt__(self, other):
-        if RANKINGS.index(self.ranking) == RANKINGS.index(other.ranking):
-            return self.hand > other.hand
-        
-        return RANKINGS.index(self.ranking) < RANKINGS.index(other.ranking)
+        return self.strength > other.strength
     
     def __eq__(self, other):
-        return (not self < other) and (not other < self)
+        return self.strength == other.strength
 
     def __repr__(self) -> str:
         return repr(self.hand)
@@ -166,26 +179,24 @@ class Hand:
         _, trips = denom_group[0]
         _, pair = denom_group[1]
 
-        if len(trips) != 3 or len(pair) != 2:
+        # A second set of trips also makes the pair
+        if len(trips) != 3 or len(pair) < 2:
             return []
         
-        return trips + pair
+        return trips + pair[:2]
 
     @classmethod
     @denom_view
     def is_flush(cls, cards: Tuple[Card]):
-        if len(cards) > 9:
-            raise Exception("Not implemented for the scenario of more than 9 cards, \
-                where more than one flush may exist.")
-        
         suit_group = cls.group_cards_by_suit(cards)
         if len(suit_group) < 1:
             raise Exception(f"Getting an empty suit group for cards {cards}")
         
-        suit, group = suit_group[0]
-        if len(group) >= 5:
-            return group[:5]
-        return []
+        # With 10 or more cards there can be a flush in more than one suit
+        flushes = [group[:5] for _, group in suit_group if len(group) >= 5]
+        if not flushes:
+            return []
+        return max(flushes, key=lambda hand: [denom_strength(c.denom) for c in hand])
 
     @classmethod
     @denom_view
@@ -253,3 +264,38 @@ class Hand:
     def is_high_card(cls, cards: Tuple[Card]):
         return cls.find_k_high_cards(cards, 5)
 
+
+class OmahaHand(Hand):
+    """The best five cards using exactly two of `hole` and three of `board`."""
+
+    def __init__(self, hole, board):
+        self.hole = tuple(hole)
+        self.board = tuple(board)
+        self.cards = self.hole + self.board
+        self.strength = evaluate_omaha(
+            [card.index for card in self.hole], [card.index for card in self.board]
+        )
+
+    def find_ranking(self, cards):
+        # Only ever runs for display, so trying the combinations is fine
+        for pair in itertools.combinations(self.hole, 2):
+            for triple in itertools.combinations(self.board, 3):
+                if evaluate([card.index for card in pair + triple]) == self.strength:
+                    return super().find_ranking(pair + triple)
+        raise Exception("Unable to match any type of hand.")
+
+
+class OmahaHiLoHand(OmahaHand):
+    """An Omaha hand that may also hold an eight-or-better low.
+
+    `low` is a low strength (larger is better), or NO_LOW when the hand
+    does not qualify.
+    """
+
+    def __init__(self, hole, board):
+        self.hole = tuple(hole)
+        self.board = tuple(board)
+        self.cards = self.hole + self.board
+        self.strength, self.low = evaluate_omaha_hilo(
+            [card.index for card in self.hole], [card.index for card in self.board]
+        )
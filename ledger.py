@@ -0,0 +1,175 @@
+"""
+Bankroll ledger in SQLite.
+
+Chip movements are double-entry transactions: every transaction has
+entries on two or more accounts that sum to zero. Players' accounts are
+"player:<id>", each room's pot is "pot:<room>" and chips bought in come
+from "cashier".
+
+Every action of a hand, from the blinds to the last call, and every pot
+award is its own transaction. Checks and folds move no chips, so theirs
+have no entries. They are recorded from the hand's `HandRecord` once it is
+over, so betting never waits on the database. Balances are read from
+memory and updated as soon as a transaction is recorded. The transactions
+themselves are queued and written by one thread, which commits everything
+waiting in one database transaction, so there is at most one commit per
+hand.
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+CASHIER = "cashier"
+
+# Amounts are stored as integer hundredths of a chip
+UNITS = 100
+
+Transaction = namedtuple("Transaction", ["kind", "entries", "room", "hand_id"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    room TEXT,
+    hand_id INTEGER,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    transaction_id INTEGER NOT NULL REFERENCES transactions(id),
+    account TEXT NOT NULL,
+    amount INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_account ON entries(account);
+"""
+
+
+def player_account(player_id):
+    return f"player:{player_id}"
+
+
+def pot_account(room):
+    return f"pot:{room}"
+
+
+def to_units(chips):
+    return round(chips * UNITS)
+
+
+def transaction(kind, entries, room=None, hand_id=None):
+    """A `Transaction` of (account, chips) entries, which must balance."""
+    entries = tuple((account, to_units(chips)) for account, chips in entries if chips)
+    if sum(amount for _, amount in entries) != 0:
+        raise Exception(f"Unbalanced {kind} transaction {entries}.")
+    return Transaction(kind, entries, room, hand_id)
+
+
+def hand_transactions(room, record):
+    """One transaction per action of a `HandRecord`, in the order they were
+    taken, then one award per winning player.
+    """
+    pot = pot_account(room)
+    transactions = []
+    for street, actions in record.actions.items():
+        # Amounts are a player's total bet so far this street, except that
+        # folds record none
+        bets = defaultdict(float)
+        for player_id, action, amount in actions:
+            chips = 0 if action == "FOLD" else amount - bets[player_id]
+            bets[player_id] += chips
+            transactions.append(
+                transaction(action.lower(), [(player_account(player_id), -chips), (pot, chips)], room, record.hand_id)
+            )
+    paid_in = sum(amount for txn in transactions for account, amount in txn.entries if account == pot)
+    awards = [[player_id, to_units(won)] for player_id, won in zip(record.players, record.winnings) if won]
+    if awards:
+        # Split shares are rounded one at a time, so the biggest winner
+        # takes the odd units and the pot nets to exactly zero
+        max(awards, key=lambda award: award[1])[1] += paid_in - sum(units for _, units in awards)
+    for player_id, units in awards:
+        won = units / UNITS
+        transactions.append(
+            transaction("award", [(pot, -won), (player_account(player_id), won)], room, record.hand_id)
+        )
+    return transactions
+
+
+class Ledger:
+    def __init__(self, path):
+        self.path = path
+        with sqlite3.connect(path) as connection:
+            connection.executescript(SCHEMA)
+            self.balances = defaultdict(
+                int, connection.execute("SELECT account, SUM(amount) FROM entries GROUP BY account")
+            )
+        self.balances_lock = threading.Lock()
+        self.commits = 0
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write, daemon=True)
+        self._writer.start()
+
+    def balance(self, account):
+        """Balance in chips, including transactions not written yet."""
+        with self.balances_lock:
+            return self.balances.get(account, 0) / UNITS
+
+    def record(self, transactions):
+        with self.balances_lock:
+            for txn in transactions:
+                for account, amount in txn.entries:
+                    self.balances[account] += amount
+        self._queue.put(transactions)
+
+    def buy_in(self, player_id, chips):
+        self.record([transaction("buy-in", [(CASHIER, -chips), (player_account(player_id), chips)])])
+
+    def cash_out(self, player_id, chips):
+        self.record([transaction("cash-out", [(player_account(player_id), -chips), (CASHIER, chips)])])
+
+    def record_hand(self, room, record):
+        self.record(hand_transactions(room, record))
+
+    def hand_listener(self, room):
+        """A `Game` hand listener recording the hands of `room`."""
+        return lambda record: self.record_hand(room, record)
+
+    def flush(self):
+        """Wait until everything recorded so far is committed."""
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+
+    def _write(self):
+        connection = sqlite3.connect(self.path)
+        while True:
+            batches = [self._queue.get()]
+            # Take whatever else is waiting into the same commit
+            while True:
+                try:
+                    batches.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            closing = None in batches
+            now = time.time()
+            with connection:
+                for transactions in batches:
+                    for txn in transactions or ():
+                        cursor = connection.execute(
+                            "INSERT INTO transactions (kind, room, hand_id, created) VALUES (?, ?, ?, ?)",
+                            (txn.kind, txn.room, txn.hand_id, now),
+                        )
+                        connection.executemany(
+                            "INSERT INTO entries (transaction_id, account, amount) VALUES (?, ?, ?)",
+                            [(cursor.lastrowid, account, amount) for account, amount in txn.entries],
+                        )
+            self.commits += 1
+            for _ in batches:
+                self._queue.task_done()
+            if closing:
+                connection.close()
+                return
@@ -0,0 +1,198 @@
+"""
+Load generator for the Socket.IO server.
+
+Simulated users run in-process through Flask-SocketIO test clients, so every
+event goes through the real handlers in server.py and nothing touches the
+network. Each room gets its own users who connect, set a username, join the
+room and the game, add bots, start hands and answer every action request
+with a random legal action. All rooms in a load level run at the same time.
+
+    python loadtest.py --rooms 1 5 10 25 --humans 2 --bots 3 --hands 20
+
+For each level it reports handler latency percentiles per event, hands per
+second and traced memory per room.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+import server
+
+LATENCY_PERCENTILES = (50, 95, 99)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+class SimulatedClient:
+    def __init__(self, username, latencies):
+        self.client = server.socketio.test_client(server.app)
+        self.username = username
+        self.latencies = latencies
+        self.cursor = 0
+
+    def emit(self, event, *args):
+        start = time.perf_counter()
+        self.client.emit(event, *args)
+        self.latencies[event].append(time.perf_counter() - start)
+
+    def received(self):
+        # The test client only ever appends to its queue, so reading past a
+        # cursor is safe while handlers on other threads emit to us
+        queue = self.client.queue
+        messages = queue[self.cursor :]
+        self.cursor += len(messages)
+        return messages
+
+
+def answer_actions(client, done, rng):
+    while not done.is_set():
+        for message in client.received():
+            if message["name"] == "server_get_user_action":
+                actions = message["args"][0]["actions"]
+                client.emit("submit_action_event", {"action": rng.choice(actions)})
+        time.sleep(0.001)
+
+
+def run_room(room, num_humans, num_bots, num_hands, cash, latencies, hands_played, seed):
+    rng = random.Random(seed)
+    clients = [
+        SimulatedClient(f"{room}-user{i}", latencies) for i in range(num_humans)
+    ]
+    for client in clients:
+        client.emit("set_username_event", {"username": client.username})
+        client.emit("join_event", {"room": room})
+        client.emit("join_game_event", {"cash": cash})
+    for _ in range(num_bots):
+        clients[0].emit("add_bot_event")
+
+    done = threading.Event()
+    responders = [
+        threading.Thread(target=answer_actions, args=(c, done, random.Random(rng.random())))
+        for c in clients
+    ]
+    for responder in responders:
+        responder.start()
+
+    try:
+        clients[0].emit("start_game_event", {})
+        for _ in range(num_hands):
+            clients[0].emit("start_hand_event")
+            hands_played.append(room)
+    finally:
+        done.set()
+        for responder in responders:
+            responder.join()
+
+    return [client.client.eio_sid for client in clients]
+
+
+def run_level(level, num_rooms, num_humans, num_bots, num_hands, cash, measure_memory):
+    latencies = defaultdict(list)
+    hands_played = []
+    errors = []
+    room_names = [f"load-{level}-{i}" for i in range(num_rooms)]
+
+    def room_worker(room, seed):
+        try:
+            run_room(room, num_humans, num_bots, num_hands, cash, latencies, hands_played, seed)
+        except Exception as e:
+            errors.append(f"{room}: {e!r}")
+
+    memory_before = tracemalloc.get_traced_memory()[0] if measure_memory else 0
+    start = time.perf_counter()
+    workers = [
+        threading.Thread(target=room_worker, args=(room, i))
+        for i, room in enumerate(room_names)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    memory_after = tracemalloc.get_traced_memory()[0] if measure_memory else 0
+
+    # Drop this level's games so the next level starts from the same state
+    with server.rooms_lock:
+        for room in room_names:
+            server.rooms.pop(room, None)
+
+    return {
+        "rooms": num_rooms,
+        "users": num_rooms * num_humans,
+        "hands": len(hands_played),
+        "seconds": elapsed,
+        "hands_per_sec": len(hands_played) / elapsed,
+        "memory_per_room_kb": (memory_after - memory_before) / num_rooms / 1024
+        if measure_memory
+        else None,
+        "latency_ms": {
+            event: {
+                f"p{pct}": percentile(samples, pct) * 1000
+                for pct in LATENCY_PERCENTILES
+            }
+            for event, samples in latencies.items()
+        },
+        "errors": errors,
+    }
+
+
+def print_level(result):
+    memory = result["memory_per_room_kb"]
+    print(
+        f"rooms={result['rooms']} users={result['users']} hands={result['hands']} "
+        f"hands/s={result['hands_per_sec']:.1f}"
+        + (f" memory/room={memory:.1f}KB" if memory is not None else "")
+    )
+    for event, pcts in sorted(result["latency_ms"].items()):
+        summary = " ".join(f"{name}={value:.2f}ms" for name, value in pcts.items())
+        print(f"    {event:<22} {summary}")
+    for error in result["errors"]:
+        print(f"    ERROR {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Socket.IO load generator")
+    parser.add_argument("--rooms", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--humans", type=int, default=1, help="simulated users per room")
+    parser.add_argument("--bots", type=int, default=3, help="bots added per room")
+    parser.add_argument("--hands", type=int, default=10, help="hands per room")
+    parser.add_argument("--cash", type=int, default=100000)
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    if not args.no_memory:
+        tracemalloc.start()
+
+    results = []
+    for level, num_rooms in enumerate(args.rooms):
+        # The game narrates every action to stdout
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            result = run_level(
+                level, num_rooms, args.humans, args.bots, args.hands, args.cash,
+                measure_memory=not args.no_memory,
+            )
+        print_level(result)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return 1 if any(r["errors"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+Room discovery for the lobby.
+
+Each room has a `RoomSummary` kept up to date by the room's own events: a
+hand listener on its `Game` and seat changes reported by the server. The
+lobby never looks at a `Game`, so listing rooms costs the same however
+busy the tables are. Listings come from a sorted snapshot that is only
+rebuilt after a summary has changed. Rates also fall while a room sits
+idle, so they are brought up to date at most every `RATE_REFRESH`
+seconds when rooms are listed.
+"""
+
+import threading
+import time
+from collections import deque, namedtuple
+
+RoomSummary = namedtuple(
+    "RoomSummary",
+    [
+        "room",
+        "variant",
+        "structure",
+        "big_blind",
+        "seated",
+        "hands",
+        "average_pot",
+        "hands_per_hour",
+    ],
+)
+
+# Hands per hour is measured over this many seconds
+RATE_WINDOW = 3600.0
+# Longest a listed rate may lag behind the clock
+RATE_REFRESH = 60.0
+
+SORT_KEYS = ("hands_per_hour", "average_pot", "seated", "big_blind", "room")
+
+
+class Lobby:
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.summaries = {}
+        # room -> [opened at, total pot, recent hand end times]
+        self._activity = {}
+        self._sorted = {}
+        self._rates_at = float("-inf")
+        self.lock = threading.Lock()
+
+    def open_room(self, room, game):
+        summary = RoomSummary(room, game.variant.name, game.structure.name, game.bb, game.num_seated_players(), 0, 0.0, 0.0)
+        with self.lock:
+            self.summaries[room] = summary
+            self._activity[room] = [self.clock(), 0.0, deque()]
+            self._sorted.clear()
+        game.add_hand_listener(lambda record: self.hand_played(room, record))
+
+    def close_room(self, room):
+        with self.lock:
+            self.summaries.pop(room, None)
+            self._activity.pop(room, None)
+            self._sorted.clear()
+
+    def seats_changed(self, room, seated):
+        self._update(room, seated=seated)
+
+    def hand_played(self, room, record):
+        now = self.clock()
+        with self.lock:
+            summary = self.summaries.get(room)
+            if summary is None:
+                return
+            activity = self._activity[room]
+            activity[1] += sum(record.winnings)
+            activity[2].append(now)
+            self.summaries[room] = summary._replace(
+                big_blind=record.big_blind,
+                hands=summary.hands + 1,
+                average_pot=activity[1] / (summary.hands + 1),
+                hands_per_hour=self._rate(activity, now),
+            )
+            self._sorted.clear()
+
+    @staticmethod
+    def _rate(activity, now):
+        opened, _, recent = activity
+        while recent and recent[0] < now - RATE_WINDOW:
+            recent.popleft()
+        # A room younger than the window is rated on its age so far
+        elapsed = max(min(now - opened, RATE_WINDOW), 1.0)
+        return len(recent) * 3600.0 / elapsed
+
+    def _refresh_rates(self):
+        # Called with the lock held
+        now = self.clock()
+        if now - self._rates_at < RATE_REFRESH:
+            return
+        self._rates_at = now
+        for room, summary in self.summaries.items():
+            rate = self._rate(self._activity[room], now)
+            if rate != summary.hands_per_hour:
+                self.summaries[room] = summary._replace(hands_per_hour=rate)
+                self._sorted.clear()
+
+    def _update(self, room, **fields):
+        with self.lock:
+            if room in self.summaries:
+                self.summaries[room] = self.summaries[room]._replace(**fields)
+                self._sorted.clear()
+
+    def _snapshot(self, sort):
+        # Sorted summaries, kept until the next change
+        with self.lock:
+            self._refresh_rates()
+            snapshot = self._sorted.get(sort)
+            if snapshot is None:
+                reverse = sort != "room"
+                snapshot = self._sorted[sort] = sorted(
+                    self.summaries.values(), key=lambda s: getattr(s, sort), reverse=reverse
+                )
+            return snapshot
+
+    def list(self, offset=0, limit=20, variant=None, structure=None, min_seated=0, sort="hands_per_hour"):
+        """A page of room summaries and how many rooms match in total."""
+        if sort not in SORT_KEYS:
+            raise Exception(f"Cannot sort rooms by {sort}, expected one of {list(SORT_KEYS)}.")
+        rooms = self._snapshot(sort)
+        if variant is not None or structure is not None or min_seated:
+            rooms = [
+                s for s in rooms
+                if (variant is None or s.variant == variant)
+                and (structure is None or s.structure == structure)
+                and s.seated >= min_seated
+            ]
+        return rooms[offset : offset + limit], len(rooms)
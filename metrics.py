@@ -0,0 +1,267 @@
+import functools
+import itertools
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from time import perf_counter
+
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 120.0)
+
+
+class GameMetrics:
+    """Per-phase timers and counters for one `Game`.
+
+    A timer is a `[count, total_seconds, max_seconds]` list. Methods are timed
+    by wrapping them on the game instance (see `Game.enable_metrics`), so a
+    game without metrics runs the plain class methods with no overhead.
+    """
+
+    TIMED_METHODS = (
+        "play_hand",
+        "initialize_hand",
+        "preflop",
+        "flop",
+        "turn",
+        "river",
+        "run_out",
+        "determine_hands",
+        "determine_pots",
+    )
+    # Recorded from inside Game.betting
+    RECORDED_TIMERS = ("player_decision",)
+    COUNTERS = ("betting_iterations",)
+
+    def __init__(self):
+        # Every name is created before the game runs, so the dicts never
+        # change size while `snapshot` iterates them from another thread
+        self.timers = {name: [0, 0.0, 0.0] for name in self.RECORDED_TIMERS}
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+
+    def timer(self, name):
+        return self.timers.setdefault(name, [0, 0.0, 0.0])
+
+    def record(self, name, seconds):
+        timer = self.timer(name)
+        timer[0] += 1
+        timer[1] += seconds
+        if seconds > timer[2]:
+            timer[2] = seconds
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def timed(self, name, func):
+        timer = self.timer(name)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                timer[0] += 1
+                timer[1] += elapsed
+                if elapsed > timer[2]:
+                    timer[2] = elapsed
+
+        return wrapper
+
+    def snapshot(self):
+        return {
+            "timers": {
+                name: {"count": count, "total_seconds": total, "max_seconds": longest}
+                for name, (count, total, longest) in self.timers.items()
+            },
+            "counters": dict(self.counters),
+        }
+
+
+def merge_snapshots(snapshots):
+    merged = {"timers": {}, "counters": {}}
+    for snapshot in snapshots:
+        for name, timer in snapshot["timers"].items():
+            total = merged["timers"].setdefault(
+                name, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            )
+            total["count"] += timer["count"]
+            total["total_seconds"] += timer["total_seconds"]
+            total["max_seconds"] = max(total["max_seconds"], timer["max_seconds"])
+        for name, value in snapshot["counters"].items():
+            merged["counters"][name] = merged["counters"].get(name, 0) + value
+    return merged
+
+
+def render_prometheus(snapshot, prefix="poker_game"):
+    lines = [
+        f"# TYPE {prefix}_phase_seconds_total counter",
+        f"# TYPE {prefix}_phase_calls_total counter",
+        f"# TYPE {prefix}_phase_max_seconds gauge",
+    ]
+    for name, timer in sorted(snapshot["timers"].items()):
+        label = f'{{phase="{name}"}}'
+        lines.append(f"{prefix}_phase_seconds_total{label} {timer['total_seconds']}")
+        lines.append(f"{prefix}_phase_calls_total{label} {timer['count']}")
+        lines.append(f"{prefix}_phase_max_seconds{label} {timer['max_seconds']}")
+
+    lines.append(f"# TYPE {prefix}_events_total counter")
+    for name, value in sorted(snapshot["counters"].items()):
+        lines.append(f'{prefix}_events_total{{event="{name}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+class Counter:
+    """Integer that any thread can move up or down.
+
+    This takes a lock rather than being lock-free. An uncontended acquire
+    costs well under a microsecond next to an emit or a hand. The lock-free
+    options cannot also go down: `itertools.count` only counts up, and
+    per-thread counts leave a slot behind for every short-lived handler
+    thread.
+    """
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self._value += n
+
+    def dec(self, n=1):
+        self.inc(-n)
+
+    @property
+    def value(self):
+        return self._value
+
+
+class Histogram:
+    """Latency histogram with lock-free recording.
+
+    Observations are appended to a deque (atomic in CPython) and folded into
+    the buckets on read, or by a writer once `fold_at` are pending.
+    """
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS, fold_at=1024):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.fold_at = fold_at
+        self._pending = deque()
+        self._fold_lock = threading.Lock()
+
+    def observe(self, value):
+        self._pending.append(value)
+        if len(self._pending) > self.fold_at:
+            self.fold()
+
+    def fold(self):
+        with self._fold_lock:
+            while self._pending:
+                value = self._pending.popleft()
+                self.bucket_counts[bisect_left(self.buckets, value)] += 1
+                self.count += 1
+                self.sum += value
+
+    def snapshot(self):
+        self.fold()
+        cumulative = list(itertools.accumulate(self.bucket_counts))
+        return {
+            "buckets": dict(zip(self.buckets + (float("inf"),), cumulative)),
+            "count": self.count,
+            "sum": self.sum,
+        }
+
+
+class ServerMetrics:
+    """Room, player, hand and event handler metrics for the Socket.IO server."""
+
+    TIMED_HANDLERS = ("join_event", "start_hand_event", "submit_action_event")
+
+    def __init__(self, rate_window=60.0):
+        self.handler_latency = {name: Histogram() for name in self.TIMED_HANDLERS}
+        self.players_seated = Counter()
+        self.hands_started = Counter()
+        self.hands_completed = Counter()
+        self.emits_in_flight = Counter()
+        self.rate_window = rate_window
+        self._hand_end_times = deque(maxlen=100000)
+        # phase -> seconds it took while the server started
+        self.startup = {}
+
+    def timed_handler(self, func):
+        histogram = self.handler_latency[func.__name__]
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(perf_counter() - start)
+
+        return wrapper
+
+    def startup_phase(self, phase, seconds):
+        self.startup[phase] = seconds
+
+    def hand_started(self):
+        self.hands_started.inc()
+
+    def hand_completed(self):
+        self.hands_completed.inc()
+        self._hand_end_times.append(time.monotonic())
+
+    def hands_per_sec(self):
+        cutoff = time.monotonic() - self.rate_window
+        recent = sum(1 for t in list(self._hand_end_times) if t >= cutoff)
+        return recent / self.rate_window
+
+    def snapshot(self, active_rooms):
+        started = self.hands_started.value
+        return {
+            "active_rooms": active_rooms,
+            "players_seated": self.players_seated.value,
+            "hands_in_progress": started - self.hands_completed.value,
+            "hands_started": started,
+            "hands_per_sec": self.hands_per_sec(),
+            "emits_in_flight": self.emits_in_flight.value,
+            "handler_latency": {
+                name: histogram.snapshot()
+                for name, histogram in self.handler_latency.items()
+            },
+            "startup": dict(self.startup),
+        }
+
+
+def render_server_prometheus(snapshot, prefix="poker_server"):
+    lines = []
+    for name, kind in [
+        ("active_rooms", "gauge"),
+        ("players_seated", "gauge"),
+        ("hands_in_progress", "gauge"),
+        ("hands_started", "counter"),
+        ("hands_per_sec", "gauge"),
+        ("emits_in_flight", "gauge"),
+    ]:
+        suffix = "_total" if kind == "counter" else ""
+        lines.append(f"# TYPE {prefix}_{name}{suffix} {kind}")
+        lines.append(f"{prefix}_{name}{suffix} {snapshot[name]}")
+
+    metric = f"{prefix}_handler_latency_seconds"
+    lines.append(f"# TYPE {metric} histogram")
+    for handler, histogram in sorted(snapshot["handler_latency"].items()):
+        for bound, count in histogram["buckets"].items():
+            le = "+Inf" if bound == float("inf") else bound
+            lines.append(f'{metric}_bucket{{handler="{handler}",le="{le}"}} {count}')
+        lines.append(f'{metric}_sum{{handler="{handler}"}} {histogram["sum"]}')
+        lines.append(f'{metric}_count{{handler="{handler}"}} {histogram["count"]}')
+
+    metric = f"{prefix}_startup_seconds"
+    lines.append(f"# TYPE {metric} gauge")
+    for phase, seconds in sorted(snapshot.get("startup", {}).items()):
+        lines.append(f'{metric}{{phase="{phase}"}} {seconds}')
+    return "\n".join(lines) + "\n"
@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
 import random
 from threading import Lock, Condition
+import betting
+from betting import FOLD, CALL, RAISE, Intent
 from utils import print_and_emit
 
 
@@ -11,6 +13,8 @@ class Player(ABC):
         self.cards = []
         self.betting_this_round = 0
         self._state = "playing"
+        # Set by the game the player is added to
+        self.game = None
     
     @property
     def cash(self):
@@ -52,7 +56,8 @@ class Player(ABC):
         if self.state == "broke":
             raise Exception("A broke player should not be asked to pay blinds")
 
-        if self.cash >= blind_amount:
+        # Posting the whole stack as a blind puts the player all in
+        if self.cash > blind_amount:
             self.cash -= blind_amount
             self.betting_this_round += blind_amount
             self.state = "playing"
@@ -68,8 +73,15 @@ class Player(ABC):
     def win_pot(self, pot):
         self.cash += pot
 
+    def settle(self, cash, betting_this_round, state):
+        # The game has applied this player's action
+        self.cash = cash
+        self.betting_this_round = betting_this_round
+        self.state = state
+
     @abstractmethod
-    def bet(self, price_to_call, minimum_raise):
+    def decide(self, price_to_call, minimum_raise, legal):
+        """The `betting.Intent` of the player, which must be in `legal`."""
         pass
 
     @abstractmethod
@@ -87,87 +99,29 @@ class BotPlayer(Player):
         self.print = print
         self.action_sequence = action_sequence
 
-    def bet(self, price_to_call, minimum_raise):
-        def can_raise():
-            # Can bet (allowing all in)
-            return self.cash + self.betting_this_round > price_to_call
-
-        def can_check_call():
-            # Can call (allowing all in)
-            return self.cash > 0
-
-        def call():
-
-            # Checks
-            if price_to_call == 0:
-                self.print(f"{self.name} checks")
-                return 0, 0
-
-            # Calls normally
-            if self.cash + self.betting_this_round > price_to_call:
-                self.cash -= price_to_call - self.betting_this_round
-                self.betting_this_round = price_to_call
-                self.print(
-                    f"{self.name} calls for a total bet of {self.betting_this_round}"
-                )
-
-            # Goes all in
-            else:
-                self.betting_this_round += self.cash
-                self.cash = 0
-                self.print(f"{self} is all in with {self.betting_this_round}")
-                self.state = "all in"
-            return self.betting_this_round, 0
-
-        def two_x_raise():
-            # Regular raise
-
-            if self.cash + self.betting_this_round > price_to_call + minimum_raise * 2:
-                self.cash -= price_to_call + minimum_raise * 2 - self.betting_this_round
-                self.betting_this_round = price_to_call + minimum_raise * 2
-                self.print(
-                    f"{self} raise by {minimum_raise * 2} for a total bet of {self.betting_this_round}"
-                )
-
-                return self.betting_this_round, minimum_raise * 2
-            # Goes all in
-            else:
-                raising = self.cash + self.betting_this_round - price_to_call
-                self.betting_this_round += self.cash
-                self.cash = 0
-                self.print(
-                    f"{self} is all in, raising by {raising} for a total bet of {self.betting_this_round}"
-                )
-                self.state = "all in"
-                return self.betting_this_round, raising
-
-        def fold():
-            self.betting_this_round = 0
-            self.state = "folded"
-            return 0, 0
-
+    def decide(self, price_to_call, minimum_raise, legal):
+        action = self.choose_action(price_to_call, minimum_raise, legal)
+        if action == "C":
+            return Intent(CALL)
+        elif action == "R":
+            if RAISE in legal.actions:
+                # Raise by twice the minimum, or as close as the rules allow
+                return Intent(RAISE, betting.clamp_raise(price_to_call + minimum_raise * 2, legal))
+            return Intent(CALL)
+        elif action == "F":
+            return Intent(FOLD)
+        raise Exception(f"Unknown action {action}, expected one of C, R or F")
+
+    def choose_action(self, price_to_call, minimum_raise, legal):
+        """"C" to check or call, "R" to raise or "F" to fold."""
         if len(self.action_sequence) > 0:
             action = self.action_sequence.popleft()
             self.print(f"{self} follows action {action}")
-            if action == "C":
-                assert can_check_call()
-                return call()
-            elif action == "R":
-                if can_raise():
-                    return two_x_raise()
-                else:
-                    return call()
-            elif action == "F":
-                return fold()
-            return
-
-        if can_raise():
-            return random.choice((fold, call, two_x_raise))()
-
-        elif can_check_call():
-            return random.choice((fold, call))()
-        else:
-            raise Exception("A player unable to call should not be asked to bet")
+            return action
+
+        if RAISE in legal.actions:
+            return random.choice("FCR")
+        return random.choice("FC")
 
     def get_id(self):
         return f"{self.name}"
@@ -185,7 +139,7 @@ class HumanPlayer(Player):
         self._action = None
         self.action_lock = Lock()
         self.action_cv = Condition(self.action_lock)
-        self.legal_actions = []
+        self.legal = None
 
         
 
@@ -195,7 +149,7 @@ class HumanPlayer(Player):
             if self._action != None:
                 raise Exception(f"Action should be None, but got {self.action}")
 
-            self.get_user_action_func(self.legal_actions)
+            self.get_user_action_func(self.legal)
 
             while not self._action:
                 self.action_cv.wait()
@@ -219,80 +173,29 @@ class HumanPlayer(Player):
             'state' : self.state
         })
 
-    def bet(self, price_to_call, minimum_raise):
-        def can_raise():
-            # Can bet (allowing all in)
-            return self.cash + self.betting_this_round > price_to_call
-
-        def can_check_call():
-            # Can call (allowing all in)
-            return self.cash > 0
-
-        def call():
-
-            # Checks
-            if price_to_call == 0:
-                return 0, 0
-
-            # Calls normally
-            if self.cash + self.betting_this_round > price_to_call:
-                self.cash -= price_to_call - self.betting_this_round
-                self.betting_this_round = price_to_call
-
-            # Goes all in
-            else:
-                self.betting_this_round += self.cash
-                self.cash = 0
-                self.state = "all in"
-            return self.betting_this_round, 0
-
-        def two_x_raise():
-            # Regular raise
-
-            if self.cash + self.betting_this_round > price_to_call + minimum_raise * 2:
-                self.cash -= price_to_call + minimum_raise * 2 - self.betting_this_round
-                self.betting_this_round = price_to_call + minimum_raise * 2
-
-                return self.betting_this_round, minimum_raise * 2
-            # Goes all in
-            else:
-                raising = self.cash + self.betting_this_round - price_to_call
-                self.betting_this_round += self.cash
-                self.cash = 0
-                self.state = "all in"
-                return self.betting_this_round, raising
-
-        def fold():
-            self.betting_this_round = 0
-            self.state = "folded"
-            return 0, 0
-
-        if can_raise():
-            self.legal_actions = ["fold", "check/call", "raise"]
-
-        elif can_check_call():
-            self.legal_actions = ["fold", "check/call"]
-        else:
-            raise Exception("A player unable to call should not be asked to bet")
-
-        action = self.action
-
-        if action not in self.legal_actions:
-            raise Exception(f"{action} is not legal. Legal actions are {legal_actions}")
-
-        action_map = {"fold": fold, "check/call": call, "raise": two_x_raise}
-        
-        total_bet, raise_amount = action_map[action]()
+    def decide(self, price_to_call, minimum_raise, legal):
+        self.legal = legal
+        while True:
+            action, amount = self.action
+            if action == RAISE and amount is None:
+                amount = legal.min_raise_to
+            error = betting.validate(action, amount, legal)
+            if error is None:
+                return Intent(action, amount)
+            self.print(error)
+
+    def settle(self, *args, **kwargs):
+        super().settle(*args, **kwargs)
         self.update_player_state()
-        return total_bet, raise_amount
 
     def deal(self, *args, **kwargs):
         super().deal(*args, **kwargs)
         self.update_player_state()
     
     def pay_blind(self, *args, **kwargs):
-        super().pay_blind(*args, **kwargs)
+        paid = super().pay_blind(*args, **kwargs)
         self.update_player_state()
+        return paid
 
     def win_pot(self, *args, **kwargs):
         super().win_pot(*args, **kwargs)
@@ -0,0 +1,247 @@
+"""
+Weighted hand ranges and range-vs-range equity.
+
+A range maps two-card combos to weights and is written in the usual
+notation, comma separated, each item optionally weighted with ":w":
+
+    QQ+, 22-55, AKs, AKo:0.5, AK, ATs+, 76s-54s, A5s-A2s, AhKh
+
+Combos are pairs of card ints (see `Card.index`), lower card first.
+
+Equity runs over every runout of the board (or a seeded sample of them when
+there are too many). Each distinct combo is evaluated once per runout, and
+the hero combos are ranked against all villain combos at once with sorted
+prefix sums; villain combos that share a card with a hero combo are then
+taken back out.
+"""
+
+from collections import namedtuple
+from itertools import combinations
+from math import comb
+import numpy as np
+from card import Card, card_from_index
+from evaluator import NUM_CARDS, NUM_RANKS
+from vector_game import evaluate
+
+RANK_CHARS = "23456789TJQKA"
+SUIT_CHARS = "dhcs"
+
+EquityResult = namedtuple("EquityResult", ["equity", "combo_equities"])
+
+
+def parse_card(text):
+    """Card int for short notation such as "Ah" or "Td"."""
+    if len(text) != 2 or text[0] not in RANK_CHARS or text[1] not in SUIT_CHARS:
+        raise Exception(f"Cannot parse card {text}.")
+    return SUIT_CHARS.index(text[1]) * NUM_RANKS + RANK_CHARS.index(text[0])
+
+
+def _class_combos(high, low, suitedness):
+    # All combos of ranks `high`, `low`; suitedness is "s", "o" or ""
+    combos = []
+    for suit_a in range(4):
+        for suit_b in range(4):
+            a = suit_a * NUM_RANKS + high
+            b = suit_b * NUM_RANKS + low
+            if high == low and suit_a >= suit_b:
+                continue
+            if suitedness == "s" and suit_a != suit_b:
+                continue
+            if suitedness == "o" and suit_a == suit_b:
+                continue
+            combos.append((min(a, b), max(a, b)))
+    return combos
+
+
+def _parse_class(text):
+    if len(text) not in (2, 3) or any(c not in RANK_CHARS for c in text[:2]):
+        raise Exception(f"Cannot parse hand {text}.")
+    high, low = sorted((RANK_CHARS.index(text[0]), RANK_CHARS.index(text[1])), reverse=True)
+    suitedness = text[2:]
+    if suitedness not in ("", "s", "o") or (high == low and suitedness):
+        raise Exception(f"Cannot parse hand {text}.")
+    return high, low, suitedness
+
+
+def _expand(item):
+    # (high, low, suitedness) classes an item stands for
+    if item.endswith("+"):
+        high, low, suitedness = _parse_class(item[:-1])
+        if high == low:
+            return [(r, r, "") for r in range(high, NUM_RANKS)]
+        # The kicker goes up to one below the high card
+        return [(high, r, suitedness) for r in range(low, high)]
+
+    if "-" in item:
+        first, last = map(_parse_class, item.split("-"))
+        if first[2] != last[2]:
+            raise Exception(f"Cannot mix suitedness in {item}.")
+        top, bottom = max(first, last), min(first, last)
+        if top[0] == top[1] and bottom[0] == bottom[1]:
+            return [(r, r, "") for r in range(bottom[0], top[0] + 1)]
+        if top[0] == bottom[0]:
+            return [(top[0], r, top[2]) for r in range(bottom[1], top[1] + 1)]
+        if top[0] - top[1] == bottom[0] - bottom[1]:
+            gap = top[0] - top[1]
+            return [(r, r - gap, top[2]) for r in range(bottom[0], top[0] + 1)]
+        raise Exception(f"Cannot parse range {item}.")
+
+    return [_parse_class(item)]
+
+
+class Range:
+    def __init__(self, weights=None):
+        # (card int, card int) -> weight
+        self.weights = dict(weights or {})
+
+    @classmethod
+    def parse(cls, notation):
+        weights = {}
+        for item in notation.split(","):
+            item = item.strip()
+            if not item:
+                continue
+            item, _, weight = item.partition(":")
+            weight = float(weight) if weight else 1.0
+
+            if len(item) == 4 and item[1] in SUIT_CHARS:
+                a, b = parse_card(item[:2]), parse_card(item[2:])
+                if a == b:
+                    raise Exception(f"Cannot parse hand {item}.")
+                weights[min(a, b), max(a, b)] = weight
+                continue
+
+            for high, low, suitedness in _expand(item):
+                for combo in _class_combos(high, low, suitedness):
+                    weights[combo] = weight
+        return cls({combo: w for combo, w in weights.items() if w > 0})
+
+    def without(self, dead_cards):
+        """The range with every combo that uses one of `dead_cards` removed."""
+        dead = {card.index if isinstance(card, Card) else card for card in dead_cards}
+        return Range(
+            {c: w for c, w in self.weights.items() if c[0] not in dead and c[1] not in dead}
+        )
+
+    def combos(self):
+        return [
+            (card_from_index(a), card_from_index(b), weight)
+            for (a, b), weight in self.weights.items()
+        ]
+
+    def __len__(self):
+        return len(self.weights)
+
+    def __repr__(self):
+        return f"Range({len(self)} combos)"
+
+
+def _runouts(board, samples, rng):
+    missing = 5 - len(board)
+    deck = [card for card in range(NUM_CARDS) if card not in board]
+    if missing == 0:
+        return np.zeros((1, 0), dtype=np.int64)
+    if comb(len(deck), missing) <= samples:
+        return np.array(list(combinations(deck, missing)), dtype=np.int64)
+    picks = rng.random((samples, len(deck))).argsort(axis=1)[:, :missing]
+    return np.array(deck, dtype=np.int64)[picks]
+
+
+def _conflicts(hero_cards, villain_cards):
+    # For each hero combo, the villain combos sharing a card with it, padded
+    # with len(villain_cards), which points at a zero-weight dummy
+    by_card = [[] for _ in range(NUM_CARDS)]
+    for i, (a, b) in enumerate(villain_cards):
+        by_card[a].append(i)
+        by_card[b].append(i)
+    rows = [sorted(set(by_card[a]) | set(by_card[b])) for a, b in hero_cards]
+    width = max(map(len, rows), default=0)
+    padded = np.full((len(rows), max(width, 1)), len(villain_cards), dtype=np.int64)
+    for i, row in enumerate(rows):
+        padded[i, : len(row)] = row
+    return padded
+
+
+def range_vs_range(hero, villain, board=(), samples=2000, seed=None, chunk=64):
+    """Equity of `hero` against `villain` on `board`, overall and per combo.
+
+    Every runout is used when there are at most `samples` of them, otherwise
+    `samples` runouts are drawn with `seed`. Returns an `EquityResult` whose
+    `combo_equities` maps (Card, Card) to equity; combos that can never be
+    matched up are left out.
+    """
+    board = [card.index if isinstance(card, Card) else card for card in board]
+    if len(board) > 5 or len(set(board)) != len(board):
+        raise Exception(f"Invalid board {board}.")
+    hero, villain = hero.without(board), villain.without(board)
+    if not hero or not villain:
+        raise Exception("Both ranges need a combo that does not use a board card.")
+
+    # Evaluate each distinct combo once per runout, even if both ranges hold it
+    universe = sorted(set(hero.weights) | set(villain.weights))
+    position = {combo: i for i, combo in enumerate(universe)}
+    universe_cards = np.array(universe, dtype=np.int64)
+    hero_combos, villain_combos = list(hero.weights), list(villain.weights)
+    hero_at = np.array([position[c] for c in hero_combos])
+    villain_at = np.array([position[c] for c in villain_combos])
+    hero_weights = np.array([hero.weights[c] for c in hero_combos])
+    villain_weights = np.array([villain.weights[c] for c in villain_combos])
+    conflicts = _conflicts(hero_combos, villain_combos)
+
+    runouts = _runouts(board, samples, np.random.default_rng(seed))
+    board_cards = np.array(board, dtype=np.int64)
+    wins = np.zeros(len(hero_combos))
+    totals = np.zeros(len(hero_combos))
+
+    for start in range(0, len(runouts), chunk):
+        batch = runouts[start : start + chunk]
+        full_boards = np.concatenate(
+            [np.broadcast_to(board_cards, (len(batch), len(board))), batch], axis=1
+        )
+        cards = np.concatenate(
+            [
+                np.repeat(full_boards, len(universe), axis=0),
+                np.tile(universe_cards, (len(batch), 1)),
+            ],
+            axis=1,
+        )
+        strengths = evaluate(cards).reshape(len(batch), len(universe))
+        # Combos holding a card of the runout cannot be dealt with it
+        dealt = ~(
+            (universe_cards[None, :, :, None] == batch[:, None, None, :]).any(axis=(2, 3))
+        )
+
+        for strength, valid in zip(strengths, dealt):
+            hero_strength = strength[hero_at]
+            villain_strength = np.append(strength[villain_at], 0)
+            weight = np.append(villain_weights * valid[villain_at], 0.0)
+
+            order = np.argsort(villain_strength[:-1], kind="stable")
+            ranked = villain_strength[order]
+            cumulative = np.concatenate([[0.0], np.cumsum(weight[order])])
+            below = np.searchsorted(ranked, hero_strength, "left")
+            upto = np.searchsorted(ranked, hero_strength, "right")
+            beaten = cumulative[below]
+            tied = cumulative[upto] - cumulative[below]
+            total = np.full(len(hero_combos), cumulative[-1])
+
+            blocked_strength = villain_strength[conflicts]
+            blocked_weight = weight[conflicts]
+            beaten -= (blocked_weight * (blocked_strength < hero_strength[:, None])).sum(axis=1)
+            tied -= (blocked_weight * (blocked_strength == hero_strength[:, None])).sum(axis=1)
+            total -= blocked_weight.sum(axis=1)
+
+            hero_valid = valid[hero_at]
+            wins += np.where(hero_valid, beaten + tied / 2, 0)
+            totals += np.where(hero_valid, total, 0)
+
+    matched = totals > 0
+    if not matched.any():
+        raise Exception("The ranges never meet on this board.")
+    equity = (hero_weights * wins).sum() / (hero_weights * totals).sum()
+    combo_equities = {
+        (card_from_index(a), card_from_index(b)): wins[i] / totals[i]
+        for i, (a, b) in enumerate(hero_combos)
+        if matched[i]
+    }
+    return EquityResult(float(equity), combo_equities)
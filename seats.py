@@ -0,0 +1,51 @@
+class SeatRing:
+    """Circular doubly linked list over the seats of a table.
+
+    Only seats whose player can still act (state "playing") are linked, so
+    finding the next actor and unlinking a player who folds or goes all in
+    are both O(1). A ring is built once per betting round.
+    """
+
+    def __init__(self, players):
+        self.players = players
+        num_seats = len(players)
+        self.next = [-1] * num_seats
+        self.prev = [-1] * num_seats
+        self.active = [p.state == "playing" for p in players]
+
+        active_seats = [i for i in range(num_seats) if self.active[i]]
+        self.num_active = len(active_seats)
+        for seat, next_seat in zip(active_seats, active_seats[1:] + active_seats[:1]):
+            self.next[seat] = next_seat
+            self.prev[next_seat] = seat
+
+        # First active seat at or after each seat, walking clockwise
+        self._first_active = [-1] * num_seats
+        if active_seats:
+            upcoming = active_seats[0]
+            for seat in reversed(range(num_seats)):
+                if self.active[seat]:
+                    upcoming = seat
+                self._first_active[seat] = upcoming
+
+    def first_active_from(self, idx):
+        if not self.players:
+            return -1
+        return self._first_active[idx % len(self.players)]
+
+    def next_active(self, seat):
+        # A removed seat keeps its forward link, so this is still valid for
+        # the player who has just folded or gone all in.
+        return self.next[seat]
+
+    def is_active(self, seat):
+        return self.active[seat]
+
+    def remove(self, seat):
+        if not self.active[seat]:
+            return
+        prev_seat, next_seat = self.prev[seat], self.next[seat]
+        self.next[prev_seat] = next_seat
+        self.prev[next_seat] = prev_seat
+        self.active[seat] = False
+        self.num_active -= 1
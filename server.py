@@ -1,16 +1,27 @@
+from time import perf_counter
+
+# Measured from the first line, for the startup metrics
+_boot_start = perf_counter()
+
+import atexit
+import os
 import threading
-from flask import Flask, render_template, session, request, copy_current_request_context
+from flask import Flask, Response, jsonify, render_template, session, request, copy_current_request_context
 from flask_socketio import (
     SocketIO,
-    emit,
+    emit as socketio_emit,
     join_room,
     leave_room,
     close_room,
     rooms,
     disconnect,
 )
-from game import Game
-from player import HumanPlayer, BotPlayer
+from betting import STRUCTURES
+from broadcast import SPECTATORS, BroadcastHub, RoomBroadcaster, tier_room
+from sessions import SessionRegistry
+from lobby import SORT_KEYS, Lobby
+from stats import StatsTracker
+from metrics import ServerMetrics, merge_snapshots, render_prometheus, render_server_prometheus
 
 import logging
 
@@ -24,6 +35,12 @@ async_mode = None
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = "secret!"
+# Per-phase timers inside every game, exported on /metrics
+app.config["GAME_METRICS"] = os.environ.get("POKER_GAME_METRICS") == "1"
+# SQLite file recording every chip movement, off when unset
+app.config["LEDGER"] = os.environ.get("POKER_LEDGER")
+# Directory hands are exported to as NumPy columns, off when unset
+app.config["HAND_EXPORT"] = os.environ.get("POKER_HAND_EXPORT")
 socketio = SocketIO(app, async_mode=async_mode)
 
 user_count = 0
@@ -32,7 +49,88 @@ userid_lock = threading.Lock()
 rooms = {}
 rooms_lock = threading.Lock()
 
-players = {}
+# Seated players by session token, and by sid while connected
+player_sessions = SessionRegistry()
+
+server_metrics = ServerMetrics()
+
+# Shared by every bot so equity estimates carry over between rooms;
+# created with the first bot, like the game modules are imported with the
+# first room, so the server is up before any of them has loaded
+bot_strategy = None
+
+# Summaries of every room, kept up to date by the rooms themselves
+lobby = Lobby()
+
+if app.config["LEDGER"]:
+    from ledger import Ledger
+
+    ledger = Ledger(app.config["LEDGER"])
+    # Commits whatever the writer thread has not written yet
+    atexit.register(ledger.close)
+else:
+    ledger = None
+
+# HUD stats of every player, updated after each hand
+player_stats = StatsTracker()
+
+if app.config["HAND_EXPORT"]:
+    # Imported here since only the export needs NumPy
+    from export import HandExporter
+
+    hand_exporter = HandExporter(app.config["HAND_EXPORT"])
+    atexit.register(hand_exporter.close)
+else:
+    hand_exporter = None
+
+# Sends the delayed spectator updates of every room
+broadcast_hub = BroadcastHub()
+broadcast_thread = None
+
+
+def emit(*args, **kwargs):
+    server_metrics.emits_in_flight.inc()
+    try:
+        return socketio_emit(*args, **kwargs)
+    finally:
+        server_metrics.emits_in_flight.dec()
+
+
+def load_game_modules():
+    # The game, its evaluator tables and the bots load on first use
+    global bot_strategy
+    if bot_strategy is not None:
+        return
+    start = perf_counter()
+    import evaluator
+    from strategy import EquityStrategy
+
+    server_metrics.startup_phase("game_import", perf_counter() - start)
+    server_metrics.startup_phase(f"evaluator_tables_{evaluator.TABLES_SOURCE}", evaluator.TABLES_SECONDS)
+    bot_strategy = EquityStrategy()
+
+
+def broadcast_send(event, data, to):
+    # Called from game threads and the hub, outside of any request
+    server_metrics.emits_in_flight.inc()
+    try:
+        return socketio.emit(event, data, to=to)
+    finally:
+        server_metrics.emits_in_flight.dec()
+
+
+def send_to_player(player_session, event, data):
+    # Kept for replay even while the player is disconnected
+    data = player_session.record(event, data)
+    sid = player_session.sid
+    if sid is not None:
+        broadcast_send(event, data, sid)
+
+
+def start_broadcast_hub():
+    global broadcast_thread
+    if broadcast_thread is None:
+        broadcast_thread = socketio.start_background_task(broadcast_hub.run)
 
 
 def generate_unique_userid():
@@ -48,6 +146,43 @@ def index():
     return render_template("index.html", async_mode=socketio.async_mode)
 
 
+@app.route("/lobby")
+def lobby_page():
+    args = request.args
+    sort = args.get("sort", "hands_per_hour")
+    if sort not in SORT_KEYS:
+        return jsonify({"error": f"Unknown sort {sort}"}), 400
+    limit = min(args.get("limit", 20, type=int), 100)
+    summaries, total = lobby.list(
+        offset=args.get("offset", 0, type=int),
+        limit=limit,
+        variant=args.get("variant"),
+        structure=args.get("structure"),
+        min_seated=args.get("min_seated", 0, type=int),
+        sort=sort,
+    )
+    return jsonify({"total": total, "rooms": [summary._asdict() for summary in summaries]})
+
+
+@app.route("/hud/<player_id>")
+def hud_page(player_id):
+    hud = player_stats.hud(player_id)
+    if hud is None:
+        return jsonify({"error": f"No hands for {player_id}"}), 404
+    return jsonify(hud._asdict())
+
+
+@app.route("/metrics")
+def metrics():
+    text = render_server_prometheus(server_metrics.snapshot(active_rooms=len(rooms)))
+    if app.config["GAME_METRICS"]:
+        games = list(rooms.values())
+        text += render_prometheus(
+            merge_snapshots(g.metrics.snapshot() for g in games if g.metrics)
+        )
+    return Response(text, mimetype="text/plain")
+
+
 @socketio.event
 def connect(message):
     print("connect")
@@ -63,15 +198,37 @@ def set_username_event(message):
 
 
 @socketio.event
+@server_metrics.timed_handler
 def join_event(message):
+    load_game_modules()
+    from game import Game, VARIANTS
+
+    variant = message.get("variant", "holdem")
+    structure = message.get("structure", "no-limit")
+    runs = int(message.get("runs", 1))
+    if variant not in VARIANTS or structure not in STRUCTURES or runs < 1:
+        emit("server_response", {"data": f"Unknown game {variant} {structure}"})
+        return
     session["room"] = room = message["room"]
 
-    def emit_to_room(content):
-        emit("server_game_update", {"data": content}, to=session["room"])
-
     with rooms_lock:
         if room not in rooms:
-            rooms[room] = Game(emit_func=emit_to_room)
+            broadcaster = RoomBroadcaster(
+                room,
+                broadcast_send,
+                lambda: [card for player in rooms[room].players for card in player.cards],
+            )
+            rooms[room] = Game(emit_func=broadcaster.publish, variant=variant, structure=structure, runs=runs)
+            if app.config["GAME_METRICS"]:
+                rooms[room].enable_metrics()
+            broadcast_hub.add(broadcaster)
+            start_broadcast_hub()
+            lobby.open_room(room, rooms[room])
+            rooms[room].add_hand_listener(player_stats.add_hand)
+            if hand_exporter is not None:
+                rooms[room].add_hand_listener(hand_exporter.add)
+            if ledger is not None:
+                rooms[room].add_hand_listener(ledger.hand_listener(room))
 
     join_room(message["room"])
     emit(
@@ -81,48 +238,112 @@ def join_event(message):
     )
 
 
+@socketio.event
+def spectate_event(message):
+    # Spectators only join the delayed tier, never the players' room
+    room = message["room"]
+    if room not in rooms:
+        emit("server_response", {"data": f"There is no game in {room}"})
+        return
+    session["spectating"] = room
+    join_room(tier_room(room, SPECTATORS))
+    emit("server_response", {"data": f"Watching {room}, {SPECTATORS.delay}s behind"})
+
+
 @socketio.event
 def join_game_event(message):
     # TODO: handle join after game started
-    curr_sid = request.sid
+    load_game_modules()
+    from player import HumanPlayer
+
     curr_room = session['room']
     curr_user = session['username']
     def emit_to_player(content):
         # TODO: create separate message type for private messages
-        emit("server_game_update", {"data": content}, to=curr_sid)
-
-    def emit_get_user_action(actions):
-        emit("server_get_user_action", {"actions": actions}, to=curr_sid)
+        send_to_player(player_session, "server_game_update", {"data": content})
+
+    def emit_get_user_action(legal):
+        player_session.pending_action = {
+            "actions": list(legal.actions),
+            "to_call": legal.to_call,
+            "min_raise_to": legal.min_raise_to,
+            "max_raise_to": legal.max_raise_to,
+        }
+        send_to_player(player_session, "server_get_user_action", player_session.pending_action)
         emit("server_game_update", {'data' : 'Waiting for player ' + curr_user},
-             to=curr_room, skip_sid=curr_sid)
+             to=curr_room, skip_sid=player_session.sid)
     
     def emit_player_state(state):
         # TODO: create separate message type for private messages
-        emit("server_player_state", {"player_state": state}, to=curr_sid)
+        send_to_player(player_session, "server_player_state", {"player_state": state})
 
     player = HumanPlayer(
         session["username"], int(message["cash"]), emit_to_player, emit_get_user_action, emit_player_state
     )
-    players[curr_sid] = player
+    player_session = player_sessions.create(player, curr_room, request.sid)
+    if ledger is not None:
+        ledger.buy_in(player.get_id(), player.cash)
+    emit("server_session", {"token": player_session.token})
+    server_metrics.players_seated.inc()
 
     with rooms_lock:
         game = rooms[session["room"]]
         game.add_player(player)
+        lobby.seats_changed(curr_room, game.num_seated_players())
         print({"players" : str(game.players)})
         emit('server_player_update', {"players" : 'Players in Room: ' + str(game.players)},to=session["room"])
         if len(game.players) >= 2:
             emit("server_enable_start_game", to=session["room"])
 
+
+@socketio.event
+def resume_event(message):
+    # A client that lost its socket takes its seat back
+    try:
+        player_session = player_sessions.resume(message["token"], request.sid)
+    except Exception as e:
+        emit("server_resume_failed", {"data": str(e)})
+        return
+    player = player_session.player
+    session["room"] = player_session.room
+    session["username"] = player.name
+    join_room(player_session.room)
+
+    missed = player_session.since(int(message.get("seq", 0)))
+    if missed is None:
+        # Too far behind for the buffer; send the current state instead
+        missed = []
+        player.update_player_state()
+        if player_session.pending_action is not None:
+            send_to_player(player_session, "server_get_user_action", player_session.pending_action)
+    for event, data in missed:
+        emit(event, data)
+    emit("server_resumed", {"room": player_session.room})
+
+
+@socketio.on("disconnect")
+def on_disconnect(reason=None):
+    player_sessions.disconnect(request.sid)
+
+
 @socketio.event
 def add_bot_event():
+    load_game_modules()
+    from strategy import StrategyPlayer
+
     curr_sid = request.sid
     with rooms_lock:
         game = rooms[session["room"]]
-        game.add_player(
-            BotPlayer(str(len(game.players)),
-                players[curr_sid].cash
-            )
+        # Ids are server-wide, so bots never share ledger accounts or stats
+        bot = StrategyPlayer(f"bot-{generate_unique_userid()}",
+            player_sessions.by_sid(curr_sid).player.cash,
+            bot_strategy,
         )
+        game.add_player(bot)
+        if ledger is not None:
+            ledger.buy_in(bot.get_id(), bot.cash)
+        server_metrics.players_seated.inc()
+        lobby.seats_changed(session["room"], game.num_seated_players())
         print({"players" : str(game.players)})
         emit('server_player_update', {"players" : 'Players in Room: ' + str(game.players)},to=session["room"])
         if len(game.players) >= 2:
@@ -137,24 +358,54 @@ def start_game_event(message):
 
 
 @socketio.event
+@server_metrics.timed_handler
 def start_hand_event():
     with rooms_lock:
         game = rooms[session["room"]]
+        if game.num_seated_players() < 2:
+            emit("server_response", {"data": "Waiting for more players"})
+            return
         emit("server_start_hand", to=session["room"])
         # emit("server_disable_leave_room", to=session["room"])
-        game.play_hand()
+        server_metrics.hand_started()
+        try:
+            game.play_hand()
+        finally:
+            server_metrics.hand_completed()
+        remove_broke_players(session["room"], game)
         emit("server_end_hand", to=session["room"])
         # emit("server_enable_leave_room", to=session["room"])
 
 
+def remove_broke_players(room, game):
+    # Called with rooms_lock held, between hands
+    broke = [player for player in game.players if player.cash == 0]
+    if not broke:
+        return
+    for player in broke:
+        game.remove_player(player)
+        server_metrics.players_seated.dec()
+    lobby.seats_changed(room, game.num_seated_players())
+    emit("server_player_update", {"players": "Players in Room: " + str(game.players)}, to=room)
+
+
 @socketio.event
+@server_metrics.timed_handler
 def submit_action_event(message):
-    player = players[request.sid]
-    player.action = message["action"]
+    player_session = player_sessions.by_sid(request.sid)
+    # Spectators cannot act
+    if player_session is None:
+        return
+    player_session.pending_action = None
+    player = player_session.player
+    amount = message.get("amount")
+    player.action = (message["action"], float(amount) if amount not in (None, "") else None)
 
 
 @socketio.event
 def message_room_event(message):
+    if "room" not in session:
+        return
     print(message)
     emit(
         "server_response",
@@ -163,7 +414,9 @@ def message_room_event(message):
     )
 
 # TODO: add sit-out and timeout functions
-# TODO: allow different raise sizes
+
+# Everything a request needs before the game is loaded
+server_metrics.startup_phase("boot", perf_counter() - _boot_start)
 
 if __name__ == "__main__":
     socketio.run(app)
@@ -0,0 +1,85 @@
+"""
+Seats that outlive a socket.
+
+A player who joins a game gets a session token. The private events sent to
+them are numbered and kept in a bounded ring buffer, so a client that
+reconnects with the token and the last sequence number it saw is rebound
+to the same `HumanPlayer` and only gets what it missed.
+"""
+
+import secrets
+import threading
+from collections import deque
+
+
+class PlayerSession:
+    def __init__(self, token, player, room, sid, capacity=256):
+        self.token = token
+        self.player = player
+        self.room = room
+        # None while the client is disconnected
+        self.sid = sid
+        self.events = deque(maxlen=capacity)
+        self.seq = 0
+        # The action request the player has not answered yet
+        self.pending_action = None
+        self.lock = threading.Lock()
+
+    def record(self, event, data):
+        """Number `data` and keep it for replay; returns the numbered data."""
+        with self.lock:
+            self.seq += 1
+            data = dict(data, seq=self.seq)
+            self.events.append((event, data))
+            return data
+
+    def since(self, seq):
+        """(event, data) sent after `seq`, or None when some have been dropped."""
+        with self.lock:
+            if seq > self.seq:
+                return None
+            missed = self.seq - seq
+            if missed > len(self.events):
+                return None
+            return list(self.events)[len(self.events) - missed :]
+
+
+class SessionRegistry:
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.sessions = {}
+        # sid -> session, for connected clients
+        self.connected = {}
+        self.lock = threading.Lock()
+
+    def create(self, player, room, sid):
+        token = secrets.token_urlsafe(16)
+        session = PlayerSession(token, player, room, sid, self.capacity)
+        with self.lock:
+            self.sessions[token] = session
+            self.connected[sid] = session
+        return session
+
+    def by_sid(self, sid):
+        with self.lock:
+            return self.connected.get(sid)
+
+    def disconnect(self, sid):
+        with self.lock:
+            session = self.connected.pop(sid, None)
+        if session is not None:
+            with session.lock:
+                session.sid = None
+        return session
+
+    def resume(self, token, sid):
+        """Rebind the session of `token` to `sid`."""
+        with self.lock:
+            session = self.sessions.get(token)
+            if session is None:
+                raise Exception("Unknown session token.")
+            self.connected.pop(session.sid, None)
+            self.connected[sid] = session
+        with session.lock:
+            session.sid = sid
+        return session
@@ -0,0 +1,209 @@
+"""
+HUD statistics per player.
+
+Every hand is reduced to a row of counters per player (see `COUNTERS`),
+which are summed per player. `StatsTracker` adds each hand as a `Game` hand
+listener, so a HUD is a handful of divisions however long the history is.
+`StatsTracker.recompute` rebuilds everything from exported hand columns
+(see `export.load`) in NumPy array operations, with no loop over hands.
+"""
+
+import threading
+from collections import namedtuple
+
+COUNTERS = (
+    "hands",
+    "vpip",               # put chips in preflop voluntarily
+    "pfr",                # raised preflop
+    "three_bet",          # re-raised a single preflop raise
+    "three_bet_chances",  # acted facing a single preflop raise
+    "aggressive",         # bets and raises after the flop
+    "passive",            # calls after the flop
+    "saw_flop",
+    "showdown",
+    "showdown_won",
+)
+
+HUD = namedtuple("HUD", ["hands", "vpip", "pfr", "three_bet", "aggression", "wtsd", "showdown_win_rate"])
+
+BLINDS = ("SB", "BB")
+
+
+def hand_counters(record):
+    """{player id: counters} for one `HandRecord`, in `COUNTERS` order."""
+    counters = {
+        player_id: [0] * len(COUNTERS)
+        for player_id, cards in zip(record.players, record.hole_cards)
+        if cards
+    }
+    for row in counters.values():
+        row[0] = 1
+
+    folded_preflop = set()
+    for street, actions in record.actions.items():
+        preflop = street == "preflop"
+        price = 0
+        # The big blind counts as the first bet preflop, so a 3-bet is
+        # a raise made when there have been two
+        raises = 0
+        for player_id, action, amount in actions:
+            row = counters[player_id]
+            if action in BLINDS:
+                price = max(price, amount)
+                raises += action == "BB"
+                continue
+            raised = action == "RAISE" or (action == "ALL IN" and amount > price)
+            called = action == "CALL" or (action == "ALL IN" and not raised)
+            price = max(price, amount)
+
+            if preflop:
+                if raises == 2:
+                    row[4] = 1
+                if raised or called:
+                    row[1] = 1
+                if raised:
+                    row[2] = 1
+                    row[3] |= raises == 2
+                if action == "FOLD":
+                    folded_preflop.add(player_id)
+            else:
+                row[5] += raised
+                row[6] += called
+            raises += raised
+
+    saw_flop = bool(record.boards) and len(record.boards[0]) >= 3
+    for player_id, won in zip(record.players, record.winnings):
+        row = counters.get(player_id)
+        if row is None:
+            continue
+        row[7] = int(saw_flop and player_id not in folded_preflop)
+        if player_id in record.showdown:
+            row[8] = 1
+            row[9] = int(won > 0)
+    return counters
+
+
+def hud(totals):
+    """`HUD` from summed counters, ratios as fractions (None without data)."""
+    hands, vpip, pfr, three_bet, chances, aggressive, passive, saw_flop, showdown, won = totals
+
+    def ratio(a, b):
+        return a / b if b else None
+
+    return HUD(
+        hands=hands,
+        vpip=ratio(vpip, hands),
+        pfr=ratio(pfr, hands),
+        three_bet=ratio(three_bet, chances),
+        aggression=ratio(aggressive, passive),
+        wtsd=ratio(showdown, saw_flop),
+        showdown_win_rate=ratio(won, showdown),
+    )
+
+
+class StatsTracker:
+    def __init__(self):
+        # player id -> summed counters
+        self.totals = {}
+        self.lock = threading.Lock()
+
+    def add_hand(self, record):
+        counters = hand_counters(record)
+        with self.lock:
+            for player_id, row in counters.items():
+                totals = self.totals.get(player_id)
+                if totals is None:
+                    self.totals[player_id] = row
+                else:
+                    for i, count in enumerate(row):
+                        totals[i] += count
+
+    def hud(self, player_id):
+        with self.lock:
+            totals = self.totals.get(player_id)
+            if totals is None:
+                return None
+            return hud(tuple(totals))
+
+    def recompute(self, columns):
+        """Replace all totals with those of the hands in `columns`, as
+        returned by `export.load`.
+        """
+        # Imported here so tracking hands one at a time needs no NumPy
+        import numpy as np
+        from export import ACTIONS, CARD_BITS
+
+        players = columns["player"]
+        seat_hand = _row_hands(np, columns["seat_offsets"])
+        action_hand = _row_hands(np, columns["action_offsets"])
+        street, action = columns["street"], columns["action"]
+        dealt = columns["hole"] != 0
+
+        # Prices and raise counts run within each street of each hand
+        group = action_hand * 4 + street
+        new_group = np.r_[True, group[1:] != group[:-1]] if len(group) else np.zeros(0, bool)
+        group_index = np.cumsum(new_group) - 1
+        # Amounts are compared by rank, so the running maximum is exact
+        amount_rank = np.unique(columns["amount"], return_inverse=True)[1].astype(np.int64)
+        span = int(amount_rank.max()) + 1 if len(amount_rank) else 1
+        running = np.maximum.accumulate(amount_rank + group_index * span) - group_index * span
+        price = np.r_[0, running[:-1]] if len(running) else running
+        price[new_group] = 0
+
+        is_action = lambda name: action == ACTIONS.index(name)
+        is_all_in = is_action("ALL IN")
+        raised = is_action("RAISE") | (is_all_in & (amount_rank > price))
+        called = is_action("CALL") | (is_all_in & ~raised)
+        # The big blind counts as the first bet preflop
+        bets = is_action("BB").astype(np.int64) + raised
+        cumulative = np.cumsum(bets)
+        before = cumulative - bets
+        raises = before - before[new_group][group_index]
+
+        preflop = street == 0
+        voluntary = preflop & ~(is_action("SB") | is_action("BB"))
+        facing_raise = voluntary & (raises == 2)
+
+        # Each action belongs to the seat of its player in its hand
+        num_codes = len(columns["players"])
+        seat_key = seat_hand * num_codes + players
+        order = np.argsort(seat_key, kind="stable")
+        action_seat = order[np.searchsorted(seat_key[order], action_hand * num_codes + columns["action_player"])]
+
+        def per_seat(flags):
+            return np.bincount(action_seat, weights=flags, minlength=len(players)).astype(np.int64)
+
+        board_offsets, boards = columns["board_offsets"], columns["board"]
+        has_board = board_offsets[:-1] < board_offsets[1:]
+        first_board = boards[np.minimum(board_offsets[:-1], max(len(boards) - 1, 0))] if len(boards) else 0
+        flop_dealt = has_board & (first_board >> (2 * CARD_BITS) != 0)
+        showdown = columns["showdown"] & dealt
+
+        table = np.stack(
+            [
+                dealt,
+                per_seat(voluntary & (raised | called)) > 0,
+                per_seat(voluntary & raised) > 0,
+                per_seat(facing_raise & raised) > 0,
+                per_seat(facing_raise) > 0,
+                per_seat(~preflop & raised),
+                per_seat(~preflop & called),
+                flop_dealt[seat_hand] & dealt & (per_seat(preflop & is_action("FOLD")) == 0),
+                showdown,
+                showdown & (columns["winnings"] > 0),
+            ],
+            axis=1,
+        ).astype(np.int64)[dealt]
+
+        codes = players[dealt]
+        sums = np.stack(
+            [np.bincount(codes, weights=table[:, i], minlength=num_codes) for i in range(len(COUNTERS))],
+            axis=1,
+        ).astype(np.int64)
+        with self.lock:
+            self.totals = {columns["players"][code]: sums[code].tolist() for code in np.unique(codes)}
+
+
+def _row_hands(np, offsets):
+    """The hand of each row of a column with per-hand `offsets`."""
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
@@ -0,0 +1,336 @@
+"""
+Pluggable bot strategies.
+
+A `StrategyPlayer` is a `BotPlayer` that asks a `Strategy` what to do. The
+strategy sees an `Observation` of the table and answers with the same codes
+as `BotPlayer.action_sequence`: "C" to check or call, "R" to raise or "F"
+to fold.
+
+Many tables can share one `BatchDispatcher`. It collects the decisions that
+arrive from all table threads within a tick and answers them with a single
+`decide_batch` call, e.g. a NumPy policy over `observation_arrays`.
+"""
+
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+from itertools import permutations
+from evaluator import NUM_CARDS, NUM_RANKS, NUM_SUITS, evaluate, evaluate_omaha
+from betting import clamp_raise
+from player import BotPlayer
+
+FOLD, CALL, RAISE = "F", "C", "R"
+ACTIONS = (FOLD, CALL, RAISE)
+
+Observation = namedtuple(
+    "Observation",
+    [
+        "seat",             # index of the deciding player in `stacks`
+        "stacks",           # cash behind for every player at the table
+        "bets",             # what every player has put in this round
+        "pot",
+        "big_blind",
+        "hole",             # card ints (see `Card.index`)
+        "board",
+        "betting_history",  # this round's (player id, action, total bet)
+        "opponents",        # other players still in the hand
+        "legal_actions",
+        "price_to_call",
+        "minimum_raise",
+        "raise_to",         # total bet after "R", within the legal raise range
+        "all_in",           # total bet if the player puts in everything
+    ],
+)
+
+
+def observe(player, price_to_call, minimum_raise, legal):
+    game = player.game
+    if game is None:
+        raise Exception(f"{player} has to be added to a game before it can decide.")
+
+    all_in = player.cash + player.betting_this_round
+    can_raise = legal.min_raise_to is not None
+    return Observation(
+        seat=game.players.index(player),
+        stacks=tuple(p.cash for p in game.players),
+        bets=tuple(game.player_prev_bet[p] for p in game.players),
+        pot=game.curr_pot,
+        big_blind=game.bb,
+        hole=tuple(card.index for card in player.cards),
+        board=tuple(card.index for card in game.community_cards),
+        betting_history=tuple(game.betting_history),
+        opponents=game.num_players_in_current_hand() - 1,
+        legal_actions=ACTIONS if can_raise else (FOLD, CALL),
+        price_to_call=price_to_call,
+        minimum_raise=minimum_raise,
+        raise_to=clamp_raise(price_to_call + minimum_raise * 2, legal) if can_raise else None,
+        all_in=all_in,
+    )
+
+
+def observation_arrays(observations, max_seats=9, max_hole=2):
+    """Stack observations into NumPy arrays, one row per observation.
+
+    Stacks and bets are padded with 0 and cards with -1.
+    """
+    # Imported here so strategies that decide one at a time need no NumPy
+    import numpy as np
+
+    def padded(rows, width, fill, dtype):
+        out = np.full((len(rows), width), fill, dtype=dtype)
+        for i, row in enumerate(rows):
+            out[i, : len(row)] = row
+        return out
+
+    return {
+        "seat": np.array([o.seat for o in observations], dtype=np.int64),
+        "stacks": padded([o.stacks for o in observations], max_seats, 0, np.float64),
+        "bets": padded([o.bets for o in observations], max_seats, 0, np.float64),
+        "pot": np.array([o.pot for o in observations], dtype=np.float64),
+        "big_blind": np.array([o.big_blind for o in observations], dtype=np.float64),
+        "hole": padded([o.hole for o in observations], max_hole, -1, np.int64),
+        "board": padded([o.board for o in observations], 5, -1, np.int64),
+        "opponents": np.array([o.opponents for o in observations], dtype=np.int64),
+        "can_raise": np.array([RAISE in o.legal_actions for o in observations]),
+        "price_to_call": np.array([o.price_to_call for o in observations], dtype=np.float64),
+        "minimum_raise": np.array([o.minimum_raise for o in observations], dtype=np.float64),
+        "raise_to": np.array([o.raise_to or 0 for o in observations], dtype=np.float64),
+        "all_in": np.array([o.all_in for o in observations], dtype=np.float64),
+    }
+
+
+class Strategy(ABC):
+    @abstractmethod
+    def decide(self, observation):
+        pass
+
+    def decide_batch(self, observations):
+        return [self.decide(observation) for observation in observations]
+
+
+class RandomStrategy(Strategy):
+    """Uniform over the legal actions, like a `BotPlayer` without a script."""
+
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+
+    def decide(self, observation):
+        return self.rng.choice(observation.legal_actions)
+
+
+SUIT_PERMUTATIONS = list(permutations(range(NUM_SUITS)))
+
+
+def _canonical_spot(hole, board):
+    # Spots that differ only by a renaming of suits have the same equity
+    def rename(cards, perm):
+        return tuple(sorted(perm[c // NUM_RANKS] * NUM_RANKS + c % NUM_RANKS for c in cards))
+
+    return min((rename(hole, perm), rename(board, perm)) for perm in SUIT_PERMUTATIONS)
+
+
+class EquityStrategy(Strategy):
+    """Calls when Monte Carlo equity beats the pot odds and raises when it
+    beats them by `raise_margin`.
+
+    Equity is simulated against random hands for the opponents still in the
+    hand. Each decision samples for at most `time_budget` seconds and adds
+    its trials to an LRU cache keyed by the suit-canonical spot, so a spot
+    seen again at any table starts from, and refines, the earlier estimate.
+    """
+
+    def __init__(
+        self, time_budget=0.005, max_trials=2000, cache_size=50000, raise_margin=0.15, seed=None,
+        clock=time.perf_counter,
+    ):
+        self.time_budget = time_budget
+        self.clock = clock
+        self.max_trials = max_trials
+        self.cache_size = cache_size
+        self.raise_margin = raise_margin
+        self.rng = random.Random(seed)
+        # spot -> [wins, trials]
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _simulate(self, hole, board, opponents, trials, deadline, at_least=1):
+        """(wins, trials run). Beyond the first `at_least`, a trial only
+        starts if it should end by `deadline`.
+        """
+        deck = [card for card in range(NUM_CARDS) if card not in hole and card not in board]
+        num_hole, missing = len(hole), 5 - len(board)
+        if num_hole == 2:
+            strength = lambda cards, full_board: evaluate(cards + full_board)
+        else:
+            strength = evaluate_omaha
+
+        wins, done = 0.0, 0
+        clock = self.clock
+        now = clock()
+        # Trials that meet a better hand early are cut short, so the cost of
+        # the next trial is bounded by the longest one so far
+        longest = 0.0
+        while done < trials:
+            if done >= at_least and now + longest > deadline:
+                break
+            dealt = self.rng.sample(deck, opponents * num_hole + missing)
+            full_board = board + dealt[:missing]
+            mine = strength(hole, full_board)
+            best, tied = mine, 1
+            for i in range(opponents):
+                theirs = strength(dealt[missing + i * num_hole : missing + (i + 1) * num_hole], full_board)
+                if theirs > best:
+                    break
+                tied += theirs == best
+            else:
+                wins += 1 / tied
+
+            done += 1
+            start, now = now, clock()
+            longest = max(longest, now - start)
+        return wins, done
+
+    def equity(self, hole, board, opponents):
+        deadline = self.clock() + self.time_budget
+        if opponents < 1:
+            return 1.0
+        key = _canonical_spot(hole, board) + (opponents,)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                entry = self._cache[key] = [0.0, 0]
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            else:
+                self._cache.move_to_end(key)
+
+        if entry[1] < self.max_trials:
+            hole, board = list(key[0]), list(key[1])
+            # A spot with no trials yet needs one for an estimate
+            wins, trials = self._simulate(
+                hole, board, opponents, self.max_trials - entry[1], deadline, at_least=0 if entry[1] else 1
+            )
+            with self._lock:
+                entry[0] += wins
+                entry[1] += trials
+        return entry[0] / entry[1]
+
+    def decide(self, observation):
+        to_call = observation.price_to_call - observation.bets[observation.seat]
+        equity = self.equity(observation.hole, observation.board, observation.opponents)
+        pot_odds = to_call / (observation.pot + to_call) if to_call > 0 else 0.0
+
+        fair_share = 1 / (observation.opponents + 1)
+        if RAISE in observation.legal_actions and equity > max(pot_odds, fair_share) + self.raise_margin:
+            return RAISE
+        if to_call == 0 or equity >= pot_odds:
+            return CALL
+        return FOLD
+
+
+class ArrayStrategy(Strategy):
+    """Wraps `policy(arrays) -> actions`, a function over `observation_arrays`
+    that returns one of 0 (fold), 1 (call) or 2 (raise) per row.
+    """
+
+    def __init__(self, policy, max_seats=9, max_hole=2):
+        self.policy = policy
+        self.max_seats = max_seats
+        self.max_hole = max_hole
+
+    def decide(self, observation):
+        return self.decide_batch([observation])[0]
+
+    def decide_batch(self, observations):
+        arrays = observation_arrays(observations, self.max_seats, self.max_hole)
+        return [ACTIONS[action] for action in self.policy(arrays)]
+
+
+class BatchDispatcher(Strategy):
+    """Answers `decide` calls from many threads with batched calls to `strategy`.
+
+    A batch is closed `tick` seconds after its first decision arrives, or as
+    soon as it holds `max_batch` decisions.
+    """
+
+    def __init__(self, strategy, tick=0.002, max_batch=4096):
+        self.strategy = strategy
+        self.tick = tick
+        self.max_batch = max_batch
+        self.batch_sizes = []
+        self._pending = []
+        self._cv = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def start(self):
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cv:
+            self._closed = True
+            self._cv.notify()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def decide(self, observation):
+        future = Future()
+        with self._cv:
+            if self._closed or self._thread is None:
+                raise Exception("The dispatcher is not running.")
+            self._pending.append((observation, future))
+            self._cv.notify()
+        return future.result()
+
+    def decide_batch(self, observations):
+        return self.strategy.decide_batch(observations)
+
+    def _next_batch(self):
+        with self._cv:
+            while not self._pending and not self._closed:
+                self._cv.wait()
+            # Give the other tables a tick to join the batch
+            deadline = time.monotonic() + self.tick
+            while len(self._pending) < self.max_batch and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cv.wait(remaining)
+            batch = self._pending[: self.max_batch]
+            del self._pending[: self.max_batch]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            self.batch_sizes.append(len(batch))
+            try:
+                actions = self.strategy.decide_batch([observation for observation, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), action in zip(batch, actions):
+                future.set_result(action)
+
+
+class StrategyPlayer(BotPlayer):
+    def __init__(self, name, cash, strategy):
+        super().__init__(name, cash)
+        self.strategy = strategy
+
+    def choose_action(self, price_to_call, minimum_raise, legal):
+        return self.strategy.decide(observe(self, price_to_call, minimum_raise, legal))
@@ -1,13 +1,51 @@
 import itertools
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
+import unittest.mock
 from collections import deque
-from card import Card, DENOMS, SUITS
-from game import Game
+from card import Card, DENOMS, SUITS, card_from_index
+from game import VARIANTS, Game, HandRecord, runout_equity
 from deck import Deck
-from player import BotPlayer
-from hand import Hand
+from player import BotPlayer, HumanPlayer
+import betting
+from hand import Hand, OmahaHand, OmahaHiLoHand
+import evaluator
+from evaluator import CATEGORY_NAMES, category
+import board as board_analysis
+from seats import SeatRing
+from broadcast import PLAYERS, SPECTATORS, BroadcastHub, RoomBroadcaster
+from sessions import SessionRegistry
+from lobby import Lobby
+import ledger
+from stats import StatsTracker, hand_counters
+from strategy import (
+    ArrayStrategy,
+    BatchDispatcher,
+    EquityStrategy,
+    Observation,
+    RandomStrategy,
+    Strategy,
+    StrategyPlayer,
+)
+from tournament import BlindSchedule, Tournament
+from benchmark import compare_results, run_benchmarks
+from metrics import Counter, Histogram, merge_snapshots, render_prometheus
 import random
 
+try:
+    import numpy as np
+    import vector_game
+    from ranges import Range, parse_card, range_vs_range
+    import cfr
+    import export
+except ImportError:
+    np = None
+
 
 def a_simple_game():
     players = [("Alice", 20), ("Bob", 30), ("Cyril", 35)]
@@ -208,6 +246,11 @@ class TestHand(unittest.TestCase):
         self.assertEqual(set(Hand.is_full_house(tuple(cards))), set())
         self.assertEqual(Hand.is_full_house(tuple(deck[:12])), [])
 
+        # Two sets of trips make a full house, higher trips first
+        trips_low = [Card(s, "4") for s in ["Clubs", "Hearts", "Spades"]]
+        cards = trips_low + trips + [Card("Hearts", "King")]
+        self.assertEqual(Hand.is_full_house(tuple(cards)), trips + trips_low[:2])
+
     def test_flush(self):
         flush = [Card("Spades", d).denom_view for d in random.choices(DENOMS, k=5)]
 
@@ -391,6 +434,28 @@ class TestHand(unittest.TestCase):
 
         self.assertLess(hand0, hand1)
 
+    def test_lazy_ranking(self):
+        cards = list(a_shuffled_deck().deck)[:7]
+        hand = Hand(cards)
+        self.assertIsNone(hand._ranking)
+        self.assertEqual(category(hand.strength), evaluator.TWO_PAIR)
+
+        # Ranking and best five cards are only worked out when asked for
+        self.assertEqual(hand.ranking, "TWO PAIR")
+        self.assertSetEqual(
+            set(c.card_view for c in hand.hand),
+            {Card("Spades", "10"), Card("Clubs", "10"), Card("Spades", "3"),
+             Card("Clubs", "3"), Card("Diamonds", "Queen")},
+        )
+
+    def test_strength_matches_ranking(self):
+        rng = random.Random(11)
+        deck = list(a_shuffled_deck().deck)
+        for _ in range(500):
+            hand = Hand(rng.sample(deck, rng.choice([5, 6, 7])))
+            name = CATEGORY_NAMES[category(hand.strength)]
+            self.assertEqual(name, hand.ranking.replace("ROYAL", "STRAIGHT"))
+
 
 class TestGame(unittest.TestCase):
     def test_deal_players(self):
@@ -676,6 +741,1069 @@ class TestGame(unittest.TestCase):
         for player, cash in zip(game.players, players.values()):
             self.assertEqual(cash, player.cash)
 
+
+class TestOmaha(unittest.TestCase):
+    def test_evaluate_omaha_matches_enumeration(self):
+        rng = random.Random(34)
+        for num_hole in (4, 5):
+            for _ in range(500):
+                cards = rng.sample(range(52), num_hole + 5)
+                hole, board = cards[:num_hole], cards[num_hole:]
+                expected = max(
+                    evaluator.evaluate(list(pair) + list(triple))
+                    for pair in itertools.combinations(hole, 2)
+                    for triple in itertools.combinations(board, 3)
+                )
+                self.assertEqual(evaluator.evaluate_omaha(hole, board), expected)
+
+    def test_must_use_two_hole_cards(self):
+        # Four spades on the board and one in hand is no flush in Omaha
+        board = [Card("Spades", d) for d in ["Ace", "King", "9", "4"]] + [Card("Hearts", "2")]
+        hole = [Card("Spades", "Queen"), Card("Clubs", "7"), Card("Diamonds", "7"), Card("Hearts", "Jack")]
+        hand = OmahaHand(hole, board)
+        self.assertEqual(hand.ranking, "ONE PAIR")
+        self.assertEqual(Hand(hole + board).ranking, "FLUSH")
+        self.assertEqual(len(set(hand.hand) & set(hole)), 2)
+
+    def test_play_omaha_hand(self):
+        game = Game(variant="omaha")
+        for name in "abcd":
+            game.add_player(BotPlayer(name, 50, action_sequence=deque("CCCC")))
+        game.play_hand()
+        self.assertTrue(all(len(p.cards) == 4 for p in game.players))
+        self.assertEqual(sum(p.cash for p in game.players), 200)
+        for player, hand in game.player_hand.items():
+            self.assertIsInstance(hand, OmahaHand)
+
+        with self.assertRaises(Exception):
+            Game(variant="razz")
+
+    def test_flush_with_many_cards(self):
+        spades = [Card("Spades", d) for d in ["2", "4", "6", "8", "10"]]
+        hearts = [Card("Hearts", d) for d in ["3", "5", "7", "9", "Queen"]]
+        hand = Hand(spades + hearts)
+        self.assertEqual(hand.ranking, "FLUSH")
+        self.assertEqual(set(hand.hand), set(hearts))
+
+
+class TestTableCache(unittest.TestCase):
+    def test_cached_tables_match_built(self):
+        self.assertEqual((evaluator.TOP_FIVE, evaluator.STRAIGHT_TOP), evaluator._build_rank_mask_tables())
+        self.assertEqual((evaluator.FIVE_CARD_UNSUITED, evaluator.FIVE_CARD_FLUSH), evaluator._build_five_card_tables())
+        self.assertEqual(evaluator.LOW_EIGHT, evaluator._build_low_table())
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "tables.bin")
+            evaluator.save_tables(path)
+            tables = evaluator._load_tables(path)
+            self.assertEqual(tables["top_five"], evaluator.TOP_FIVE)
+            self.assertEqual(
+                dict(zip(tables["unsuited_keys"], tables["unsuited_strengths"])), evaluator.FIVE_CARD_UNSUITED
+            )
+            self.assertEqual(tables["low"], evaluator.LOW_EIGHT)
+
+            # A cache from another version of the tables is ignored
+            with open(path, "r+b") as f:
+                f.write((evaluator.TABLES_VERSION + 1).to_bytes(8, "little"))
+            self.assertIsNone(evaluator._load_tables(path))
+
+            # Truncated files are ignored too, whatever their length
+            for size in (0, 13, 64):
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+                self.assertIsNone(evaluator._load_tables(path))
+
+    def import_evaluator(self, cache):
+        script = "import evaluator; print(evaluator.TABLES_SOURCE)"
+        env = dict(os.environ, POKER_TABLE_CACHE=cache)
+        result = subprocess.run(
+            [sys.executable, "-c", script], env=env, cwd=os.path.dirname(os.path.abspath(evaluator.__file__)),
+            capture_output=True, text=True, check=True,
+        )
+        return result.stdout.strip()
+
+    def test_corrupt_cache_is_rebuilt(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "tables.bin")
+            with open(path, "wb") as f:
+                f.write(b"not a table!!")
+            self.assertEqual(self.import_evaluator(path), "built")
+            self.assertIsNotNone(evaluator._load_tables(path))
+            self.assertEqual(self.import_evaluator(path), "cache")
+
+            # A cache directory that cannot be created falls back to building
+            blocked = os.path.join(path, "tables.bin")
+            self.assertEqual(self.import_evaluator(blocked), "built")
+
+
+class TestHiLo(unittest.TestCase):
+    def test_low_table(self):
+        wheel = [Card(s, d).index for s, d in zip(SUITS * 2, ["Ace", "2", "3", "4", "5"])]
+        eight = [Card(s, d).index for s, d in zip(SUITS * 2, ["Ace", "2", "3", "4", "8"])]
+        self.assertGreater(evaluator.evaluate_low(wheel), evaluator.evaluate_low(eight))
+        self.assertGreater(evaluator.evaluate_low(eight), evaluator.NO_LOW)
+        # A pair or a nine does not make a low
+        nine = [Card(s, d).index for s, d in zip(SUITS * 2, ["Ace", "2", "3", "4", "9"])]
+        paired = [Card(s, d).index for s, d in zip(SUITS * 2, ["Ace", "2", "3", "4", "4"])]
+        self.assertEqual(evaluator.evaluate_low(nine), evaluator.NO_LOW)
+        self.assertEqual(evaluator.evaluate_low(paired), evaluator.NO_LOW)
+
+    def test_omaha_hilo_matches_enumeration(self):
+        rng = random.Random(35)
+        low_cards = [i for i in range(52) if i % 13 < 7 or i % 13 == 12]
+        for _ in range(500):
+            hole, board = rng.sample(low_cards, 4), rng.sample(range(52), 5)
+            if set(hole) & set(board):
+                continue
+            combos = [
+                list(pair) + list(triple)
+                for pair in itertools.combinations(hole, 2)
+                for triple in itertools.combinations(board, 3)
+            ]
+            expected = (
+                max(map(evaluator.evaluate, combos)),
+                max(map(evaluator.evaluate_low, combos)),
+            )
+            self.assertEqual(evaluator.evaluate_omaha_hilo(hole, board), expected)
+
+    def test_split_pot(self):
+        game = Game(variant="omaha8")
+        high, low, neither = BotPlayer("high", 0), BotPlayer("low", 0), BotPlayer("neither", 0)
+        board = [Card("Spades", d) for d in ["Ace", "3", "King", "Queen"]] + [Card("Hearts", "5")]
+        game.player_hand = {
+            high: OmahaHiLoHand([Card("Spades", "Jack"), Card("Spades", "10"), Card("Clubs", "King"), Card("Clubs", "9")], board),
+            low: OmahaHiLoHand([Card("Clubs", "2"), Card("Diamonds", "4"), Card("Diamonds", "King"), Card("Hearts", "9")], board),
+            neither: OmahaHiLoHand([Card("Hearts", "Queen"), Card("Diamonds", "Queen"), Card("Clubs", "Jack"), Card("Hearts", "10")], board),
+        }
+        game.determine_pot_winners(90, [high, low, neither])
+        self.assertEqual((high.cash, low.cash, neither.cash), (45, 45, 0))
+
+        # Without a qualifying low the high hand scoops
+        game.determine_pot_winners(30, [high, neither])
+        self.assertEqual((high.cash, neither.cash), (75, 0))
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestRanges(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(len(Range.parse("QQ+")), 18)
+        self.assertEqual(len(Range.parse("AKs, AKo")), 16)
+        self.assertEqual(len(Range.parse("76s-54s")), 12)
+        self.assertEqual(len(Range.parse("ATs+")), 16)
+        self.assertEqual(len(Range.parse("22-44")), 18)
+        weighted = Range.parse("AK:0.5, AhKh")
+        self.assertEqual(len(weighted), 16)
+        self.assertEqual(weighted.weights[parse_card("Kh"), parse_card("Ah")], 1.0)
+        self.assertEqual(sum(weighted.weights.values()), 8.5)
+        with self.assertRaises(Exception):
+            Range.parse("AKx")
+
+    def test_remove_conflicts(self):
+        aces = Range.parse("AA").without([Card("Spades", "Ace")])
+        self.assertEqual(len(aces), 3)
+
+    def test_equity_matches_enumeration(self):
+        hero = Range.parse("QQ+, AKs:0.5, 76s")
+        villain = Range.parse("TT+, AQs, 98s:0.3")
+        board = [parse_card(c) for c in ["Ah", "7d", "2c", "Ks"]]
+        result = range_vs_range(hero, villain, board)
+
+        deck = [c for c in range(52) if c not in board]
+        total_won = total_weight = 0
+        for h, h_weight in hero.without(board).weights.items():
+            won = weight = 0
+            for v, v_weight in villain.without(board).weights.items():
+                for river in set(deck) - set(h) - set(v):
+                    if set(h) & set(v):
+                        continue
+                    h_strength = evaluator.evaluate(list(h) + board + [river])
+                    v_strength = evaluator.evaluate(list(v) + board + [river])
+                    won += v_weight * ((h_strength > v_strength) + (h_strength == v_strength) / 2)
+                    weight += v_weight
+            total_won += h_weight * won
+            total_weight += h_weight * weight
+            self.assertAlmostEqual(
+                result.combo_equities[card_from_index(h[0]), card_from_index(h[1])], won / weight
+            )
+        self.assertAlmostEqual(result.equity, total_won / total_weight)
+
+
+class TestBoardAnalysis(unittest.TestCase):
+    def test_draws(self):
+        flop = [Card("Hearts", "9"), Card("Hearts", "8"), Card("Clubs", "2")]
+        combo_draw = board_analysis.draws([Card("Hearts", "10"), Card("Hearts", "Jack")], flop)
+        self.assertTrue(combo_draw.flush_draw)
+        self.assertEqual(combo_draw.straight_draw, board_analysis.OPEN_ENDED)
+        self.assertEqual(combo_draw.outs, 15)
+
+        gutshot = board_analysis.draws([Card("Diamonds", "10"), Card("Clubs", "6")], flop)
+        self.assertEqual((gutshot.straight_draw, gutshot.outs), (board_analysis.GUTSHOT, 4))
+        overpair = board_analysis.draws([Card("Spades", "Ace"), Card("Diamonds", "Ace")], flop)
+        self.assertEqual(overpair, ("ONE PAIR", False, None, 0))
+
+    def test_double_gutshot(self):
+        # 5 or 9 makes a straight, but the held ranks are not consecutive
+        board = [Card("Hearts", "4"), Card("Clubs", "6"), Card("Spades", "7"), Card("Diamonds", "King")]
+        double = board_analysis.draws([Card("Hearts", "10"), Card("Diamonds", "8")], board)
+        self.assertEqual((double.straight_draw, double.outs), (board_analysis.DOUBLE_GUTSHOT, 8))
+        open_ended = board_analysis.draws([Card("Hearts", "9"), Card("Diamonds", "8")], board)
+        self.assertEqual((open_ended.straight_draw, open_ended.outs), (board_analysis.OPEN_ENDED, 8))
+
+        # Ace low: 2345 is open at both ends, A234 only at the top
+        board = [Card("Hearts", "3"), Card("Clubs", "4"), Card("Spades", "King")]
+        wheel = board_analysis.draws([Card("Hearts", "2"), Card("Diamonds", "5")], board)
+        self.assertEqual(wheel.straight_draw, board_analysis.OPEN_ENDED)
+        wheel = board_analysis.draws([Card("Hearts", "2"), Card("Diamonds", "Ace")], board)
+        self.assertEqual((wheel.straight_draw, wheel.outs), (board_analysis.GUTSHOT, 4))
+
+    def test_isomorphic_boards_share_analysis(self):
+        flop = [Card("Hearts", "9"), Card("Hearts", "8"), Card("Clubs", "2")]
+        renamed = [Card("Spades", "9"), Card("Spades", "8"), Card("Diamonds", "2")]
+        self.assertIs(board_analysis.analyze(flop)[0], board_analysis.analyze(renamed)[0])
+        self.assertEqual(
+            board_analysis.draws([Card("Hearts", "10"), Card("Hearts", "Jack")], flop),
+            board_analysis.draws([Card("Spades", "10"), Card("Spades", "Jack")], renamed),
+        )
+
+    def test_texture(self):
+        texture = board_analysis.board_texture(
+            [Card("Hearts", "9"), Card("Hearts", "8"), Card("Hearts", "7"), Card("Clubs", "9")]
+        )
+        self.assertTrue(texture.paired)
+        self.assertFalse(texture.trips)
+        self.assertTrue(texture.flush_possible)
+        self.assertTrue(texture.straight_possible)
+        self.assertEqual(texture.max_suit, 3)
+
+
+class TestStrategy(unittest.TestCase):
+    def test_observation(self):
+        seen = []
+
+        class CallStation(Strategy):
+            def decide(self, observation):
+                seen.append(observation)
+                return "C"
+
+        game = Game()
+        for name in "abc":
+            game.add_player(StrategyPlayer(name, 100, CallStation()))
+        game.play_hand()
+
+        # The button moves to seat 1, so UTG is seat 1 again
+        first = seen[0]
+        self.assertEqual(first.seat, 1)
+        self.assertEqual(first.price_to_call, game.bb)
+        self.assertEqual(first.legal_actions, ("F", "C", "R"))
+        self.assertEqual(first.raise_to, game.bb * 3)
+        self.assertEqual(len(first.hole), 2)
+        self.assertEqual([len(o.board) for o in seen[-3:]], [5, 5, 5])
+
+    def test_batch_dispatcher(self):
+        tables = []
+        with BatchDispatcher(RandomStrategy(seed=38), tick=0.01) as dispatcher:
+            for t in range(8):
+                game = Game()
+                for i in range(4):
+                    game.add_player(StrategyPlayer(f"{t}-{i}", 100, dispatcher))
+                tables.append(game)
+            threads = [threading.Thread(target=game.play_hand) for game in tables]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        for game in tables:
+            self.assertEqual(sum(p.cash for p in game.players), 400)
+        self.assertGreater(max(dispatcher.batch_sizes), 1)
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_array_strategy(self):
+        # Raise when allowed, otherwise call
+        strategy = ArrayStrategy(lambda arrays: np.where(arrays["can_raise"], 2, 1))
+        game = Game()
+        for name in "ab":
+            game.add_player(StrategyPlayer(name, 20, strategy))
+        game.play_hand()
+        # Both stacks go in, so it is a split or a double up
+        self.assertIn(sorted(p.cash for p in game.players), ([0, 40], [20, 20]))
+
+
+class TestEquityStrategy(unittest.TestCase):
+    def spot(self, hole, pot, price_to_call, opponents=1):
+        return Observation(
+            seat=0, stacks=(100, 100), bets=(0, price_to_call), pot=pot, big_blind=2,
+            hole=tuple(Card(s, d).index for s, d in hole), board=(),
+            betting_history=(), opponents=opponents, legal_actions=("F", "C", "R"),
+            price_to_call=price_to_call, minimum_raise=2, raise_to=price_to_call + 4, all_in=100,
+        )
+
+    def test_decisions_follow_pot_odds(self):
+        strategy = EquityStrategy(time_budget=1, max_trials=400, seed=39)
+        aces = [("Spades", "Ace"), ("Hearts", "Ace")]
+        trash = [("Spades", "7"), ("Hearts", "2")]
+        self.assertEqual(strategy.decide(self.spot(aces, 10, 10)), "R")
+        # Getting 2:1 on a call, 7-2 offsuit is not good enough
+        self.assertEqual(strategy.decide(self.spot(trash, 20, 20, opponents=3)), "F")
+        # A free check is never folded
+        self.assertEqual(strategy.decide(self.spot(trash, 20, 0, opponents=3)), "C")
+
+    def test_cache_shared_across_suits(self):
+        strategy = EquityStrategy(time_budget=1, max_trials=64, seed=39)
+        first = strategy.equity((Card("Spades", "King").index, Card("Spades", "Queen").index), (), 2)
+        again = strategy.equity((Card("Hearts", "King").index, Card("Hearts", "Queen").index), (), 2)
+        self.assertEqual(first, again)
+        self.assertEqual(len(strategy._cache), 1)
+
+    def test_time_budget(self):
+        # Every reading of the clock moves it on a millisecond, as if each
+        # trial took that long
+        ticks = itertools.count()
+        clock = lambda: next(ticks) / 1000
+        strategy = EquityStrategy(time_budget=0.005, seed=39, clock=clock)
+        # Six-card Omaha against five opponents is the slowest spot to simulate
+        hole = tuple(range(6))
+        strategy.equity(hole, (), 5)
+        # The deadline is read at 0 ms and the trials start at 1 ms, so four
+        # fit in the budget and a fifth would end after it
+        self.assertEqual(strategy._cache[next(iter(strategy._cache))][1], 4)
+
+        # A deadline already past starts no trial, unless there is no
+        # estimate at all yet
+        strategy.time_budget = 0
+        strategy.equity(hole, (), 5)
+        self.assertEqual(strategy._cache[next(iter(strategy._cache))][1], 4)
+        strategy.equity(tuple(range(6, 12)), (), 5)
+        self.assertEqual([entry[1] for entry in strategy._cache.values()], [4, 1])
+
+    def test_plays_hands(self):
+        strategy = EquityStrategy(time_budget=0.002, seed=39)
+        game = Game()
+        for name in "abcd":
+            game.add_player(StrategyPlayer(name, 50, strategy))
+        for _ in range(3):
+            for player in game.players:
+                player.cash = 50
+            game.play_hand()
+        self.assertEqual(sum(p.cash for p in game.players), 200)
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestCFR(unittest.TestCase):
+    config = cfr.DEFAULT_CONFIG._replace(capacity=1 << 12) if np is not None else None
+
+    def test_abstract_hand_rules(self):
+        # SB raises to 3bb, BB calls, then check / check to the river
+        state = cfr.apply_action(self.config, cfr.PREFLOP, 2)
+        self.assertEqual((state.price, state.minimum_raise, state.contributions), (3.0, 2.0, (3.0, 1.0)))
+        state = cfr.apply_action(self.config, state, cfr.CALL_ACTION)
+        self.assertEqual((state.street, state.contributions, state.player), (1, (3.0, 3.0), 0))
+        self.assertEqual(cfr.legal_actions(self.config, state)[0], cfr.CALL_ACTION)
+
+        all_in = cfr.apply_action(self.config, state, len(self.config.bet_sizes) + 2)
+        self.assertEqual(all_in.contributions, (100.0, 3.0))
+        called = cfr.apply_action(self.config, all_in, cfr.CALL_ACTION)
+        self.assertTrue(called.showdown)
+        self.assertEqual(cfr.payoff(called, [2, 1]), 100.0)
+        folded = cfr.apply_action(self.config, all_in, cfr.FOLD_ACTION)
+        self.assertEqual(cfr.payoff(folded, [1, 2]), 3.0)
+
+    def test_train_checkpoint_and_play(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cfr.npz")
+            trainer = cfr.Trainer(self.config, checkpoint=path)
+            trainer.train(40, epoch=20)
+            self.assertTrue(trainer.strategy_sums.any())
+
+            resumed = cfr.Trainer(self.config, checkpoint=path)
+            self.assertEqual(resumed.iterations, 40)
+            self.assertTrue((resumed.regrets == trainer.regrets).all())
+            with self.assertRaises(Exception):
+                cfr.Trainer(self.config._replace(stack=50), checkpoint=path)
+
+        strategy = cfr.CFRStrategy(trainer, seed=40)
+        game = Game()
+        for name in "ab":
+            game.add_player(StrategyPlayer(name, 200, strategy))
+        for _ in range(5):
+            game.play_hand()
+        self.assertEqual(sum(p.cash for p in game.players), 400)
+
+
+class TestBetting(unittest.TestCase):
+    def test_legal_raise_ranges(self):
+        no_limit, pot_limit, fixed_limit = (
+            betting.STRUCTURES[name] for name in ("no-limit", "pot-limit", "fixed-limit")
+        )
+        # Facing a bet of 10 into a pot of 30 (20 before the bet)
+        legal = betting.legal_actions(no_limit, 10, 10, 0, 100, 30, 2)
+        self.assertEqual(legal, (("fold", "check/call", "raise"), 10, 20, 100))
+        legal = betting.legal_actions(pot_limit, 10, 10, 0, 100, 30, 2)
+        self.assertEqual((legal.min_raise_to, legal.max_raise_to), (20, 50))
+        legal = betting.legal_actions(fixed_limit, 10, 10, 0, 100, 30, 2, street=2)
+        self.assertEqual((legal.min_raise_to, legal.max_raise_to), (14, 14))
+        capped = betting.legal_actions(fixed_limit, 10, 10, 0, 100, 30, 2, raises=4)
+        self.assertEqual(capped.actions, ("fold", "check/call"))
+
+        # A short stack can only raise all in, and cannot raise at all when
+        # calling takes everything
+        short = betting.legal_actions(no_limit, 10, 10, 0, 15, 30, 2)
+        self.assertEqual((short.min_raise_to, short.max_raise_to), (15, 15))
+        shorter = betting.legal_actions(no_limit, 10, 10, 0, 8, 30, 2)
+        self.assertEqual((shorter.actions, shorter.to_call), (("fold", "check/call"), 8))
+
+    def test_resolve(self):
+        legal = betting.legal_actions(betting.STRUCTURES["no-limit"], 10, 10, 2, 50, 30, 2)
+        self.assertEqual(betting.resolve("check/call", None, 50, 2, 10, legal), (42, 10, 0, "playing"))
+        self.assertEqual(betting.resolve("raise", 25, 50, 2, 10, legal), (27, 25, 15, "playing"))
+        self.assertEqual(betting.resolve("raise", 52, 50, 2, 10, legal), (0, 52, 42, "all in"))
+        self.assertEqual(betting.resolve("fold", None, 50, 2, 10, legal), (50, 0, 0, "folded"))
+        with self.assertRaises(Exception):
+            betting.resolve("raise", 15, 50, 2, 10, legal)
+
+    def test_structures_play_hands(self):
+        for structure in betting.STRUCTURES:
+            game = Game(structure=structure)
+            for name in "abcd":
+                game.add_player(BotPlayer(name, 100))
+            for _ in range(5):
+                for player in game.players:
+                    player.cash = 100
+                game.play_hand()
+                self.assertEqual(sum(p.cash for p in game.players), 400)
+
+    def test_human_raise_is_validated(self):
+        requests = []
+        answers = deque([("raise", 3), ("raise", 9.5), ("check/call", None)])
+        human = HumanPlayer("h", 100, lambda _: None, None, lambda _: None)
+
+        def ask(legal):
+            requests.append(legal)
+            human._action = answers.popleft()
+
+        human.get_user_action_func = ask
+        legal = betting.legal_actions(betting.STRUCTURES["no-limit"], 2, 2, 0, 100, 3, 2)
+        # Raising to 3 is less than a minimum raise, so the player is asked again
+        self.assertEqual(human.decide(2, 2, legal), betting.Intent("raise", 9.5))
+        self.assertEqual(len(requests), 2)
+        # Deciding does not move any chips
+        self.assertEqual(human.cash, 100)
+
+    def test_apply_to_round_state(self):
+        no_limit = betting.STRUCTURES["no-limit"]
+        chips = betting.RoundState([99, 98, 100], [1, 2, 0], 2, 2, 3)
+        legal = betting.legal_actions_at(no_limit, chips, 2, 2, 0)
+        self.assertEqual(betting.apply(chips, 2, betting.Intent("raise", 8), legal), (8, 6, "playing"))
+        self.assertEqual((chips.stacks, chips.bets, chips.pot), ([99, 98, 92], [1, 2, 8], 11))
+        self.assertEqual((chips.price_to_call, chips.minimum_raise, chips.raises), (8, 6, 1))
+
+        legal = betting.legal_actions_at(no_limit, chips, 0, 2, 0)
+        self.assertEqual(betting.apply(chips, 0, betting.Intent("fold"), legal), (0, 0, "folded"))
+        legal = betting.legal_actions_at(no_limit, chips, 1, 2, 0)
+        self.assertEqual(betting.apply(chips, 1, betting.Intent("check/call"), legal), (8, 0, "playing"))
+        self.assertEqual((chips.stacks, chips.bets, chips.pot), ([99, 92, 92], [1, 8, 8], 17))
+
+    def test_short_all_in_does_not_reopen_betting(self):
+        no_limit = betting.STRUCTURES["no-limit"]
+        # b has the big blind of 2, c has 24 chips behind and d acts last
+        chips = betting.RoundState([98, 24, 100], [2, 0, 0], 2, 2, 3)
+        legal = betting.legal_actions_at(no_limit, chips, 0, 2, 0)
+        betting.apply(chips, 0, betting.Intent("raise", 20), legal)
+        legal = betting.legal_actions_at(no_limit, chips, 1, 2, 0)
+        self.assertEqual(betting.apply(chips, 1, betting.Intent("raise", 24), legal), (24, 4, "all in"))
+        self.assertEqual((chips.price_to_call, chips.minimum_raise, chips.raises), (24, 18, 1))
+
+        # d has not acted yet, so may still raise a full raise over the all-in
+        legal = betting.legal_actions_at(no_limit, chips, 2, 2, 0)
+        self.assertEqual((legal.actions, legal.min_raise_to), (("fold", "check/call", "raise"), 42))
+        betting.apply(chips, 2, betting.Intent("check/call"), legal)
+        # b raised before the all-in, so can only call the extra 4 or fold
+        legal = betting.legal_actions_at(no_limit, chips, 0, 2, 0)
+        self.assertEqual(legal, (("fold", "check/call"), 4, None, None))
+
+
+class TestAllInRunout(unittest.TestCase):
+    def all_in_game(self, runs=1):
+        game = a_simple_game_with_actions([["R"] * 10] * 3)
+        game.runs = runs
+        game.equity_samples = 200
+        messages = []
+        game.print = messages.append
+        return game, messages
+
+    def test_runout_skips_streets(self):
+        game, messages = self.all_in_game()
+        game.play_hand()
+        self.assertNotIn("==== FLOP ====", messages)
+        self.assertEqual(len(game.community_cards), 5)
+        self.assertTrue(any(m.startswith("All in: ") for m in messages))
+        self.assertAlmostEqual(sum(game.all_in_equity.values()), 1)
+        self.assertEqual(sum(p.cash for p in game.players), 85)
+        self.assertEqual(game.curr_pot, 0)
+
+    def test_run_it_twice(self):
+        game, messages = self.all_in_game(runs=2)
+        game.play_hand()
+        self.assertIn("Run 1", " ".join(messages))
+        self.assertIn("Run 2", " ".join(messages))
+        self.assertEqual(sum(p.cash for p in game.players), 85)
+
+    def test_equity_is_exact_on_the_turn(self):
+        card = lambda denom, suit: Card(suit, denom).index
+        aces = [card("Ace", "Spades"), card("Ace", "Hearts")]
+        kings = [card("King", "Spades"), card("King", "Hearts")]
+        board = [card("2", "Clubs"), card("7", "Diamonds"), card("9", "Hearts"), card("Jack", "Clubs")]
+        deck = [c for c in range(52) if c not in aces + kings + board]
+        # Only the two other kings save the underdog
+        equity = runout_equity(VARIANTS["holdem"], [aces, kings], board, deck)
+        self.assertEqual(equity, [42 / 44, 2 / 44])
+
+
+class TestBroadcast(unittest.TestCase):
+    def test_spectators_are_delayed_and_masked(self):
+        sent = []
+        now = [0.0]
+        hole = Card("Spades", "Ace")
+        broadcaster = RoomBroadcaster(
+            "r", lambda event, data, to: sent.append((event, data, to)), lambda: [hole], clock=lambda: now[0]
+        )
+        hub = BroadcastHub()
+        hub.add(broadcaster)
+
+        broadcaster.publish(f"Bot a shows {hole}")
+        broadcaster.publish("Bot a raises to 6")
+        self.assertEqual([to for _, _, to in sent], ["r", "r"])
+        self.assertEqual(sent[0][1], {"data": f"Bot a shows {hole}"})
+
+        hub.flush(SPECTATORS.delay - 1)
+        self.assertEqual(len(sent), 2)
+        # Everything due goes out in one message
+        now[0] = 5
+        broadcaster.publish("Bot a checks")
+        hub.flush(SPECTATORS.delay)
+        self.assertEqual(
+            sent[3],
+            ("server_game_updates", {"lines": ["Bot a shows ??", "Bot a raises to 6"]}, "r/spectators"),
+        )
+        hub.flush(SPECTATORS.delay + 5)
+        self.assertEqual(sent[4][1], {"lines": ["Bot a checks"]})
+
+    def test_game_lines_reach_every_tier(self):
+        sent = []
+        game = a_simple_game()
+        broadcaster = RoomBroadcaster(
+            "r",
+            lambda event, data, to: sent.append((data, to)),
+            lambda: [card for player in game.players for card in player.cards],
+            tiers=(PLAYERS, SPECTATORS._replace(delay=0)),
+        )
+        game.print = broadcaster.publish
+        game.play_hand()
+        spectated = [data["data"] for data, to in sent if to == "r/spectators"]
+        self.assertEqual(len(spectated), len(sent) / 2)
+        hole_cards = [repr(card) for player in game.players for card in player.cards]
+        self.assertFalse(any(card in line for line in spectated for card in hole_cards))
+
+
+class TestSessions(unittest.TestCase):
+    def test_replay_since_sequence(self):
+        registry = SessionRegistry(capacity=3)
+        session = registry.create(BotPlayer("a", 10), "r", "sid1")
+        for i in range(5):
+            session.record("server_game_update", {"data": i})
+        self.assertEqual([data["seq"] for _, data in session.since(3)], [4, 5])
+        self.assertEqual(session.since(5), [])
+        # Events before the ring buffer, or not sent yet, cannot be replayed
+        self.assertIsNone(session.since(1))
+        self.assertIsNone(session.since(6))
+
+    def test_resume_rebinds_sid(self):
+        registry = SessionRegistry()
+        player = BotPlayer("a", 10)
+        session = registry.create(player, "r", "sid1")
+        registry.disconnect("sid1")
+        self.assertIsNone(session.sid)
+        self.assertIsNone(registry.by_sid("sid1"))
+        self.assertIs(registry.resume(session.token, "sid2").player, player)
+        self.assertIs(registry.by_sid("sid2"), session)
+        with self.assertRaises(Exception):
+            registry.resume("not a token", "sid3")
+
+
+class TestHandRecords(unittest.TestCase):
+    def test_record_of_each_hand(self):
+        game = a_simple_game_with_actions([["C"] * 10] * 3)
+        records = []
+        game.add_hand_listener(records.append)
+        game.play_hand()
+        record = records[0]
+        self.assertEqual(record.players, ("Alice", "Bob", "Cyril"))
+        self.assertEqual([len(cards) for cards in record.hole_cards], [2, 2, 2])
+        self.assertEqual(len(record.boards[0]), 5)
+        self.assertEqual(list(record.actions), ["preflop", "flop", "turn", "river"])
+        # Every street keeps its own actions
+        self.assertEqual([a for _, a, _ in record.actions["preflop"]][:2], ["SB", "BB"])
+        self.assertNotIn("SB", [a for _, a, _ in record.actions["river"]])
+        self.assertEqual(sum(record.winnings), 6)
+        self.assertEqual(sum(record.final_stacks), sum(record.starting_stacks))
+        self.assertEqual(len(record.showdown), 3)
+
+
+class TestLobby(unittest.TestCase):
+    def test_summaries_follow_room_events(self):
+        now = [0.0]
+        lobby = Lobby(clock=lambda: now[0])
+        games = {}
+        for room, structure in [("a", "no-limit"), ("b", "pot-limit"), ("c", "no-limit")]:
+            games[room] = Game(structure=structure)
+            for name in "xyz":
+                games[room].add_player(BotPlayer(name, 100))
+            lobby.open_room(room, games[room])
+
+        now[0] = 1800
+        for _ in range(3):
+            for player in games["b"].players:
+                player.cash = 100
+            games["b"].play_hand()
+        lobby.seats_changed("c", 5)
+
+        page, total = lobby.list(limit=2)
+        self.assertEqual(total, 3)
+        self.assertEqual(page[0].room, "b")
+        self.assertEqual((page[0].hands, page[0].hands_per_hour), (3, 6.0))
+        self.assertGreater(page[0].average_pot, 0)
+
+        page, total = lobby.list(structure="no-limit", sort="seated")
+        self.assertEqual([s.room for s in page], ["c", "a"])
+        page, total = lobby.list(offset=1, limit=1, sort="room")
+        self.assertEqual([s.room for s in page], ["b"])
+        with self.assertRaises(Exception):
+            lobby.list(sort="cash")
+
+    def test_idle_rooms_slow_down(self):
+        now = [0.0]
+        lobby = Lobby(clock=lambda: now[0])
+        games = {}
+        for room in "ab":
+            games[room] = Game()
+            for name in "xyz":
+                games[room].add_player(BotPlayer(name, 100))
+            lobby.open_room(room, games[room])
+
+        def play(room, hands):
+            for _ in range(hands):
+                for player in games[room].players:
+                    player.cash = 100
+                games[room].play_hand()
+
+        now[0] = 600
+        play("a", 10)
+        play("b", 1)
+        self.assertEqual([s.room for s in lobby.list()[0]], ["a", "b"])
+
+        # Nothing is played in a for two hours while b keeps going
+        now[0] = 600 + 2 * 3600
+        play("b", 1)
+        page, _ = lobby.list()
+        self.assertEqual([s.room for s in page], ["b", "a"])
+        self.assertEqual(page[1].hands_per_hour, 0.0)
+
+        # b's last hand leaves the window without another being played
+        self.assertEqual(page[0].hands_per_hour, 1.0)
+        now[0] += 3601
+        self.assertEqual([s.hands_per_hour for s in lobby.list()[0]], [0.0, 0.0])
+
+
+class TestLedger(unittest.TestCase):
+    def test_hands_are_double_entry(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "ledger.sqlite3")
+            book = ledger.Ledger(path)
+            random.seed(47)
+            game = Game()
+            for name in "abcd":
+                game.add_player(BotPlayer(name, 10000))
+                book.buy_in(name, 10000)
+            game.add_hand_listener(book.hand_listener("r"))
+            for _ in range(5):
+                game.play_hand()
+
+            # Balances are in memory before anything is written
+            for player in game.players:
+                self.assertAlmostEqual(book.balance(ledger.player_account(player.get_id())), player.cash)
+            self.assertEqual(book.balance(ledger.CASHIER), -40000)
+            book.close()
+            self.assertLessEqual(book.commits, 6 + 1)
+
+            reopened = ledger.Ledger(path)
+            self.assertEqual(sum(reopened.balances.values()), 0)
+            for player in game.players:
+                self.assertAlmostEqual(reopened.balance(ledger.player_account(player.get_id())), player.cash)
+            reopened.close()
+
+    def test_one_transaction_per_action(self):
+        game = a_simple_game_with_actions([["R", "C"], ["F"], ["R", "C", "C", "C"]])
+        records = []
+        game.add_hand_listener(records.append)
+        game.play_hand()
+        record = records[0]
+
+        transactions = ledger.hand_transactions("r", record)
+        actions = [action for street in record.actions.values() for action in street]
+        self.assertEqual([t.kind for t in transactions[: len(actions)]], [a[1].lower() for a in actions])
+        self.assertTrue(all(t.kind == "award" for t in transactions[len(actions) :]))
+        # Bob's fold moves no chips
+        self.assertEqual(next(t for t in transactions if t.kind == "fold").entries, ())
+        for player_id, start, end in zip(record.players, record.starting_stacks, record.final_stacks):
+            account = ledger.player_account(player_id)
+            net = sum(amount for t in transactions for a, amount in t.entries if a == account)
+            self.assertEqual(net, ledger.to_units(end - start))
+
+    def test_split_pot_nets_to_zero(self):
+        # A pot of one chip split three ways cannot be shared in whole units
+        record = HandRecord(
+            1, "holdem", 0.4, 0, ("a", "b", "c"), ((0, 1), (2, 3), (4, 5)), ((6, 7, 8, 9, 10),),
+            {"preflop": (("a", "SB", 0.2), ("b", "BB", 0.4), ("c", "CALL", 0.4))},
+            (10, 10, 10), (10.13, 9.93, 9.93), (1 / 3, 1 / 3, 1 / 3), ("a", "b", "c"),
+        )
+        transactions = ledger.hand_transactions("r", record)
+        entries = [entry for t in transactions for entry in t.entries]
+        self.assertEqual(sum(amount for account, amount in entries if account == ledger.pot_account("r")), 0)
+        awards = sorted(t.entries[1][1] for t in transactions if t.kind == "award")
+        self.assertEqual(awards, [33, 33, 34])
+
+    def test_unbalanced_transaction(self):
+        with self.assertRaises(Exception):
+            ledger.transaction("bet", [("player:a", -5), ("pot:r", 4)])
+
+
+class TestStats(unittest.TestCase):
+    def test_counters_of_a_hand(self):
+        game = a_simple_game_with_actions([["R", "C"], ["F"], ["R", "C", "C", "C"]])
+        records = []
+        game.add_hand_listener(records.append)
+        game.play_hand()
+        counters = hand_counters(records[0])
+        # Bob folds, Cyril raises from the small blind, Alice re-raises
+        # from the big blind and Cyril calls
+        alice, bob, cyril = (dict(zip(("hands", "vpip", "pfr", "three_bet", "chances"), counters[name]))
+                             for name in ("Alice", "Bob", "Cyril"))
+        self.assertEqual(cyril, {"hands": 1, "vpip": 1, "pfr": 1, "three_bet": 0, "chances": 0})
+        self.assertEqual(alice, {"hands": 1, "vpip": 1, "pfr": 1, "three_bet": 1, "chances": 1})
+        self.assertEqual(bob["vpip"], 0)
+        self.assertEqual(counters["Bob"][7], 0)
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_recompute_matches_incremental(self):
+        random.seed(48)
+        game = Game()
+        for name in "abcd":
+            game.add_player(BotPlayer(name, 100))
+        tracker, records = StatsTracker(), []
+        game.add_hand_listener(tracker.add_hand)
+        game.add_hand_listener(records.append)
+        for _ in range(30):
+            for player in game.players:
+                player.cash = 100
+            game.play_hand()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            exporter = export.HandExporter(tmp, chunk_size=7)
+            for record in records:
+                exporter.add(record)
+            exporter.close()
+            rebuilt = StatsTracker()
+            rebuilt.recompute(export.load(tmp))
+        self.assertEqual(rebuilt.totals, tracker.totals)
+        hud = tracker.hud("a")
+        self.assertEqual(hud.hands, 30)
+        self.assertTrue(0 <= hud.vpip <= 1)
+        self.assertIsNone(tracker.hud("nobody"))
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestExport(unittest.TestCase):
+    def test_round_trip_in_chunks(self):
+        random.seed(49)
+        game = Game()
+        for name in "abc":
+            game.add_player(BotPlayer(name, 100))
+        records = []
+        game.add_hand_listener(records.append)
+        with tempfile.TemporaryDirectory() as tmp:
+            exporter = export.HandExporter(tmp, chunk_size=4)
+            game.add_hand_listener(exporter.add)
+            for _ in range(10):
+                for player in game.players:
+                    player.cash = 100
+                game.play_hand()
+            exporter.close()
+            self.assertEqual(len(list(export.iter_chunks(tmp))), 3)
+            columns = export.load(tmp)
+
+        self.assertEqual(len(columns["hand_id"]), 10)
+        self.assertEqual(columns["seat_offsets"][-1], len(columns["player"]))
+        self.assertEqual(columns["action_offsets"][-1], len(columns["action_player"]))
+        for i, record in enumerate(records):
+            seats = slice(columns["seat_offsets"][i], columns["seat_offsets"][i + 1])
+            self.assertEqual(tuple(columns["players"][columns["player"][seats]]), record.players)
+            holes = export.unpack_cards(columns["hole"][seats], 2)
+            self.assertEqual(tuple(map(tuple, holes.tolist())), record.hole_cards)
+            board = export.unpack_cards(columns["board"][columns["board_offsets"][i] : columns["board_offsets"][i + 1]], 5)
+            self.assertEqual([c for c in board[0].tolist() if c >= 0], list(record.boards[0]))
+            actions = slice(columns["action_offsets"][i], columns["action_offsets"][i + 1])
+            self.assertEqual(
+                [export.ACTIONS[a] for a in columns["action"][actions]],
+                [action for street in record.actions.values() for _, action, _ in street],
+            )
+            self.assertAlmostEqual(columns["pot"][i], sum(record.winnings))
+
+    def test_ignores_partial_chunks(self):
+        random.seed(49)
+        game = Game()
+        for name in "abc":
+            game.add_player(BotPlayer(name, 100))
+        with tempfile.TemporaryDirectory() as tmp:
+            exporter = export.HandExporter(tmp, chunk_size=2)
+            game.add_hand_listener(exporter.add)
+            for _ in range(2):
+                for player in game.players:
+                    player.cash = 100
+                game.play_hand()
+            # The next chunk, with a new player, is written but the process
+            # dies before it is moved into place
+            game.add_player(BotPlayer("d", 100))
+            for player in game.players:
+                player.cash = 100
+            game.play_hand()
+            replace = os.replace
+
+            def crash_on_chunks(src, dst):
+                if dst.endswith(".npz"):
+                    raise OSError("crashed")
+                replace(src, dst)
+
+            with unittest.mock.patch("export.os.replace", side_effect=crash_on_chunks):
+                with self.assertRaises(OSError):
+                    exporter.close()
+            self.assertEqual(len(os.listdir(tmp)), 3)
+            self.assertEqual(len(list(export.iter_chunks(tmp))), 1)
+            self.assertEqual(len(export.load(tmp)["hand_id"]), 2)
+
+            # A new exporter keeps the codes of players it has not seen in a
+            # chunk yet, so nobody else takes over "d"'s code
+            exporter = export.HandExporter(tmp, chunk_size=2)
+            self.assertEqual(exporter.chunks, 1)
+            self.assertEqual(exporter.players, ["a", "b", "c", "d"])
+
+
+class TestSeatRing(unittest.TestCase):
+    def test_ring_order_and_removal(self):
+        game = a_simple_game()
+        alice, bob, cyril = game.players
+        bob.state = "all in"
+
+        seats = SeatRing(game.players)
+        self.assertEqual(seats.num_active, 2)
+        self.assertEqual(seats.first_active_from(1), 2)
+        self.assertEqual(seats.first_active_from(4), 2)
+        self.assertEqual(seats.next_active(2), 0)
+        self.assertEqual(seats.next_active(0), 2)
+
+        seats.remove(0)
+        self.assertEqual(seats.num_active, 1)
+        self.assertFalse(seats.is_active(0))
+        self.assertEqual(seats.next_active(0), 2)
+        self.assertEqual(seats.next_active(2), 2)
+
+
+
+class TestTournament(unittest.TestCase):
+    def test_blind_schedule(self):
+        schedule = BlindSchedule([2, 4, 8], hands_per_level=5)
+        self.assertEqual(schedule.big_blind(0), 2)
+        self.assertEqual(schedule.big_blind(5), 4)
+        self.assertEqual(schedule.big_blind(100), 8)
+
+    def test_seat_and_remove_player(self):
+        game = a_simple_game()
+        alice, bob, cyril = game.players
+        dave = BotPlayer("Dave", 40)
+        game.seat_player(dave)
+        self.assertEqual(game.num_seated_players(), 4)
+        self.assertNotIn(dave, game.players)
+
+        game.initialize_hand()
+        self.assertEqual(game.players, [alice, bob, cyril, dave])
+
+        # Bob holds the button, so removing Alice must not move it
+        game.remove_player(alice)
+        self.assertIs(game.player_at_idx(game.dealer_idx), bob)
+
+    def test_table_balancing(self):
+        players = [BotPlayer(str(i), 100) for i in range(20)]
+        tournament = Tournament(players, table_size=6)
+        self.assertEqual([t.num_seated_players() for t in tournament.tables], [5, 5, 5, 5])
+
+        for game in tournament.tables[:2]:
+            for player in game.players[:3]:
+                player.cash = 0
+        tournament.eliminate_players({})
+        tournament.break_tables()
+        tournament.balance_tables()
+
+        self.assertEqual(len(tournament.eliminated), 6)
+        self.assertEqual(len(tournament.tables), 3)
+        self.assertEqual(
+            sorted(t.num_seated_players() for t in tournament.tables), [4, 5, 5]
+        )
+
+    def test_run_tournament(self):
+        players = [BotPlayer(str(i), 50) for i in range(30)]
+        tournament = Tournament(players, table_size=9)
+        standings = tournament.run()
+
+        self.assertEqual(len(standings), 30)
+        self.assertEqual(set(standings), set(players))
+        self.assertTrue(tournament.is_final_table)
+        self.assertAlmostEqual(standings[0].cash, 30 * 50)
+        self.assertTrue(all(p.cash == 0 for p in standings[1:]))
+
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class TestVectorGame(unittest.TestCase):
+    def test_evaluate_matches_hand(self):
+        rng = random.Random(5)
+        for _ in range(300):
+            cards0, cards1 = rng.sample(range(52), 7), rng.sample(range(52), 7)
+            hand0 = Hand([card_from_index(c) for c in cards0])
+            hand1 = Hand([card_from_index(c) for c in cards1])
+            strength0, strength1 = vector_game.evaluate(np.array([cards0, cards1]))
+
+            self.assertEqual(hand0 < hand1, strength0 < strength1)
+            self.assertEqual(hand0 == hand1, strength0 == strength1)
+
+    def test_matches_game(self):
+        rng = random.Random(7)
+        num_tables = 40
+        for num_players in range(2, 7):
+            actions = [
+                ["".join(rng.choices("CCRRF", k=30)) for _ in range(num_players)]
+                for _ in range(num_tables)
+            ]
+            stacks = [
+                [rng.randint(3, 60) for _ in range(num_players)]
+                for _ in range(num_tables)
+            ]
+
+            decks, expected = [], []
+            for table in range(num_tables):
+                game = Game()
+                for seat in range(num_players):
+                    game.add_player(
+                        BotPlayer(str(seat), stacks[table][seat], action_sequence=deque(actions[table][seat]))
+                    )
+                game.deck.reset_and_shuffle(seed=rng.randint(1, 10**9))
+                decks.append([card.index for card in game.deck.deck])
+                game.play_hand(shuffle=False)
+                expected.append([player.cash for player in game.players])
+
+            tables = vector_game.VectorGame(
+                num_tables,
+                num_players,
+                stacks=stacks,
+                policy=vector_game.ScriptedPolicy(actions),
+            )
+            tables.play_hand(decks=np.array(decks))
+            np.testing.assert_allclose(tables.stacks, expected)
+
+    def test_chips_are_conserved(self):
+        tables = vector_game.VectorGame(500, 6, stacks=50.0, seed=3)
+        for _ in range(5):
+            tables.play_hand()
+            np.testing.assert_allclose(tables.stacks.sum(axis=1), 300.0)
+
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_compare_results(self):
+        baseline = {"results": {"a": {"ops_per_sec": 100}, "b": {"ops_per_sec": 100}}}
+        current = {
+            "results": {
+                "a": {"ops_per_sec": 85},
+                "b": {"ops_per_sec": 70},
+                "c": {"ops_per_sec": 1},
+            }
+        }
+        self.assertEqual(compare_results(current, baseline, tolerance=0.2), ["b"])
+
+    def test_workloads_run(self):
+        results = run_benchmarks(scale=0.001, repeat=1)["results"]
+        self.assertIn("play_hand_9_players", results)
+        self.assertTrue(all(r["ops_per_sec"] > 0 for r in results.values()))
+
+        rerun = run_benchmarks(scale=0.001, repeat=1, names=["deal_9_players"])["results"]
+        self.assertEqual(list(rerun), ["deal_9_players"])
+
+
+
+class TestGameMetrics(unittest.TestCase):
+    def test_metrics_snapshot(self):
+        game = a_simple_game_with_actions(actions=["RCRC", "CF", "RCR"])
+        game.dealer_idx = -1
+        metrics = game.enable_metrics()
+        names = set(metrics.snapshot()["timers"]), set(metrics.snapshot()["counters"])
+        game.play_hand(shuffle=False)
+
+        snapshot = metrics.snapshot()
+        # Nothing is added while the game runs
+        self.assertEqual((set(snapshot["timers"]), set(snapshot["counters"])), names)
+        timers = snapshot["timers"]
+        for phase in ["play_hand", "initialize_hand", "preflop", "flop", "determine_pots"]:
+            self.assertEqual(timers[phase]["count"], 1)
+        self.assertGreater(timers["emit"]["count"], 0)
+        # Alice and Cyril are all in after the flop, so nobody acts later
+        self.assertEqual(timers["player_decision"]["count"], 9)
+        self.assertEqual(snapshot["counters"]["betting_iterations"], 9)
+
+        text = render_prometheus(merge_snapshots([snapshot, snapshot]))
+        self.assertIn('poker_game_phase_calls_total{phase="preflop"} 2', text)
+        self.assertIn('poker_game_events_total{event="betting_iterations"} 18', text)
+
+    def test_disable_metrics(self):
+        game = a_simple_game()
+        game.enable_metrics()
+        game.disable_metrics()
+
+        self.assertIsNone(game.metrics)
+        self.assertNotIn("preflop", vars(game))
+        self.assertIs(game.print, print)
+        self.assertEqual(game.rounds[0], game.preflop)
+
+    def test_counter_and_histogram(self):
+        counter = Counter()
+        threads = [
+            threading.Thread(target=lambda: [counter.inc() for _ in range(1000)])
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(counter.value, 4000)
+        counter.dec(3)
+        self.assertEqual(counter.value, 3997)
+
+        histogram = Histogram(buckets=(0.1, 1.0), fold_at=2)
+        for value in [0.05, 0.5, 0.7, 3.0]:
+            histogram.observe(value)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot["buckets"], {0.1: 1, 1.0: 3, float("inf"): 4})
+        self.assertEqual(snapshot["count"], 4)
+        self.assertAlmostEqual(snapshot["sum"], 4.25)
+
+
 if __name__ == "__main__":
     random.seed(99)
     unittest.main()
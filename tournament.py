@@ -0,0 +1,141 @@
+import math
+from game import Game
+
+
+class BlindSchedule:
+    def __init__(self, big_blinds, hands_per_level):
+        if not big_blinds:
+            raise Exception("A blind schedule needs at least one level")
+        self.big_blinds = list(big_blinds)
+        self.hands_per_level = hands_per_level
+
+    def level(self, hands_played):
+        return min(hands_played // self.hands_per_level, len(self.big_blinds) - 1)
+
+    def big_blind(self, hands_played):
+        return self.big_blinds[self.level(hands_played)]
+
+
+DEFAULT_BLIND_SCHEDULE = BlindSchedule(
+    [2, 4, 6, 10, 16, 24, 40, 60, 100, 160, 240, 400, 600, 1000, 1600, 2400],
+    hands_per_level=10,
+)
+
+
+class Tournament:
+    """Multi-table tournament running one `Game` per table.
+
+    Every call to `play_round` plays one hand on each table in turn, then
+    removes busted players, breaks tables that are no longer needed and
+    balances the rest so that table sizes differ by at most one player.
+    Players who change tables are seated through `Game.seat_player` and are
+    dealt in from their new table's next hand.
+    """
+
+    def __init__(
+        self,
+        players,
+        table_size=9,
+        blind_schedule=DEFAULT_BLIND_SCHEDULE,
+        emit_func=None,
+    ):
+        if len(players) < 2:
+            raise Exception("A tournament needs at least 2 players")
+        if table_size < 2:
+            raise Exception("Tables must seat at least 2 players")
+
+        self.table_size = table_size
+        self.blind_schedule = blind_schedule
+        self.hands_played = 0
+        # Busted players, first out first
+        self.eliminated = []
+
+        num_tables = math.ceil(len(players) / table_size)
+        self.tables = [Game(emit_func=emit_func) for _ in range(num_tables)]
+        for i, player in enumerate(players):
+            self.tables[i % num_tables].add_player(player)
+
+    @property
+    def big_blind(self):
+        return self.blind_schedule.big_blind(self.hands_played)
+
+    @property
+    def is_final_table(self):
+        return len(self.tables) == 1
+
+    def players_remaining(self):
+        return sum(table.num_seated_players() for table in self.tables)
+
+    def is_finished(self):
+        return self.players_remaining() <= 1
+
+    def play_round(self):
+        live_tables = [t for t in self.tables if t.num_seated_players() >= 2]
+        starting_stacks = {}
+        for table in live_tables:
+            table.bb = self.big_blind
+            for player in [*table.players, *table.waiting_players]:
+                starting_stacks[player] = player.cash
+
+        # Hands are pure Python, so threads would only take turns on the GIL
+        for table in live_tables:
+            table.play_hand()
+
+        self.hands_played += 1
+        self.eliminate_players(starting_stacks)
+        self.break_tables()
+        self.balance_tables()
+
+    def eliminate_players(self, starting_stacks):
+        busted = []
+        for table in self.tables:
+            for player in list(table.players):
+                if player.cash == 0:
+                    table.remove_player(player)
+                    busted.append(player)
+
+        # Among players busting in the same round, the bigger starting stack
+        # finishes higher
+        busted.sort(key=lambda p: starting_stacks.get(p, 0))
+        self.eliminated.extend(busted)
+
+    def break_tables(self):
+        needed = max(1, math.ceil(self.players_remaining() / self.table_size))
+        while len(self.tables) > needed:
+            # Break the shortest table, the most recently opened on ties
+            table = min(reversed(self.tables), key=Game.num_seated_players)
+            self.tables.remove(table)
+            for player in [*table.players, *table.waiting_players]:
+                target = min(self.tables, key=Game.num_seated_players)
+                target.seat_player(player)
+
+    def balance_tables(self):
+        while len(self.tables) > 1:
+            largest = max(self.tables, key=Game.num_seated_players)
+            smallest = min(self.tables, key=Game.num_seated_players)
+            if largest.num_seated_players() - smallest.num_seated_players() <= 1:
+                return
+
+            player = self.next_big_blind(largest)
+            largest.remove_player(player)
+            smallest.seat_player(player)
+
+    def next_big_blind(self, table):
+        # Moving the player due to post the big blind next keeps the blinds
+        # fair for everyone else at the table
+        if table.waiting_players:
+            return table.waiting_players[-1]
+        return table.player_at_idx(table.dealer_idx + 3)
+
+    def standings(self):
+        remaining = sorted(
+            (p for t in self.tables for p in [*t.players, *t.waiting_players]),
+            key=lambda p: p.cash,
+            reverse=True,
+        )
+        return remaining + self.eliminated[::-1]
+
+    def run(self):
+        while not self.is_finished():
+            self.play_round()
+        return self.standings()
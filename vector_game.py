@@ -0,0 +1,355 @@
+"""
+Lockstep simulation of many identical tables with NumPy.
+
+Every table follows the rules of `Game`: the same dealing order, blinds,
+action order, raise sizes and side pots. Cards are ints in
+[0, 52), the position of the card in a fresh `Deck` (see `Card.index`), so a
+shuffled `Deck` can be replayed here card for card.
+
+Hands are ranked with the strength ints of `evaluator`, computed for every
+table at once.
+"""
+
+from collections import deque, namedtuple
+import numpy as np
+import evaluator
+from evaluator import (
+    NUM_CARDS,
+    NUM_RANKS,
+    NUM_SUITS,
+    CATEGORY_SHIFT,
+    HIGH_CARD,
+    ONE_PAIR,
+    TWO_PAIR,
+    THREE_OF_A_KIND,
+    STRAIGHT,
+    FLUSH,
+    FULL_HOUSE,
+    FOUR_OF_A_KIND,
+    STRAIGHT_FLUSH,
+)
+
+FOLD, CALL, RAISE = 0, 1, 2
+PLAYING, ALL_IN, FOLDED = 0, 1, 2
+
+# Number of community cards visible on each street
+BOARD_SIZE = (0, 3, 4, 5)
+
+TOP_FIVE = np.array(evaluator.TOP_FIVE, dtype=np.int64)
+STRAIGHT_TOP = np.array(evaluator.STRAIGHT_TOP, dtype=np.int64)
+
+
+def evaluate(cards):
+    """`evaluator.evaluate` for each row of `cards`.
+
+    `cards` is an (N, k) int array with 5 <= k <= 9.
+    """
+    cards = np.asarray(cards)
+    rows = np.arange(cards.shape[0])
+    ranks = cards % NUM_RANKS
+    suits = cards // NUM_RANKS
+
+    rank_bit = np.left_shift(1, ranks)
+    rank_bits = np.bitwise_or.reduce(rank_bit, axis=1)
+    rank_counts = np.bincount(
+        (rows[:, None] * NUM_RANKS + ranks).ravel(), minlength=len(rows) * NUM_RANKS
+    ).reshape(-1, NUM_RANKS)
+    suit_counts = np.bincount(
+        (rows[:, None] * NUM_SUITS + suits).ravel(), minlength=len(rows) * NUM_SUITS
+    ).reshape(-1, NUM_SUITS)
+
+    has_flush = suit_counts.max(axis=1) >= 5
+    flush_suit = suit_counts.argmax(axis=1)
+    flush_bits = np.bitwise_or.reduce(
+        np.where(suits == flush_suit[:, None], rank_bit, 0), axis=1
+    )
+
+    # The two largest groups of equal rank, larger and then higher first
+    group_key = rank_counts * 16 + np.arange(NUM_RANKS)
+    r0 = group_key.argmax(axis=1)
+    group_key[rows, r0] = -1
+    r1 = group_key.argmax(axis=1)
+    c0, c1 = rank_counts[rows, r0], rank_counts[rows, r1]
+    rest0 = rank_bits & ~np.left_shift(1, r0)
+    rest01 = rest0 & ~np.left_shift(1, r1)
+
+    # Candidates in increasing order of category, so the best one sticks
+    candidates = [
+        (c0 == 2, ONE_PAIR, r0 << 16 | TOP_FIVE[rest0] >> 8 << 4),
+        ((c0 == 2) & (c1 == 2), TWO_PAIR, r0 << 16 | r1 << 12 | TOP_FIVE[rest01] >> 16 << 8),
+        (c0 == 3, THREE_OF_A_KIND, r0 << 16 | TOP_FIVE[rest0] >> 12 << 8),
+        (STRAIGHT_TOP[rank_bits] >= 0, STRAIGHT, STRAIGHT_TOP[rank_bits] << 16),
+        (has_flush, FLUSH, TOP_FIVE[flush_bits]),
+        ((c0 == 3) & (c1 >= 2), FULL_HOUSE, r0 << 16 | r1 << 12),
+        (c0 == 4, FOUR_OF_A_KIND, r0 << 16 | TOP_FIVE[rest0] >> 16 << 12),
+        (
+            has_flush & (STRAIGHT_TOP[flush_bits] >= 0),
+            STRAIGHT_FLUSH,
+            STRAIGHT_TOP[flush_bits] << 16,
+        ),
+    ]
+
+    strength = HIGH_CARD << CATEGORY_SHIFT | TOP_FIVE[rank_bits]
+    for mask, category, ranks_value in candidates:
+        strength = np.where(mask, category << CATEGORY_SHIFT | ranks_value, strength)
+    return strength
+
+
+TableState = namedtuple(
+    "TableState",
+    [
+        "tables",
+        "seat",
+        "stacks",
+        "bets",
+        "price_to_call",
+        "minimum_raise",
+        "can_raise",
+        "can_call",
+        "pot",
+        "street",
+    ],
+)
+
+
+def random_policy(state, rng):
+    # Same choice as `BotPlayer`: uniform over the actions that are allowed
+    with_raise = rng.integers(0, 3, size=len(state.seat))
+    without_raise = rng.integers(0, 2, size=len(state.seat))
+    return np.where(state.can_raise, with_raise, without_raise)
+
+
+class ScriptedPolicy:
+    """Per-seat action strings, as in `BotPlayer(action_sequence=...)`."""
+
+    ACTIONS = {"C": CALL, "R": RAISE, "F": FOLD}
+
+    def __init__(self, action_sequences):
+        self.action_sequences = [
+            [deque(actions) for actions in table] for table in action_sequences
+        ]
+
+    def __call__(self, state, rng):
+        return np.array(
+            [
+                self.ACTIONS[self.action_sequences[table][seat].popleft()]
+                for table, seat in zip(state.tables, state.seat)
+            ]
+        )
+
+
+class VectorGame:
+    """`num_tables` tables of `num_players` seats advanced in lockstep.
+
+    `policy(state, rng)` receives a `TableState` with one entry for each table
+    that still has a player to act (`state.tables`) and returns an array of
+    FOLD / CALL / RAISE for them. A raise is the `Game` raise: to price to
+    call plus twice the minimum raise, or all in if short.
+    Seats with an empty stack sit out.
+    """
+
+    def __init__(self, num_tables, num_players, stacks=100.0, bb=2.0, policy=random_policy, seed=None):
+        if num_players < 2:
+            raise Exception("A table needs at least 2 players")
+        self.num_tables = num_tables
+        self.num_players = num_players
+        self.stacks = np.broadcast_to(
+            np.asarray(stacks, dtype=np.float64), (num_tables, num_players)
+        ).copy()
+        self.bb = bb
+        self.dealer_idx = 0
+        self.policy = policy
+        self.rng = np.random.default_rng(seed)
+        self._rows = np.arange(num_tables)
+
+    def shuffled_decks(self):
+        decks = np.tile(np.arange(NUM_CARDS), (self.num_tables, 1))
+        return self.rng.permuted(decks, axis=1)
+
+    def play_hand(self, decks=None):
+        num_players = self.num_players
+        self.dealer_idx += 1
+        decks = self.shuffled_decks() if decks is None else np.asarray(decks)
+
+        # Two passes round the table starting left of the button, then
+        # burn one card before each of the flop, turn and river
+        deal_order = (self.dealer_idx + 1 + np.arange(num_players)) % num_players
+        self.hole_cards = np.empty((self.num_tables, num_players, 2), dtype=np.int64)
+        self.hole_cards[:, deal_order, 0] = decks[:, :num_players]
+        self.hole_cards[:, deal_order, 1] = decks[:, num_players : 2 * num_players]
+        board_idx = 2 * num_players + np.array([1, 2, 3, 5, 7])
+        self.board = decks[:, board_idx]
+
+        self.status = np.where(self.stacks > 0, PLAYING, FOLDED)
+        self.total_bets = np.zeros_like(self.stacks)
+        self.street_bets = np.zeros_like(self.stacks)
+        self.pot = np.zeros(self.num_tables)
+        self.finished = np.zeros(self.num_tables, dtype=bool)
+
+        self.post_blind(self.dealer_idx + 1, self.bb / 2)
+        self.post_blind(self.dealer_idx + 2, self.bb)
+
+        for street in range(len(BOARD_SIZE)):
+            if street > 0:
+                self.street_bets[:] = 0
+            self.betting(street)
+            self.check_early_winner()
+
+        self.showdown()
+        return self.stacks
+
+    def post_blind(self, seat, blind):
+        seat %= self.num_players
+        sitting_in = self.status[:, seat] == PLAYING
+        paid = np.where(sitting_in, np.minimum(self.stacks[:, seat], blind), 0)
+        self.stacks[:, seat] -= paid
+        self.street_bets[:, seat] = paid
+        self.total_bets[:, seat] += paid
+        self.pot += paid
+        self.status[:, seat] = np.where(
+            sitting_in & (self.stacks[:, seat] == 0), ALL_IN, self.status[:, seat]
+        )
+
+    def next_active(self, active, seat):
+        # First active seat strictly after `seat` in each row of `active`,
+        # wrapping round the table
+        num_players = self.num_players
+        rows = np.arange(len(seat))
+        candidates = (seat[:, None] + 1 + np.arange(num_players)) % num_players
+        is_active = active[rows[:, None], candidates]
+        found = candidates[rows, is_active.argmax(axis=1)]
+        return np.where(is_active.any(axis=1), found, seat % num_players)
+
+    def betting(self, street):
+        # Tables still betting this street; a table never rejoins once done
+        tables = np.flatnonzero(~self.finished)
+        price_to_call = np.full(self.num_tables, self.bb if street == 0 else 0.0)
+        minimum_raise = np.full(self.num_tables, self.bb)
+        first_to_act = self.dealer_idx + (3 if street == 0 else 1)
+
+        active = self.status[tables] == PLAYING
+        seat = np.zeros(self.num_tables, dtype=np.int64)
+        seat[tables] = self.next_active(active, np.full(len(tables), first_to_act - 1))
+        num_active = active.sum(axis=1)
+        to_act = np.zeros(self.num_tables, dtype=np.int64)
+        to_act[tables] = num_active
+        in_hand = (self.status != FOLDED).sum(axis=1)
+        # Seats that have acted since the last full raise, which a short
+        # all-in does not reopen
+        acted = np.zeros((self.num_tables, self.num_players), dtype=bool)
+
+        while True:
+            acting_seat = seat[tables]
+            bet = self.street_bets[tables, acting_seat]
+            num_active = (self.status[tables] == PLAYING).sum(axis=1)
+            live = (
+                (to_act[tables] > 0)
+                & (in_hand[tables] > 1)
+                & ~((num_active == 1) & (bet >= price_to_call[tables]))
+            )
+            tables, acting_seat, bet = tables[live], acting_seat[live], bet[live]
+            if not len(tables):
+                return
+
+            stack = self.stacks[tables, acting_seat]
+            price = price_to_call[tables]
+            min_raise = minimum_raise[tables]
+            can_raise = (stack + bet > price) & ~acted[tables, acting_seat]
+            state = TableState(
+                tables,
+                acting_seat,
+                self.stacks[tables],
+                self.street_bets[tables],
+                price,
+                min_raise,
+                can_raise,
+                stack > 0,
+                self.pot[tables],
+                street,
+            )
+            action = np.asarray(self.policy(state, self.rng))
+            # A raise that is not allowed falls back to a call
+            action = np.where(can_raise, action, np.minimum(action, CALL))
+            fold = action == FOLD
+            call = action == CALL
+            raise_ = action == RAISE
+
+            call_all_in = stack + bet <= price
+            call_total = np.where(call_all_in, bet + stack, price)
+            raise_to = price + min_raise * 2
+            raise_all_in = stack + bet <= raise_to
+            raise_total = np.where(raise_all_in, bet + stack, raise_to)
+            raise_amount = np.where(raise_all_in, stack + bet - price, min_raise * 2)
+
+            new_bet = np.where(call, call_total, np.where(raise_, raise_total, bet))
+            paid = new_bet - bet
+            self.stacks[tables, acting_seat] -= paid
+            self.street_bets[tables, acting_seat] = new_bet
+            self.total_bets[tables, acting_seat] += paid
+            self.pot[tables] += paid
+
+            went_all_in = (call & call_all_in) | (raise_ & raise_all_in)
+            self.status[tables, acting_seat] = np.where(
+                fold,
+                FOLDED,
+                np.where(went_all_in, ALL_IN, self.status[tables, acting_seat]),
+            )
+            active = self.status[tables] == PLAYING
+            in_hand[tables] -= fold
+
+            full_raise = raise_ & (raise_amount >= min_raise)
+            acted[tables[full_raise]] = False
+            acted[tables, acting_seat] = True
+            price_to_call[tables] = np.where(raise_, raise_total, price)
+            minimum_raise[tables] = np.where(full_raise, raise_amount, min_raise)
+            to_act[tables] = np.where(
+                raise_,
+                active.sum(axis=1) - active[np.arange(len(tables)), acting_seat],
+                to_act[tables] - 1,
+            )
+            seat[tables] = self.next_active(active, acting_seat)
+
+    def check_early_winner(self):
+        in_hand = self.status != FOLDED
+        won = ~self.finished & (in_hand.sum(axis=1) == 1)
+        winner = in_hand.argmax(axis=1)
+        self.stacks[self._rows[won], winner[won]] += self.pot[won]
+        self.pot[won] = 0
+        self.finished |= won
+
+    def hand_strengths(self):
+        cards = np.concatenate(
+            [
+                self.hole_cards,
+                np.broadcast_to(self.board[:, None, :], (self.num_tables, self.num_players, 5)),
+            ],
+            axis=2,
+        )
+        return evaluate(cards.reshape(-1, 7)).reshape(self.num_tables, self.num_players)
+
+    def showdown(self):
+        contested = ~self.finished
+        if not contested.any():
+            return
+
+        in_hand = self.status != FOLDED
+        strength = np.where(in_hand, self.hand_strengths(), -1)
+        total_bets = self.total_bets
+
+        # Side pots are layered on the totals of the players still in the hand
+        levels = np.sort(np.where(in_hand, total_bets, np.inf), axis=1)
+        prev_level = np.zeros(self.num_tables)
+        for level in levels.T:
+            valid = contested & np.isfinite(level)
+            capped = np.clip(total_bets, prev_level[:, None], np.where(valid, level, prev_level)[:, None])
+            pot = (capped - prev_level[:, None]).sum(axis=1)
+
+            eligible = in_hand & (total_bets >= level[:, None])
+            best = np.where(eligible, strength, -1).max(axis=1)
+            winners = eligible & (strength == best[:, None]) & valid[:, None]
+            share = pot / np.maximum(winners.sum(axis=1), 1)
+            self.stacks += np.where(winners, share[:, None], 0)
+            prev_level = np.where(valid, level, prev_level)
+
+        self.pot[contested] = 0
+        self.finished[:] = True